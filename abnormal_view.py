@@ -0,0 +1,74 @@
+# abnormal_view.py
+"""
+异常列表物化视图 (网页 /api/market/abnormal 与定期汇总共用)
+策略引擎在状态变化时增量写入: 费率异常 (level > 0) 的币种一条常驻记录，价格/OI/规则异动按事件写入，
+事件到期由最小堆驱动淘汰；每次变更 version + 1，读取时只在 version 变化后重排一次，
+否则直接返回缓存结果 (O(结果数)，不再扫描 fund_states / 重算窗口)。
+"""
+import heapq
+import itertools
+
+
+class AbnormalView:
+    def __init__(self, event_ttl=300):
+        self.event_ttl = event_ttl
+        self.funding = {}       # symbol -> 费率异常记录 (含当时的 OI/CVD/价格)
+        self.events = {}        # symbol -> {kind: {"ts", "tag", "data"}}  kind = PRICE / OI / 规则名
+        self.entries = {}       # symbol -> 合并后的展示记录
+        self.version = 0
+        self._heap = []         # (到期时间, seq, symbol, kind, 事件时间)
+        self._seq = itertools.count()
+        self._sorted = []
+        self._sorted_version = 0
+
+    def set_funding(self, symbol, record):
+        if self.funding.get(symbol) == record: return
+        self.funding[symbol] = record
+        self._rebuild(symbol)
+
+    def clear_funding(self, symbol):
+        if self.funding.pop(symbol, None) is not None:
+            self._rebuild(symbol)
+
+    def add_event(self, symbol, kind, ts, tag, data):
+        """同一币种同类事件只保留最新一条 (与旧 event_cache 的 key 语义一致)"""
+        self.events.setdefault(symbol, {})[kind] = {"ts": ts, "tag": tag, "data": data}
+        heapq.heappush(self._heap, (ts + self.event_ttl, next(self._seq), symbol, kind, ts))
+        self._rebuild(symbol)
+
+    def expire(self, now):
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            _, _, symbol, kind, ts = heapq.heappop(heap)
+            events = self.events.get(symbol)
+            if events and kind in events and events[kind]["ts"] == ts:  # 未被更新的事件覆盖
+                del events[kind]
+                if not events:
+                    del self.events[symbol]
+                self._rebuild(symbol)
+
+    def _rebuild(self, symbol):
+        fund = self.funding.get(symbol)
+        events = sorted(self.events.get(symbol, {}).values(), key=lambda e: e["ts"])
+        if fund is None and not events:
+            self.entries.pop(symbol, None)
+        else:
+            entry = dict(fund if fund is not None else events[-1]["data"])
+            tags = []
+            for e in events:
+                if e["tag"] not in tags: tags.append(e["tag"])
+            entry["tags"] = tags
+            entry["event_ts"] = events[-1]["ts"] if events else 0
+            self.entries[symbol] = entry
+        self.version += 1
+
+    def items(self, now):
+        """排序: 有事件发生 (时间倒序) > 费率绝对值 (高到低)"""
+        self.expire(now)
+        if self._sorted_version != self.version:
+            self._sorted = sorted(self.entries.values(), key=lambda x: (x['event_ts'], abs(x['rate'])), reverse=True)
+            self._sorted_version = self.version
+        return list(self._sorted)
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,21 +1,19 @@
 # announcement_monitor.py
 import asyncio
-import aiohttp
 import logging
 import json
 import re
 from config import CONFIG
+from state_store import TTLStore
 
 logger = logging.getLogger(__name__)
 
 class AnnouncementMonitor:
-    def __init__(self, notifier_ref):
+    def __init__(self, notifier_ref, http_client):
         self.notifier = notifier_ref
+        self.http = http_client
         self.proxy = CONFIG['proxy'] or None
-        self.seen_ids = {
-            "BINANCE": set(),
-            "UPBIT": set()
-        }
+        self.seen_ids = TTLStore("announcement_seen")  # (交易所, 公告 id)，仍在列表里的每轮续期
         self.is_initialized = False
 
     async def start(self):
@@ -41,19 +39,19 @@ class AnnouncementMonitor:
         # 监控 "New Cryptocurrency Listing"
         url = "https://www.binance.com/bapi/composite/v1/public/cms/article/catalog/list?catalogs=48&pageNo=1&pageSize=15"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, proxy=self.proxy) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        articles = data.get('data', [])[0].get('articles', [])
-                        for item in articles[:5]:
-                            article_id = str(item['id'])
-                            title = item['title']
-                            if article_id not in self.seen_ids["BINANCE"]:
-                                self.seen_ids["BINANCE"].add(article_id)
-                                if self.is_initialized and not silent:
-                                    if any(k in title.lower() for k in ["list", "launch", "open trading"]):
-                                        await self._send_alert("Binance", title, f"https://www.binance.com/en/support/announcement/{item['code']}")
+            async with self.http.get(url, proxy=self.proxy) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    articles = data.get('data', [])[0].get('articles', [])
+                    for item in articles[:5]:
+                        article_id = str(item['id'])
+                        title = item['title']
+                        is_new = ("BINANCE", article_id) not in self.seen_ids
+                        self.seen_ids.set(("BINANCE", article_id), True)
+                        if is_new:
+                            if self.is_initialized and not silent:
+                                if any(k in title.lower() for k in ["list", "launch", "open trading"]):
+                                    await self._send_alert("Binance", title, f"https://www.binance.com/en/support/announcement/{item['code']}")
         except Exception:
             pass
 
@@ -61,20 +59,20 @@ class AnnouncementMonitor:
         # 监控 "Trade Support"
         url = "https://api-manager.upbit.com/api/v1/notices?page=1&per_page=20&thread_name=trade_support"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, proxy=self.proxy) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        items = data.get('data', {}).get('list', [])
-                        for item in items[:5]:
-                            notice_id = str(item['id'])
-                            title = item['title']
-                            if notice_id not in self.seen_ids["UPBIT"]:
-                                self.seen_ids["UPBIT"].add(notice_id)
-                                if self.is_initialized and not silent:
-                                    if "마켓" in title or "Market" in title or "Addition" in title:
-                                        link = f"https://upbit.com/service_center/notice?id={notice_id}"
-                                        await self._send_alert("Upbit", title, link)
+            async with self.http.get(url, proxy=self.proxy) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    items = data.get('data', {}).get('list', [])
+                    for item in items[:5]:
+                        notice_id = str(item['id'])
+                        title = item['title']
+                        is_new = ("UPBIT", notice_id) not in self.seen_ids
+                        self.seen_ids.set(("UPBIT", notice_id), True)
+                        if is_new:
+                            if self.is_initialized and not silent:
+                                if "마켓" in title or "Market" in title or "Addition" in title:
+                                    link = f"https://upbit.com/service_center/notice?id={notice_id}"
+                                    await self._send_alert("Upbit", title, link)
         except Exception:
             pass
 
@@ -0,0 +1,824 @@
+# benchmark.py
+"""
+性能基准脚本 (不依赖网络)
+用法: python benchmark.py [cvd store strategy memory snapshot journal replay decode event ring spread spread_ws hub markets ...]   # 不带参数则全部运行
+"""
+import os
+import random
+import sys
+import time
+import timeit
+from collections import deque
+
+import numpy as np
+from market_store import MarketData, MarketStore
+
+
+class FakeClock:
+    """可手动拨动的时钟，用于快速灌入历史数据"""
+    def __init__(self, start):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def _legacy_cvd_sum(buckets, curr_sec_vol, seconds, now):
+    """旧版实现: 每次线性扫描整个 deque"""
+    cutoff = now - seconds
+    total = curr_sec_vol
+    for ts, vol in buckets:
+        if ts >= cutoff: total += vol
+    return total
+
+
+def bench_cvd(symbols=300, passes=5):
+    """CVD 窗口查询: deque 线性扫描 vs 前缀和环形缓冲"""
+    rng = random.Random(42)
+    start = 1_700_000_000
+    clock = FakeClock(start)
+
+    # 灌入 30 分钟逐秒成交
+    legacy = deque(maxlen=1800)
+    md = MarketData("BENCHUSDT", clock=clock)
+    for sec in range(1801):
+        clock.now = start + sec + 0.5
+        vol = rng.uniform(-50_000, 50_000)
+        legacy.append((start + sec, vol))
+        md.add_trade(1.0, abs(vol), vol < 0)
+    now = clock.now
+
+    # 正确性校验 (当前秒在旧实现里单独计入 curr_sec_vol)
+    for w in (60, 300, 900, 1800):
+        old = _legacy_cvd_sum(list(legacy)[:-1], legacy[-1][1], w, now)
+        new = md.get_cvd_sum(w)
+        assert abs(old - new) < 1e-6 * max(1.0, abs(old)), (w, old, new)
+
+    windows = (1800, 300, 300, 600, 900)  # check + _fmt_msg 的典型调用
+    n = symbols * passes
+
+    def run_legacy():
+        for _ in range(n):
+            for w in windows:
+                _legacy_cvd_sum(legacy, 0.0, w, now)
+
+    def run_ring():
+        for _ in range(n):
+            for w in windows:
+                md.get_cvd_sum(w)
+
+    t_old = min(timeit.repeat(run_legacy, number=1, repeat=3))
+    t_new = min(timeit.repeat(run_ring, number=1, repeat=3))
+
+    calls = n * len(windows)
+    print(f"[cvd] {calls} 次窗口查询 ({symbols} 币种 × {passes} 轮 × {len(windows)} 窗口)")
+    print(f"  deque 扫描 : {t_old*1000:8.1f} ms  ({t_old/calls*1e6:.2f} us/次)")
+    print(f"  前缀和环形 : {t_new*1000:8.1f} ms  ({t_new/calls*1e6:.2f} us/次)")
+    print(f"  加速比     : {t_old/t_new:.0f}x")
+
+
+def _legacy_oi_delta(history, seconds, now):
+    """旧版 MarketData.get_oi_delta (deque 线性扫描)"""
+    if not history: return 0, 0, 0
+    curr = history[-1][1]
+    cutoff = now - seconds
+    past = curr
+    for ts, val in history:
+        if ts >= cutoff:
+            past = val
+            break
+    return curr - past, curr, past
+
+
+def bench_store(symbols=2000, samples=300):
+    """整池 5 分钟 OI 变化: 逐币种 Python 循环 vs 列式向量查询"""
+    rng = random.Random(7)
+    start = 1_700_000_000
+    clock = FakeClock(start)
+    store = MarketStore(clock=clock)
+    legacy = {}
+    for i in range(symbols):
+        sym = f"C{i}USDT"
+        md = store.add_symbol(sym)
+        hist = legacy[sym] = deque(maxlen=300)
+        # 每币种的采样时间错开，模拟分批轮询
+        for k in range(rng.randint(0, samples)):
+            item = (start + k * 60 + i % 60, rng.uniform(1e6, 1e8))
+            md.oi_history.append(item)
+            hist.append(item)
+    clock.now = start + samples * 60
+
+    delta, _, _ = store.oi_deltas(300)
+    for row, sym in enumerate(store.symbols):
+        expect = _legacy_oi_delta(legacy[sym], 300, clock.now)[0]
+        assert delta[row] == expect == store[sym].get_oi_delta(300)[0], sym
+
+    def run_loop():
+        return {s: d.get_oi_delta(300)[0] for s, d in store.items()}
+
+    def run_legacy():
+        return {s: _legacy_oi_delta(h, 300, clock.now)[0] for s, h in legacy.items()}
+
+    t_legacy = min(timeit.repeat(run_legacy, number=1, repeat=3))
+    t_loop = min(timeit.repeat(run_loop, number=1, repeat=3))
+    t_vec = min(timeit.repeat(lambda: store.oi_deltas(300), number=1, repeat=3))
+
+    print(f"[store] {symbols} 币种 × {samples} 采样, 整池 5m OI 变化")
+    print(f"  旧版 deque 循环 : {t_legacy*1000:8.2f} ms")
+    print(f"  视图逐个查询    : {t_loop*1000:8.2f} ms")
+    print(f"  列式向量查询    : {t_vec*1000:8.2f} ms")
+
+
+def _fill_universe(store, symbols, clock, rng):
+    """随机生成一池行情: 价格/OI/费率历史 + 少量异动币种"""
+    for i in range(symbols):
+        md = store.add_symbol(f"C{i}USDT")
+        base = rng.uniform(0.01, 50_000)
+        oi = rng.choice([rng.uniform(1e5, 3e7), rng.uniform(3e7, 5e9)])
+        for k in range(30):
+            ts = clock.now - 900 + k * 30 + i % 30
+            drift = 1 + (rng.uniform(-0.15, 0.15) if rng.random() < 0.01 else rng.uniform(-0.002, 0.002))
+            md.price_history.append((ts, base * drift))
+            md.oi_history.append((ts, oi * (1 + rng.uniform(-0.08, 0.08) if rng.random() < 0.02 else 1)))
+        md.price = base
+        md.funding_rate = rng.choice([0.0001] * 50 + [0.006, 0.012, 0.019, 0.021, -0.025])
+
+
+STRATEGY_BUDGET_MS = 10.0   # check_all 全池一轮的耗时预算 (默认 2000 币种, 取每轮中位数)
+
+
+def bench_strategy(symbols=2000, passes=20):
+    """策略引擎一轮全池判断: 逐币种 check vs 批量 check_all (并校验结果一致、check_all 不超预算)"""
+    from strategy import StrategyEngine
+
+    rng = random.Random(3)
+    clock = FakeClock(1_700_000_000.0)
+    store = MarketStore(clock=clock)
+    _fill_universe(store, symbols, clock, rng)
+    loop_engine, batch_engine = StrategyEngine(clock=clock), StrategyEngine(clock=clock)
+
+    def strip_ts(msg):
+        return msg.rsplit("\n", 1)[0]  # 去掉末尾的 HH:MM:SS
+
+    t_loop = t_batch = 0.0
+    batch_passes = []
+    fired = 0
+    for p in range(passes):
+        clock.now += 5
+        # 随机扰动费率，覆盖升级/回落/连报退出等状态迁移
+        for row in rng.sample(range(symbols), symbols // 50):
+            store.funding_rate[row] = rng.choice([0.0001, 0.006, 0.012, 0.019, 0.021, 0.03, -0.022])
+
+        t0 = time.perf_counter()
+        expect = []
+        for sym, data in store.items():
+            alert_type, msg = loop_engine.check(sym, data)
+            if msg: expect.append((sym, alert_type, strip_ts(msg)))
+        t1 = time.perf_counter()
+        got = [(sym, a, strip_ts(m)) for sym, a, m in batch_engine.check_all(store)]
+        t2 = time.perf_counter()
+        t_loop += t1 - t0
+        t_batch += t2 - t1
+        batch_passes.append(t2 - t1)
+
+        assert got == expect, f"pass {p}: 批量结果与逐个 check 不一致"
+        assert dict(loop_engine.cooldowns.items()) == dict(batch_engine.cooldowns.items())
+        for sym in store.symbols:
+            assert loop_engine.fund_states[sym] == batch_engine.fund_states[sym], sym
+        fired += len(got)
+
+    print(f"[strategy] {symbols} 币种 × {passes} 轮, 共 {fired} 条警报 (两种模式结果一致)")
+    print(f"  逐币种 check : {t_loop/passes*1000:8.2f} ms/轮")
+    print(f"  批量 check_all: {t_batch/passes*1000:8.2f} ms/轮 (中位数 {np.median(batch_passes)*1000:.2f} ms)")
+    median_ms = np.median(batch_passes) * 1000
+    assert median_ms <= STRATEGY_BUDGET_MS, f"check_all 每轮 {median_ms:.2f} ms 超出预算 {STRATEGY_BUDGET_MS} ms"
+
+
+def bench_event(symbols=2000, seconds=60, repeats=3):
+    """
+    事件驱动评估 vs 5 秒轮询: 每虚拟分钟的策略 CPU 耗时 (各跑 repeats 遍取最小值，逐个 check 只跑一遍)
+    安静行情每秒 2% 币种有成交，活跃行情 30%；安静行情下事件驱动必须比轮询省 CPU
+    """
+    from config import CONFIG
+    from strategy import StrategyEngine
+
+    cfg = CONFIG["strategy_event"]
+    every = max(1, round(cfg["coalesce_seconds"] * 10))  # 按默认配置的攒批间隔评估 (虚拟时钟 0.1s 一步)
+    print(f"[event] {symbols} 币种, 每虚拟分钟策略耗时 (轮询每 5s; 事件驱动攒满 {cfg['coalesce_seconds']}s "
+          f"评估一次脏币种, {cfg['full_sweep_seconds']}s 未评估的并入兜底)")
+    for label, active in (("安静 2% ", 0.02), ("活跃 30%", 0.30)):
+        best_poll = best_event = float("inf")
+        t_loop = 0.0
+        for rep in range(repeats):
+            rng = random.Random(4)
+            clock = FakeClock(1_700_000_000.0)
+            store = MarketStore(clock=clock)
+            _fill_universe(store, symbols, clock, rng)
+            poll_engine, loop_engine = StrategyEngine(clock=clock), StrategyEngine(clock=clock)
+            event_engine = StrategyEngine(clock=clock)
+            np_rng = np.random.default_rng(4)
+            t_poll = t_event = 0.0
+            for tick in range(seconds * 10):
+                clock.now += 0.1
+                if tick % 10 == 0:
+                    store.mark_dirty(np.flatnonzero(np_rng.random(symbols) < active))
+                if tick % 50 == 0:
+                    t0 = time.perf_counter()
+                    poll_engine.check_all(store)
+                    t_poll += time.perf_counter() - t0
+                    if rep == 0:
+                        t0 = time.perf_counter()
+                        for s in store:
+                            loop_engine.check(s, store[s])
+                        t_loop += time.perf_counter() - t0
+                if tick % every == 0:
+                    t0 = time.perf_counter()
+                    event_engine.check_dirty(store, cfg["min_interval"], cfg["full_sweep_seconds"])
+                    t_event += time.perf_counter() - t0
+            best_poll, best_event = min(best_poll, t_poll), min(best_event, t_event)
+        t_poll, t_event = best_poll, best_event
+        print(f"  {label}: 轮询 check_all {t_poll*1000:7.1f} ms | 轮询逐个 check {t_loop*1000:7.1f} ms | "
+              f"事件驱动 {t_event*1000:7.1f} ms (评估 {event_engine.evaluated} 币种次 / 轮询 {symbols * seconds // 5})")
+        if active <= 0.02:
+            assert t_event < t_poll, f"安静行情下事件驱动 ({t_event*1000:.1f} ms) 不比轮询 ({t_poll*1000:.1f} ms) 省"
+
+
+def bench_memory(symbols=300):
+    """满载内存: 旧版 deque[(ts, val)] 元组 vs 列式矩阵"""
+    import tracemalloc
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    legacy = {}
+    for i in range(symbols):
+        obj = {
+            'cvd_buckets': deque(((1e9 + k, float(k)) for k in range(1800)), maxlen=1800),
+            'oi_history': deque(((1e9 + k, float(k)) for k in range(300)), maxlen=300),
+            'funding_history': deque(((1e9 + k, float(k)) for k in range(300)), maxlen=300),
+            'price_history': deque(((1e9 + k, float(k)) for k in range(300)), maxlen=300),
+        }
+        legacy[f"C{i}USDT"] = obj
+    legacy_bytes = tracemalloc.get_traced_memory()[0] - base
+    del legacy
+
+    base = tracemalloc.get_traced_memory()[0]
+    store = MarketStore(capacity=symbols)
+    for i in range(symbols):
+        store.add_symbol(f"C{i}USDT")
+    store_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    report = store.memory_report()
+    print(f"[memory] {symbols} 币种满载")
+    print(f"  旧版 deque 元组 : {legacy_bytes/1024/1024:8.1f} MB  ({legacy_bytes/symbols/1024:.1f} KB/币种)")
+    print(f"  列式矩阵 (实测) : {store_bytes/1024/1024:8.1f} MB  ({store_bytes/symbols/1024:.1f} KB/币种)")
+    print(f"  memory_report   : {report['total_bytes']/1024/1024:8.1f} MB  ({report['bytes_per_symbol']/1024:.1f} KB/币种)")
+
+
+def bench_snapshot(symbols=1000):
+    """热重启快照: 写盘 / 恢复耗时，并校验恢复后窗口查询一致"""
+    import os
+    import tempfile
+    from market_store import save_snapshot
+
+    rng = random.Random(11)
+    clock = FakeClock(time.time())
+    store = MarketStore()
+    _fill_universe(store, symbols, clock, rng)
+    for i in range(symbols):
+        store.views[i].add_trade(1.0, rng.uniform(1, 1e5), rng.random() < 0.5)
+
+    path = os.path.join(tempfile.mkdtemp(), "market_snapshot.npz")
+    t0 = time.perf_counter()
+    snap = store.snapshot()
+    t1 = time.perf_counter()
+    save_snapshot(path, snap)
+    t2 = time.perf_counter()
+
+    fresh = MarketStore()
+    for sym in reversed(store.symbols):  # 行号顺序与快照不同
+        fresh.add_symbol(sym)
+    t3 = time.perf_counter()
+    restored = fresh.restore(path, max_age=600)
+    t4 = time.perf_counter()
+
+    assert restored == symbols
+    for sym in store.symbols[:50]:
+        a, b = store[sym].get_lookback((60, 300, 900)), fresh[sym].get_lookback((60, 300, 900))
+        # 10 分钟前的采样已过期丢弃，只比较窗口在 max_age 内的部分
+        assert a['oi'] == b['oi'] and a['price_past'][300] == b['price_past'][300], sym
+        assert a['cvd'][300] == b['cvd'][300], sym
+        assert all(ts >= clock.now - 600 for ts, _ in fresh[sym].oi_history), sym
+
+    size = os.path.getsize(path)
+    print(f"[snapshot] {symbols} 币种, 文件 {size/1024/1024:.1f} MB")
+    print(f"  内存拷贝 : {(t1 - t0)*1000:8.1f} ms (事件循环内)")
+    print(f"  写盘     : {(t2 - t1)*1000:8.1f} ms (线程池)")
+    print(f"  恢复     : {(t4 - t3)*1000:8.1f} ms")
+
+
+def bench_journal(trades=500_000):
+    """逐笔日志: append 单笔开销 + 按时间范围读取"""
+    import tempfile
+    from tick_journal import TickRecorder, TickReader
+
+    directory = tempfile.mkdtemp()
+    rec = TickRecorder(directory)
+    rng = random.Random(5)
+    syms = [f"C{i}USDT" for i in range(300)]
+    start_ms = 1_700_001_600_000  # 整点前 20 分钟起，覆盖跨小时切段
+    rows = [(rng.choice(syms), i, start_ms + i * 5, rng.uniform(1, 100), rng.uniform(0.1, 10), rng.random() < 0.5)
+            for i in range(trades)]
+
+    t0 = time.perf_counter()
+    for r in rows:
+        rec.append(*r)
+    rec.close()
+    t_write = time.perf_counter() - t0
+
+    reader = TickReader(directory)
+    lo, hi = start_ms + 600_000, start_ms + 1_800_000
+    t0 = time.perf_counter()
+    n = sum(len(part) for part in reader.iter_range(lo, hi))
+    t_read = time.perf_counter() - t0
+    assert n == (hi - lo) // 5, n
+    btc = reader.read_range(lo, hi, symbol=syms[0])
+    assert len(btc) == sum(1 for r in rows if r[0] == syms[0] and lo <= r[2] < hi)
+
+    print(f"[journal] {trades} 笔, {len(reader.segments())} 个段文件")
+    print(f"  append : {t_write/trades*1e6:8.2f} us/笔 (含刷盘)")
+    print(f"  读取   : {n} 笔 / {t_read*1000:.2f} ms (memmap, 整段命中时零拷贝)")
+
+
+def bench_decode(frames=200_000, symbols=300):
+    """
+    WS 成交帧处理: json.loads + 逐帧 add_trade vs 快速解码 + 微批合并写入 (单核 条/秒)
+    分两种分布: 均匀 / 连环爆仓 (80% 成交集中在 5 个币种)
+    """
+    import json
+    from data_collector import DataCollector
+    from ws_decode import BACKEND
+
+    rng = random.Random(9)
+    names = [f"C{i}USDT" for i in range(symbols)]
+    clock = FakeClock(1_700_000_000.0)
+
+    def make_frames(pick):
+        return [json.dumps({
+            "e": "aggTrade", "E": 1_700_000_000_000 + i, "a": 5_000_000 + i, "s": pick(),
+            "p": f"{rng.uniform(0.01, 60_000):.4f}", "q": f"{rng.uniform(0.001, 500):.3f}",
+            "f": 100 + i, "l": 100 + i, "T": 1_700_000_000_000 + i, "m": rng.random() < 0.5,
+        }, separators=(",", ":")) for i in range(frames)]
+
+    def legacy(store, texts):
+        for text in texts:
+            payload = json.loads(text)
+            if 'e' in payload and payload['e'] == 'aggTrade':
+                s = payload['s']
+                if s in store:
+                    store[s].add_trade(float(payload['p']), float(payload['q']), payload['m'])
+
+    def batched(store, texts, size):
+        collector = DataCollector(store)
+        for i in range(0, len(texts), size):
+            collector.ingest_frames(texts[i:i + size])
+
+    def fresh():
+        store = MarketStore(clock=clock)
+        for s in names:
+            store.add_symbol(s)
+        return store
+
+    scenarios = (
+        ("均匀分布", lambda: rng.choice(names)),
+        ("连环爆仓", lambda: rng.choice(names[:5]) if rng.random() < 0.8 else rng.choice(names)),
+    )
+    print(f"[decode] {frames} 帧, {symbols} 币种, 解码后端: {BACKEND}")
+    for title, pick in scenarios:
+        texts = make_frames(pick)
+        results = []
+        print(f"  -- {title}")
+        for label, fn in (("json + 逐帧 add_trade", lambda st: legacy(st, texts)),
+                          ("快速解码, 逐帧      ", lambda st: batched(st, texts, 1)),
+                          ("快速解码, 微批 64   ", lambda st: batched(st, texts, 64))):
+            store = fresh()
+            t0 = time.perf_counter()
+            fn(store)
+            dt = time.perf_counter() - t0
+            results.append(store.cvd_sums(60))
+            print(f"  {label}: {frames/dt:>10,.0f} 条/秒  ({dt/frames*1e6:.2f} us/条)")
+        assert all(np.allclose(r, results[0]) for r in results[1:]), "CVD 结果不一致"
+
+
+def bench_ring(trades=200_000, symbols=300, batch=2000):
+    """
+    ws 独立进程模式下主进程的每笔成本: 事件循环内解码入库 (ingest_frames) vs 环形缓冲批量取出 (drain)
+    子进程的解码/写缓冲不计入主进程耗时，单独列出
+    """
+    import json
+    from data_collector import DataCollector
+    from ws_decode import decode_agg_trade
+    from ws_process import TRADE_DTYPE, TradeRing, WSIngestProcess
+
+    rng = random.Random(5)
+    names = [f"R{i}USDT" for i in range(symbols)]
+    clock = FakeClock(1_700_000_000.0)
+    picks = [rng.randrange(symbols) for _ in range(trades)]
+    texts = [json.dumps({"e": "aggTrade", "s": names[r], "a": i, "T": i, "p": f"{rng.uniform(1, 100):.4f}",
+                         "q": f"{rng.uniform(0.1, 50):.3f}", "m": rng.random() < 0.5}, separators=(",", ":"))
+             for i, r in enumerate(picks)]
+
+    def fresh():
+        store = MarketStore(clock=clock)
+        for s in names:
+            store.add_symbol(s)
+        return store
+
+    store_a = fresh()
+    collector = DataCollector(store_a)
+    t0 = time.perf_counter()
+    for i in range(0, trades, batch):
+        collector.ingest_frames(texts[i:i + batch])
+    inline = time.perf_counter() - t0
+
+    store_b = fresh()
+    ring = TradeRing(1 << 18)
+    proc = WSIngestProcess(store_b)
+    proc.ring = ring
+    produce = drain = 0.0
+    try:
+        for i in range(0, trades, batch):
+            t0 = time.perf_counter()
+            records = []
+            for text in texts[i:i + batch]:  # 子进程: 解码 + 写缓冲
+                s, trade_id, event_ms, price, qty, maker = decode_agg_trade(text)
+                records.append((store_b.index[s], maker, trade_id, event_ms, price, qty))
+            ring.push(np.array(records, dtype=TRADE_DTYPE))
+            t1 = time.perf_counter()
+            proc.drain()                     # 主进程: 取出 + 向量化合并入库
+            t2 = time.perf_counter()
+            produce += t1 - t0
+            drain += t2 - t1
+    finally:
+        proc.ring = None
+        ring.close()
+    assert np.allclose(store_a.cvd_sums(60), store_b.cvd_sums(60)), "CVD 结果不一致"
+    assert np.array_equal(store_a.price, store_b.price)
+
+    print(f"[ring] {trades:,} 笔, {symbols} 币种, 每批 {batch} 笔")
+    print(f"  主进程 ingest_frames (解码+入库): {inline/trades*1e6:6.2f} us/笔")
+    print(f"  主进程 环形缓冲 drain (入库)    : {drain/trades*1e6:6.2f} us/笔  ({inline/drain:.1f}x)")
+    print(f"  子进程 解码+写缓冲              : {produce/trades*1e6:6.2f} us/笔")
+
+
+def bench_spread(coins=1000, venues=10, passes=50):
+    """
+    价差一轮: 各所报价填矩阵 + 整矩阵算价差/阈值/冷却 (不含网络)
+    与逐对 Python 计算的超阈值集合比对
+    """
+    from spread_monitor import SpreadMonitor
+    from spread_matrix import SpreadMatrix
+    from symbol_map import SymbolMap
+
+    class FakeExchange:
+        def __init__(self, markets):
+            self.markets = markets
+
+    rng = random.Random(13)
+    bases = [f"C{i}" for i in range(coins)]
+    store = MarketStore()
+    for b in bases:
+        store.add_symbol(f"{b}USDT")
+    store.price[:coins] = [rng.uniform(0.01, 1000) for _ in range(coins)]
+    prices = store.prices()
+
+    mon = SpreadMonitor.__new__(SpreadMonitor)
+    mon.data_store, mon.threshold = store, 0.05
+    mon.symbol_map, mon.matrix = SymbolMap(), SpreadMatrix()
+    mon.exchanges, mon.market_types = {}, {}
+    venue_names = [f"v{j}_{'swap' if j % 2 else 'spot'}" for j in range(venues)]
+    for name in venue_names:
+        swap = name.endswith("swap")
+        markets = {}
+        for b in bases:
+            if rng.random() < 0.8:
+                sym = f"{b}/USDT:USDT" if swap else f"{b}/USDT"
+                markets[sym] = {"symbol": sym, "base": b, "quote": "USDT", "settle": "USDT" if swap else None,
+                                "spot": not swap, "swap": swap, "linear": swap or None, "contractSize": 1}
+        mon.exchanges[name] = FakeExchange(markets)
+        mon.market_types[name] = "swap" if swap else "spot"
+
+    def tickers_for(name, p):
+        return {sym: {"last": float(prices[store.index[m["base"] + "USDT"]]) * (rng.choice((1.08, 0.9)) if rng.random() < 0.01 else rng.uniform(0.99, 1.01))}
+                for sym, m in mon.exchanges[name].markets.items()} if p >= 0 else {}
+
+    rounds = [[{"source": name, "data": tickers_for(name, p)} for name in venue_names] for p in range(passes)]
+    mon._evaluate(rounds[0], prices, 0.0)  # 首轮建映射
+
+    t_vec = 0.0
+    for p, results in enumerate(rounds):
+        t0 = time.perf_counter()
+        mon._evaluate(results, prices, 1_700_000_000.0 + p)
+        t_vec += time.perf_counter() - t0
+
+        # 逐对参照
+        expect = set()
+        for res in results:
+            for sym, t in res["data"].items():
+                bp = float(prices[store.index[mon.exchanges[res["source"]].markets[sym]["base"] + "USDT"]])
+                if abs((t["last"] - bp) / bp) >= mon.threshold:
+                    expect.add((mon.exchanges[res["source"]].markets[sym]["base"], res["source"]))
+        assert {(a["coin"], a["ex"]) for a in mon.latest_alerts} == expect, f"pass {p}: 价差结果不一致"
+
+    m = mon.matrix
+    t0 = time.perf_counter()
+    for p in range(passes):
+        m.alerts(mon.threshold, 1800, 1_800_000_000.0 + p)
+    t_alert = (time.perf_counter() - t0) / passes
+    print(f"[spread] {coins} 币种 × {venues} 交易所, 矩阵 {m.pct.shape}, 每轮超阈值 {len(mon.latest_alerts)} 对")
+    print(f"  一轮 (填报价 + 价差/阈值/冷却): {t_vec/passes*1000:6.2f} ms")
+    print(f"  其中 阈值 + 冷却掩码          : {t_alert*1000:6.2f} ms")
+
+
+def bench_spread_ws(coins=200, ticks=200):
+    """
+    价差流式模式联调: 本地假 OKX WS 服务器推送报价, 测从推送到发出价差警报的延迟;
+    随后关停服务器, 确认断流后该所回退 REST 报价
+    """
+    import asyncio
+    from aiohttp import web
+    from config import CONFIG
+    from exchange_hub import ExchangeHub
+    from spread_monitor import SpreadMonitor
+    from spread_matrix import SpreadMatrix
+    from symbol_map import SymbolMap
+
+    bases = [f"C{i}" for i in range(coins)]
+    markets = {f"{b}/USDT": {"id": f"{b}-USDT", "symbol": f"{b}/USDT", "base": b, "quote": "USDT", "spot": True}
+               for b in bases}
+
+    class FakeExchange:
+        def __init__(self):
+            self.markets = markets   # 视为已加载 (不走 markets 缓存)
+            self.rest_price = 100.0
+
+        async def fetch_tickers(self):
+            return {s: {"last": self.rest_price} for s in markets}
+
+    class Notifier:
+        def __init__(self):
+            self.sent = []
+
+        async def send_message(self, msg):
+            self.sent.append((time.perf_counter(), msg))
+
+    sent_at = {}
+
+    async def main():
+        subscribed = asyncio.Event()
+        sockets = []
+
+        async def handler(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            sockets.append(ws)
+            async for msg in ws:
+                if msg.data != "ping":
+                    subscribed.set()
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/okx", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        cfg = CONFIG["spread_stream"]
+        hub_cfg = CONFIG["exchange_hub"]["tickers"]
+        saved = dict(cfg), CONFIG["thresholds"]["spread_cooldown"], hub_cfg["ttl"]
+        cfg.update(enabled=True, eval_interval=0.0, stale_seconds=1.0, urls={"okx_spot": f"ws://127.0.0.1:{port}/okx"})
+        CONFIG["thresholds"]["spread_cooldown"] = 0
+        hub_cfg["ttl"] = 0.2
+
+        store = MarketStore()
+        for b in bases:
+            store.add_symbol(f"{b}USDT")
+        store.price[:coins] = 100.0
+        mon = SpreadMonitor.__new__(SpreadMonitor)  # 不走 _init_exchanges (不连真实交易所)
+        mon.notifier, mon.data_store = Notifier(), store
+        mon.threshold, mon.check_interval = 0.05, 0.5
+        mon.symbol_map, mon.matrix = SymbolMap(), SpreadMatrix()
+        mon.hub = ExchangeHub()
+        mon.hub.clients[("okx", "spot")] = FakeExchange()
+        mon.exchanges, mon.market_types = {"okx_spot": mon.hub.client("okx", "spot")}, {"okx_spot": "spot"}
+        mon.venues = {"okx_spot": ("okx", "spot")}
+        mon.latest_alerts, mon.streams, mon.rest_tickers, mon._stream_tasks = [], {}, {}, []
+        mon._stream_event, mon._pending_since, mon.proxy_url = None, 0.0, None
+        task = asyncio.create_task(mon._run_streaming())
+        try:
+            await asyncio.wait_for(subscribed.wait(), 5)
+            await asyncio.sleep(0.2)
+            ws = sockets[-1]
+            delays = []
+            for i in range(ticks):
+                coin = bases[i % coins]
+                n = len(mon.notifier.sent)
+                t0 = time.perf_counter()
+                await ws.send_json({"arg": {"channel": "tickers"}, "data": [{"instId": f"{coin}-USDT", "last": "110"}]})
+                while len(mon.notifier.sent) == n:
+                    await asyncio.sleep(0)
+                delays.append(mon.notifier.sent[-1][0] - t0)
+                assert coin in mon.notifier.sent[-1][1]
+                await ws.send_json({"arg": {"channel": "tickers"}, "data": [{"instId": f"{coin}-USDT", "last": "100"}]})
+                await asyncio.sleep(0.005)
+            stream = mon.streams["okx_spot"]
+            assert mon._streaming("okx_spot")
+
+            # 断流 -> REST 兜底 (REST 报价 120, 全部币种超阈值)
+            mon.exchanges["okx_spot"].rest_price = 120.0
+            for ws in sockets:
+                await ws.close()
+            await runner.cleanup()
+            deadline = time.perf_counter() + 10
+            while not any(a["pct"] > 0.15 for a in mon.latest_alerts):
+                assert time.perf_counter() < deadline, "断流后未回退 REST"
+                await asyncio.sleep(0.05)
+            fallback = mon.stream_stats()["rest_fallback"]
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            cfg.clear()
+            cfg.update(saved[0])
+            CONFIG["thresholds"]["spread_cooldown"] = saved[1]
+            hub_cfg["ttl"] = saved[2]
+        return delays, stream.stats(), fallback
+
+    delays, stats, fallback = asyncio.run(main())
+    delays.sort()
+    print(f"[spread_ws] 假 OKX 服务器, {coins} 交易对, {len(delays)} 次价差脉冲, 推送 {stats['messages']} 条")
+    print(f"  推送 -> 警报: p50 {delays[len(delays)//2]*1000:.2f} ms, p99 {delays[int(len(delays)*0.99)]*1000:.2f} ms")
+    print(f"  关停服务器后回退 REST: {fallback}")
+
+
+def bench_hub(venues=4, minutes=10, latency=0.02):
+    """
+    外所行情入口: 价差监控 (每 15s) 与 OI 对比 (每 60s) 拉同一批 swap 行情;
+    按真实节奏压缩时间模拟 (1s -> 10ms)，统计共享前后的外发请求数，并校验同时到达的请求只发一次
+    """
+    import asyncio
+    from config import CONFIG
+    from exchange_hub import ExchangeHub
+
+    scale = 0.01   # 模拟 1 秒 = 10 ms
+
+    class FakeExchange:
+        def __init__(self):
+            self.calls = 0
+            self.markets = {"BTC/USDT:USDT": {}}   # 视为已加载 (不走 markets 缓存)
+
+        async def fetch_tickers(self):
+            self.calls += 1
+            await asyncio.sleep(latency)
+            return {"BTC/USDT:USDT": {"last": 1.0}}
+
+    async def main():
+        cfg = CONFIG["exchange_hub"]
+        saved = dict(cfg["tickers"]), cfg["oi_tickers_max_age"]
+        cfg["tickers"] = {"ttl": 10 * scale, "timeout": 5}
+        cfg["oi_tickers_max_age"] = saved[1] * scale
+        hub = ExchangeHub()
+        names = [f"v{i}" for i in range(venues)]
+        for n in names:
+            hub.clients[(n, "swap")] = FakeExchange()
+        try:
+            # 并发合并: 同一时刻 5 个调用方只发 1 次
+            await asyncio.gather(*(hub.tickers(names[0], "swap") for _ in range(5)))
+            assert hub.clients[(names[0], "swap")].calls == 1
+            hub.clients[(names[0], "swap")].calls = 0
+            hub._cache.clear()
+
+            async def consumer(interval, max_age, passes):
+                for _ in range(passes):
+                    t0 = time.perf_counter()
+                    await asyncio.gather(*(hub.tickers(n, "swap", max_age=max_age) for n in names))
+                    await asyncio.sleep(max(0, interval * scale - (time.perf_counter() - t0)))
+
+            await asyncio.gather(consumer(15, None, minutes * 4),
+                                 consumer(60, cfg["oi_tickers_max_age"], minutes))
+        finally:
+            cfg["tickers"], cfg["oi_tickers_max_age"] = saved
+        return sum(ex.calls for ex in hub.clients.values()), hub.counters["tickers"]
+
+    shared, counters = asyncio.run(main())
+    separate = venues * minutes * (4 + 1)
+    print(f"[hub] {venues} 个 swap 交易所 × {minutes} 分钟: 价差每 15s + OI 每 60s")
+    print(f"  各自拉取: {separate} 次请求   共享入口: {shared} 次 ({separate/shared:.2f}x)  {counters}")
+
+
+def bench_markets(exchanges=5, markets=2000, latency=1.5):
+    """
+    外所 markets 启动耗时: 冷启动 (无缓存, 每个交易所模拟一次 latency 秒的元数据下载) vs 热启动 (磁盘缓存)
+    每个交易所现货 + 合约两个 ccxt 实例 (真实 ccxt 类, 只替换 fetch_markets/fetch_currencies 的网络部分)
+    """
+    import asyncio
+    import shutil
+    import tempfile
+    import ccxt.async_support as ccxt
+    from config import CONFIG
+    from exchange_hub import ExchangeHub
+
+    downloads = []
+
+    class OfflineOKX(ccxt.okx):
+        async def fetch_currencies(self, params={}):
+            await asyncio.sleep(latency / 3)
+            return {}
+
+        async def fetch_markets(self, params={}):
+            downloads.append(self.id)
+            await asyncio.sleep(latency)
+            out = []
+            for i in range(markets):
+                swap = i % 2 == 1
+                base = f"C{i // 2}"
+                out.append({
+                    "id": f"{base}-USDT" + ("-SWAP" if swap else ""), "symbol": f"{base}/USDT" + (":USDT" if swap else ""),
+                    "base": base, "quote": "USDT", "settle": "USDT" if swap else None, "baseId": base, "quoteId": "USDT",
+                    "settleId": "USDT" if swap else None, "type": "swap" if swap else "spot", "spot": not swap,
+                    "margin": False, "swap": swap, "future": False, "option": False, "contract": swap,
+                    "linear": True if swap else None, "inverse": False if swap else None, "active": True,
+                    "contractSize": 0.01 if swap else None, "precision": {"price": 0.0001, "amount": 0.01},
+                    "limits": {"amount": {"min": 0.01, "max": None}, "price": {"min": None, "max": None}},
+                    "info": {"instId": base, "state": "live", "lotSz": "0.01", "tickSz": "0.0001"},
+                })
+            return out
+
+    async def start(hub):
+        for i in range(exchanges):
+            for t in ("spot", "swap"):
+                ex = OfflineOKX({"enableRateLimit": False})
+                if t == "swap": ex.options["defaultType"] = "swap"
+                hub.clients[(f"x{i}", t)] = ex
+        try:
+            seconds = await hub.prepare_markets()
+            assert all(ex.markets and len(ex.markets) == markets for ex in hub.clients.values())
+            return seconds
+        finally:
+            await hub.close()
+
+    tmp = tempfile.mkdtemp()
+    saved = CONFIG["market_cache"]["dir"]
+    CONFIG["market_cache"]["dir"] = tmp
+    try:
+        cold = asyncio.run(start(ExchangeHub()))
+        cold_downloads = len(downloads)
+        warm = asyncio.run(start(ExchangeHub()))
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+    finally:
+        CONFIG["market_cache"]["dir"] = saved
+        shutil.rmtree(tmp)
+    print(f"[markets] {exchanges} 交易所 × (现货+合约) 实例, 每所 {markets} 个 markets, 模拟下载 {latency}s")
+    print(f"  冷启动 (下载 {cold_downloads} 次): {cold:6.2f} s")
+    print(f"  热启动 (磁盘缓存)    : {warm:6.2f} s  (下载 {len(downloads) - cold_downloads} 次, 缓存 {size/1e6:.1f} MB)")
+
+
+def bench_replay(symbols=200, hours=1):
+    """回放引擎吞吐: 合成行情, 批量 / 逐币种两种模式 (并校验警报一致)"""
+    from replay import ReplayEngine, synthetic_events
+
+    names, chunks = synthetic_events(symbols, hours * 3600, seed=11)
+    chunks = list(chunks)
+    batch = ReplayEngine(names, batch=True).run(chunks)
+    loop = ReplayEngine(names, batch=False).run(chunks)
+    assert [a[:3] for a in batch["alerts"]] == [a[:3] for a in loop["alerts"]]
+
+    print(f"[replay] {symbols} 币种 × {hours}h 合成行情, {batch['events']:,} 事件, {len(batch['alerts'])} 条警报")
+    for label, r in (("批量 check_all", batch), ("逐币种 check ", loop)):
+        print(f"  {label}: {r['wall_seconds']:6.2f} s  {r['events_per_sec']:>10,.0f} 事件/秒  {r['speedup']:>6,.0f}x 实时")
+
+
+BENCHES = {
+    "cvd": bench_cvd,
+    "store": bench_store,
+    "strategy": bench_strategy,
+    "memory": bench_memory,
+    "snapshot": bench_snapshot,
+    "journal": bench_journal,
+    "replay": bench_replay,
+    "decode": bench_decode,
+    "event": bench_event,
+    "ring": bench_ring,
+    "spread": bench_spread,
+    "spread_ws": bench_spread_ws,
+    "hub": bench_hub,
+    "markets": bench_markets,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHES)
+    for name in names:
+        t0 = time.perf_counter()
+        BENCHES[name]()
+        print(f"  ({time.perf_counter() - t0:.1f}s)\n")
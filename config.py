@@ -31,6 +31,9 @@ CONFIG = {
         # --- OI 阈值 ---
         "oi_small_cap": 30_000_000, "oi_change_abs": 1_000_000, "oi_change_pct": 0.05,
 
+        # --- CVD+OI 组合 (多头/空头流入) ---
+        "cvd_inflow": 5_000_000,
+
         # --- 资金费率阈值 ---
         "funding_levels": [0.005, 0.010, 0.018], "funding_critical": 0.020,
         
@@ -39,7 +42,162 @@ CONFIG = {
         "spread_cooldown": 1800 
     },
     
+    # --- 列式行情存储 ---
+    "store": {
+        "initial_capacity": 512,   # 预分配行数 (币种数)，不够时自动翻倍
+        "history_len": 400,        # OI 历史每币种采样槽数 (热门币种 5 秒一采样约 33 分钟)
+        "stream_history_len": 2000 # 资金费率/价格历史 (markPrice 流 1 秒一采样，约 33 分钟；不足 cvd_long_window 的 1.1 倍时按其补足)
+    },
+
+    # --- 热重启快照 (CVD/OI/资金费率/价格滚动数据) ---
+    "snapshot": {
+        "enabled": True,
+        "filename": "market_snapshot.npz",
+        "interval_seconds": 60,
+        "max_age_seconds": 1800    # 早于此时长的采样在恢复时丢弃
+    },
+
+    # --- aggTrade WebSocket 分片 ---
+    "ws": {
+        "streams_per_shard": 100,     # 每条连接最多订阅的币种数 (Binance 上限 1024)
+        "backoff_initial": 1,         # 断线重连初始等待 (秒)，逐次翻倍
+        "backoff_max": 60,
+        "stable_seconds": 60,         # 连接保持超过此时长才重置退避
+        "heartbeat": 30,              # WS ping 间隔 (秒)
+        "rate_report_interval": 300   # 各分片消息速率日志间隔 (秒)
+    },
+
+    # --- aggTrade 独立进程接收 (收包/解码移出主事件循环, 经共享内存环形缓冲交给主进程) ---
+    "ws_process": {
+        "enabled": False,
+        "ring_capacity": 1 << 18,     # 环形缓冲条数 (41B/条)，主进程来不及取时新成交直接丢弃并计数
+        "drain_interval": 0.05,       # 主进程取数间隔 (秒)
+        "restart_delay": 5            # 子进程异常退出后的重启等待 (秒)
+    },
+
+    # --- 全市场标记价格/资金费率推送 (!markPrice@arr@1s) ---
+    "mark_stream": {
+        "enabled": True,
+        "stale_seconds": 10        # 超过此时长无推送则 REST 批量 premiumIndex 兜底
+    },
+
+    # --- OI 轮询调度 (按活跃度分配请求权重) ---
+    "oi_scheduler": {
+        "min_interval": 5,               # 热门币种轮询间隔 (秒)
+        "max_interval": 120,             # 冷门币种轮询间隔 (秒)
+        "max_requests_per_minute": 600,  # OI 请求总速率上限 (原固定轮询 300 币种 × 2 接口/分钟)
+        "weight_budget": 1200,           # X-MBX-USED-WEIGHT-1M 超过此值即不再发 OI 请求，给其他模块留余量
+        "hot_ratio": 0.5,                # 任一指标达到报警阈值的此比例即视为热门
+        "cvd_oi_ratio": 0.01,            # 5 分钟净主动成交 / OI 达到此比例记为满分
+        "priority_interval": 5,          # 重新打分间隔 (秒)
+        "max_concurrency": 10,
+        "tick": 0.5
+    },
+
+    # --- 进程级 Binance REST 权重调度 (所有模块共用) ---
+    "rate_governor": {
+        "hosts": {                       # 每分钟权重上限 (IP 维度)
+            "fapi.binance.com": 2400,
+            "api.binance.com": 6000
+        },
+        "budget_ratio": 0.8              # 只用上限的这一比例，留出余量防封 IP
+    },
+
+    # --- 共享 HTTP 客户端 (按 host 分组的长连接池) ---
+    "http": {
+        "defaults": {
+            "limit": 100,              # 单组连接总数上限
+            "limit_per_host": 10,      # 单 host 并发连接上限
+            "keepalive_timeout": 60,   # 空闲连接保活 (秒)，期间的请求复用连接，免去 TCP/TLS 握手
+            "dns_ttl": 300,            # DNS 缓存 (秒)
+            "timeout": 15,             # 单次请求总超时 (秒)
+            "connect_timeout": 10
+        },
+        "groups": {                    # 未列出的 host 归入 default 组
+            "binance": {"hosts": ["fapi.binance.com", "api.binance.com", "www.binance.com"], "limit_per_host": 20},
+            "telegram": {"hosts": ["api.telegram.org"], "timeout": 30},  # getUpdates 长轮询 10 秒
+            "upbit": {"hosts": ["api.upbit.com", "api-manager.upbit.com"]}
+        }
+    },
+
+    # --- aggTrade 逐笔日志 (可选, 用于复盘) ---
+    "journal": {
+        "enabled": False,
+        "dir": "tick_journal",
+        "segment_records": 4_000_000,  # 单个段文件最多条数 (37B/条, 稀疏预分配)
+        "buffer_records": 2048,        # 写缓冲条数，满了即刷入 mmap
+        "flush_interval": 1.0          # 定时刷缓冲 (秒)
+    },
+
     "window_seconds": 300, "cvd_long_window": 1800, "cooldown_seconds": 300, "warmup_seconds": 60,
+    "strategy_batch": True,  # 策略引擎批量向量化模式 (False 则逐币种 check)
+    "abnormal_view": {
+        "event_ttl": 300,           # 价格/OI/规则异动在异常列表里的停留时长 (秒)
+        "refresh_seconds": 5        # 费率异常币种的 OI/CVD/价格数值刷新间隔 (秒)
+    },
+    "strategy_event": {
+        "enabled": True,            # 事件驱动: 只评估有新数据的币种 (关闭则每 5 秒全池扫描)
+        "min_interval": 1.0,        # 同一币种两次评估的最小间隔 (秒)
+        "coalesce_seconds": 2.0,    # 两轮评估的最小间隔 (秒)，期间到达的更新攒到同一轮；每轮固定开销约 0.5ms，
+                                    # 2s 时安静行情 CPU 比 5 秒轮询低约 1/4，调到 1s 则与轮询持平
+        "full_sweep_seconds": 30    # 全池兜底扫描间隔 (秒)
+    },
+
+    # --- 外所行情入口 (价差 / OI 对比 / 充提监控共用 ccxt 实例, 快照 TTL 缓存 + 并发请求合并) ---
+    "exchange_hub": {
+        "client_timeout": 30,                      # ccxt 单次请求超时 (秒)
+        "tickers": {"ttl": 10, "timeout": 15},     # ttl 需小于价差轮询间隔，保证价差每轮拿到新快照
+        "currencies": {"ttl": 60, "timeout": 30},
+        "oi_tickers_max_age": 30                   # OI 对比可接受的行情快照时长 (直接复用价差监控刚拉的快照)
+    },
+
+    # --- 外所 markets 元数据磁盘缓存 (启动免去各所 load_markets 下载) ---
+    "market_cache": {
+        "dir": "market_cache",
+        "ttl": 24 * 3600,             # 缓存超过此时长启动时重新下载
+        "refresh_interval": 3600      # 后台重新拉取并写回缓存的间隔 (秒)
+    },
+
+    # --- 价差监控流式模式 (各所公共 WS 行情推送，报价变化即重算；断流的交易所回退 REST 轮询) ---
+    "spread_stream": {
+        "enabled": False,
+        "eval_interval": 0.2,     # 两次重算的最短间隔 (秒)
+        "stale_seconds": 10,      # 超过此时长无推送视为断流
+        "urls": {}                # 覆盖各所 WS 地址, 如 {"okx_spot": "ws://127.0.0.1:8765/okx"} (本地联调)
+    },
+
+    # --- 状态存储 (冷却 / 已读公告 / 链上余额): 到期自动淘汰，超过容量按最近访问淘汰 ---
+    "state_store": {
+        "default_capacity": 10_000,
+        "strategy_cooldowns": {"capacity": 50_000},                  # 冷却记录按各自冷却时长过期
+        "announcement_seen": {"ttl": 30 * 86400, "capacity": 2_000},  # 每次在列表里看到都会续期
+        "onchain_balances": {"ttl": 7 * 86400, "capacity": 5_000}
+    },
+
+    # --- 声明式规则 (见 rules.py): when 为基于命名指标的表达式，启动时编译成整池向量运算 ---
+    # 指标: price / oi / funding, cvd_5m, oi_delta_5m, oi_pct_5m, price_pct_1m, funding_delta_5m (窗口可任意 s/m/h)
+    # 其余名字取 thresholds 同名阈值；按 symbol + 规则名分别冷却 (秒)；优先级排在价格异动之后、OI 异动之前
+    "rules": [
+        {   # PRD 4.1 多头流入: 5m 净主动买入 ≥ 500 万 U，且 OI 按大小盘动态阈值同步放大
+            "name": "LONG_INFLOW", "tag": "🟢 多头流入", "cooldown": 900,
+            "title": "🟢 <b>多头流入 (5m)</b>\n主动买入与持仓同步放大",
+            "when": "cvd_5m >= cvd_inflow and "
+                    "(abs(oi_pct_5m) >= oi_change_pct if oi >= oi_small_cap else abs(oi_delta_5m) >= oi_change_abs)"
+        },
+        {   # PRD 4.1 空头流入: 5m 净主动卖出 ≥ 500 万 U，OI 条件同上
+            "name": "SHORT_INFLOW", "tag": "🔴 空头流入", "cooldown": 900,
+            "title": "🔴 <b>空头流入 (5m)</b>\n主动卖出与持仓同步放大",
+            "when": "cvd_5m <= -cvd_inflow and "
+                    "(abs(oi_pct_5m) >= oi_change_pct if oi >= oi_small_cap else abs(oi_delta_5m) >= oi_change_abs)"
+        },
+    ],
+
+    # --- 延迟观测 (GET /api/system/metrics) ---
+    "metrics": {
+        "lag_interval": 0.1,       # 事件循环滞后采样间隔 (秒)
+        "report_interval": 300     # 汇总日志间隔 (秒)
+    },
+    "uvloop": False,  # 使用 uvloop 事件循环 (需 pip install uvloop)，可与默认循环对比同一套延迟指标
 
     "onchain": {
         "rpcs": {
@@ -1,187 +1,188 @@
 # data_collector.py
 import asyncio
-import aiohttp
-import json
-import time
 import logging
-from collections import deque
+import time
+
+import numpy as np
 from config import CONFIG
+from market_store import MarketData  # MarketData 已迁至 market_store，保留旧导入路径
+from metrics import metrics
+from oi_scheduler import OIScheduler
+from rate_governor import governor
+from ws_decode import decode_agg_trade, loads
+from ws_process import WSIngestProcess
+from ws_shards import MarkPriceShard, WSShardManager
 
 logger = logging.getLogger(__name__)
 
-class MarketData:
-    """单一币种的数据容器"""
-    def __init__(self, symbol):
-        self.symbol = symbol
-        self.price = 0.0
-        
-        # CVD 桶 (30分钟容量)
-        self.cvd_buckets = deque(maxlen=1800) 
-        self.curr_sec_ts = 0
-        self.curr_sec_vol = 0.0
-        
-        # OI 历史
-        self.oi_history = deque(maxlen=300) 
-        
-        # 资金费率历史
-        self.funding_history = deque(maxlen=300)
-        self.funding_rate = 0.0
-
-        # [新增] 价格历史 (用于计算涨跌幅)
-        self.price_history = deque(maxlen=300)
-
-    def add_trade(self, price, qty, is_buyer_maker):
-        self.price = price # 实时更新最新价
-        vol_usd = price * qty
-        signed = -vol_usd if is_buyer_maker else vol_usd
-        
-        now = int(time.time())
-        if now > self.curr_sec_ts:
-            if self.curr_sec_ts > 0:
-                self.cvd_buckets.append((self.curr_sec_ts, self.curr_sec_vol))
-            self.curr_sec_ts = now
-            self.curr_sec_vol = signed
-        else:
-            self.curr_sec_vol += signed
-
-    def get_cvd_sum(self, seconds):
-        now = time.time()
-        cutoff = now - seconds
-        total = self.curr_sec_vol
-        for ts, vol in self.cvd_buckets:
-            if ts >= cutoff: total += vol
-        return total
-
-    def get_oi_delta(self, seconds=300):
-        if not self.oi_history: return 0, 0, 0
-        curr = self.oi_history[-1][1]
-        cutoff = time.time() - seconds
-        past = curr 
-        for ts, val in self.oi_history:
-            if ts >= cutoff:
-                past = val
-                break
-        return curr - past, curr, past
-
-    def get_funding_delta(self, seconds=300):
-        if not self.funding_history: return 0.0
-        curr = self.funding_history[-1][1]
-        cutoff = time.time() - seconds
-        past = curr
-        for ts, val in self.funding_history:
-            if ts >= cutoff:
-                past = val
-                break
-        return curr - past
-
-    def get_price_delta(self, seconds=300):
-        """[新增] 获取价格变化 (当前价, 5分钟前价格)"""
-        curr = self.price
-        if not self.price_history: return curr, curr
-        
-        cutoff = time.time() - seconds
-        past = curr
-        # 寻找历史价格
-        for ts, val in self.price_history:
-            if ts >= cutoff:
-                past = val
-                break
-        return curr, past
+BULK_MIN_ROWS = 8  # 一批涉及的币种数达到此值才走向量化写入，少量时逐行更快
+METRIC_SAMPLE_BATCHES = 32  # 解码耗时 / 成交延迟每隔这么多批采样一次 (逐帧到达时每批只有一帧，计时本身就是大头)
+_DECODE_HIST = metrics.histogram("ws.decode_per_frame")
+_TRADE_AGE_HIST = metrics.histogram("ws.trade_age")
 
 class DataCollector:
-    def __init__(self, data_store):
+    def __init__(self, data_store, journal=None, http_client=None):
         self.data_store = data_store 
         self.proxy = CONFIG['proxy'] or None
-        self.ws_connection = None 
+        self.journal = journal  # 可选: TickRecorder 逐笔落盘
+        self.http = http_client  # 共享 HTTP 客户端，REST 轮询时必需
+
+        self.ws = WSShardManager(data_store, self._on_ws_message, self.proxy)
+        # 可选: aggTrade 收包/解码放到独立进程，经共享内存交回 (见 ws_process)
+        self.ws_proc = WSIngestProcess(data_store, journal, self.proxy) if CONFIG["ws_process"]["enabled"] else None
+        self._frames = []              # 待处理的 WS 帧 (微批)
+        self._batches = 0              # 已处理批数 (指标采样用)
+        self._flush_scheduled = False
+        self.mark_ws = MarkPriceShard(self._on_mark_message, self.proxy)
+        self.oi_scheduler = OIScheduler(data_store, self.proxy)
 
     async def dynamic_subscribe(self, new_symbols):
-        if not self.ws_connection or self.ws_connection.closed:
-            return
-        params = [f"{s.lower()}@aggTrade" for s in new_symbols]
-        payload = {"method": "SUBSCRIBE", "params": params, "id": int(time.time())}
         try:
-            await self.ws_connection.send_json(payload)
+            if self.ws_proc:
+                self.ws_proc.add_symbols(new_symbols)
+            else:
+                await self.ws.assign(new_symbols)
             logger.info(f"✅ 动态订阅: {new_symbols}")
         except Exception as e:
             logger.error(f"动态订阅失败: {e}")
 
     async def run_ws(self):
-        while True:
-            current_symbols = list(self.data_store.keys())
-            if not current_symbols:
-                await asyncio.sleep(2)
-                continue
-
-            base_streams = [f"{s.lower()}@aggTrade" for s in current_symbols]
-            url = "wss://fstream.binance.com/ws/" + "/".join(base_streams[:10])
-            
+        """aggTrade 按分片多连接接收 (见 ws_shards.WSShardManager)；ws_process 模式下在子进程里跑"""
+        if self.ws_proc:
+            await self.ws_proc.run()
+        else:
+            await self.ws.run()
+
+    async def run_mark_stream(self):
+        """全市场标记价格推送: 每秒更新所有币种的资金费率与价格采样"""
+        if not CONFIG["mark_stream"]["enabled"]: return
+        await self.mark_ws.run()
+
+    def _mark_live(self):
+        cfg = CONFIG["mark_stream"]
+        return cfg["enabled"] and self.mark_ws.fresh(cfg["stale_seconds"])
+
+    def _on_mark_message(self, text):
+        metrics.count("ws.mark_messages")
+        items = loads(text)
+        if not isinstance(items, list): return  # 订阅回执
+        self.apply_funding([d["s"] for d in items], [d["r"] for d in items])
+
+    def apply_funding(self, symbols, rates):
+        """
+        批量写入资金费率 (markPrice 推送 / REST premiumIndex 兜底共用)
+        同时记一次价格快照 (最新成交价，与策略里的当前价同口径)
+        """
+        store = self.data_store
+        index = store.index
+        rows, values = [], []
+        for s, r in zip(symbols, rates):
+            row = index.get(s)
+            if row is not None and r not in (None, ""):
+                rows.append(row)
+                values.append(float(r))
+        if not rows: return
+        rows = np.array(rows, dtype=np.int64)
+        values = np.array(values)
+        now = store.clock()
+        changed = rows[store.funding_rate[rows] != values]
+        store.funding_rate[rows] = values
+        store.funding.append_many(rows, now, values)
+        prices = store.price[rows]
+        traded = prices > 0
+        store.price_hist.append_many(rows[traded], now, prices[traded])
+        # 每秒全量推送，只有费率变了的币种才需要重新评估 (价格变动由成交触发)
+        if len(changed):
+            store.mark_dirty(changed)
+
+    def _on_ws_message(self, text):
+        """
+        收帧只入队，本轮事件循环内已到达的帧 (socket 缓冲里的积压) 攒成一批，
+        在 call_soon 回调里统一解码入库
+        """
+        self._frames.append(text)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_frames)
+
+    def _flush_frames(self):
+        frames, self._frames = self._frames, []
+        self._flush_scheduled = False
+        try:
+            self.ingest_frames(frames)
+        except Exception as e:
+            logger.error(f"成交帧处理失败: {e}")
+
+    def ingest_frames(self, frames):
+        """解码一批 aggTrade 帧，按币种合并本秒净成交额后写入 MarketStore"""
+        self._batches += 1
+        sampled = self._batches % METRIC_SAMPLE_BATCHES == 0
+        t0 = time.perf_counter() if sampled else 0.0
+        store = self.data_store
+        index = store.index   # symbol -> 行号，免去逐帧构造 MarketData 视图
+        journal = self.journal
+        acc = {}              # 行号 -> [净成交额, 最新价]
+        event_ms = 0
+        bad = 0
+        for text in frames:
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.ws_connect(url, proxy=self.proxy) as ws:
-                        self.ws_connection = ws
-                        logger.info(f"WS已连接 (Pool: {len(current_symbols)})")
-                        
-                        if len(base_streams) > 10:
-                            remaining = base_streams[10:]
-                            for i in range(0, len(remaining), 50):
-                                batch = remaining[i:i+50]
-                                await ws.send_json({"method": "SUBSCRIBE", "params": batch, "id": 1})
-                                await asyncio.sleep(0.2)
-
-                        async for msg in ws:
-                            if msg.type == aiohttp.WSMsgType.TEXT:
-                                payload = json.loads(msg.data)
-                                if 'e' in payload and payload['e'] == 'aggTrade':
-                                    s = payload['s']
-                                    if s in self.data_store:
-                                        self.data_store[s].add_trade(
-                                            float(payload['p']), float(payload['q']), payload['m']
-                                        )
-            except Exception as e:
-                logger.error(f"WS重连: {e}")
-                self.ws_connection = None
-                await asyncio.sleep(5)
+                t = decode_agg_trade(text)
+            except Exception as e:  # 单帧损坏只丢这一帧，不拖累同批其他成交
+                bad += 1
+                logger.debug(f"成交帧解析失败: {e}: {text[:200]!r}")
+                continue
+            if t is None: continue
+            s, trade_id, event_ms, price, qty, maker = t
+            row = index.get(s)
+            if row is None: continue
+            vol = price * qty
+            signed = -vol if maker else vol
+            cell = acc.get(row)
+            if cell is None:
+                acc[row] = [signed, price]
+            else:
+                cell[0] += signed
+                cell[1] = price
+            if journal:
+                journal.append(s, trade_id, event_ms, price, qty, maker)
+        metrics.count("ws.messages", len(frames))
+        if bad:
+            metrics.count("ws.bad_frames", bad)
+        if not acc: return
+        # 抽样: 单帧解码耗时 (批内平均) 与最新一笔成交从撮合到本地的延迟
+        if sampled:
+            _DECODE_HIST.observe((time.perf_counter() - t0) / len(frames))
+            _TRADE_AGE_HIST.observe(max(0.0, time.time() - event_ms / 1000))
+
+        sec = int(store.clock())
+        if len(acc) < BULK_MIN_ROWS:
+            for row, (signed, price) in acc.items():
+                store.price[row] = price
+                store.cvd.add(row, sec, signed)
+                store.mark_dirty(row)
+        else:
+            rows = np.fromiter(acc, dtype=np.int64, count=len(acc))
+            vals = np.array(list(acc.values()))
+            store.add_trades(rows, sec, vals[:, 0], vals[:, 1])
 
     async def run_rest_poller(self):
-        async with aiohttp.ClientSession() as session:
-            while True:
-                symbols = list(self.data_store.keys())
-                start_time = time.time()
-                # NOTE: 批量大小和间隔经过调优，避免触发 Binance 限频封禁
-                # 300 币种 × 2 接口 = 600 请求，分 30 批 × 1 秒间隔 ≈ 30 秒完成
-                batch_size = 10
-                for i in range(0, len(symbols), batch_size):
-                    batch = symbols[i : i + batch_size]
-                    tasks = [self._fetch_single_symbol(session, s) for s in batch]
-                    await asyncio.gather(*tasks)
-                    await asyncio.sleep(1)
-
-                elapsed = time.time() - start_time
-                if elapsed < 60:
-                    await asyncio.sleep(60 - elapsed)
-
-    async def _fetch_single_symbol(self, session, symbol):
+        """OI 按活跃度调度轮询；markPrice 推送中断时每分钟批量 premiumIndex 兜底"""
+        await asyncio.gather(self.oi_scheduler.run(self.http), self._loop_premium_fallback(self.http))
+
+    async def _loop_premium_fallback(self, session):
+        while True:
+            # 一次批量 premiumIndex 拿全市场费率 (权重 10)
+            if not self._mark_live():
+                await self._fetch_premium_index(session)
+            await asyncio.sleep(60)
+
+    @metrics.timed("rest.premium_index")
+    async def _fetch_premium_index(self, session):
         try:
-            # OI
-            u_oi = f"https://fapi.binance.com/fapi/v1/openInterest?symbol={symbol}"
-            async with session.get(u_oi, proxy=self.proxy) as r:
+            url = "https://fapi.binance.com/fapi/v1/premiumIndex"
+            async with governor.get(session, url, "premium_index", proxy=self.proxy) as r:
                 if r.status == 200:
-                    d = await r.json()
-                    price = self.data_store[symbol].price
-                    if price > 0:
-                        val = float(d['openInterest']) * price
-                        self.data_store[symbol].oi_history.append((time.time(), val))
-                        # [新增] 顺便记录价格历史快照
-                        self.data_store[symbol].price_history.append((time.time(), price))
-            
-            # Funding
-            u_fund = f"https://fapi.binance.com/fapi/v1/premiumIndex?symbol={symbol}"
-            async with session.get(u_fund, proxy=self.proxy) as r:
-                if r.status == 200:
-                    d = await r.json()
-                    f_rate = float(d['lastFundingRate'])
-                    self.data_store[symbol].funding_rate = f_rate
-                    self.data_store[symbol].funding_history.append((time.time(), f_rate))
-                    
-        except Exception:
-            pass
+                    items = await r.json()
+                    self.apply_funding([d['symbol'] for d in items], [d['lastFundingRate'] for d in items])
+        except Exception as e:
+            logger.error(f"premiumIndex 批量拉取失败: {e}")
@@ -31,7 +31,7 @@ echo "🐍 配置 Python 环境..."
 python3 -m venv venv
 source venv/bin/activate
 pip install --upgrade pip
-pip install aiohttp>=3.9.0 web3>=6.0.0 ccxt>=4.0.0 requests>=2.28.0
+pip install aiohttp>=3.9.0 web3>=6.0.0 ccxt>=4.0.0 numpy>=1.24.0 requests>=2.28.0
 
 # 5. VPS 上不需要代理，修改 config.py 中的 proxy 为空
 # NOTE: 使用 sed 将代理地址替换为空字符串
@@ -0,0 +1,203 @@
+# exchange_hub.py
+"""
+进程级共享的外所行情入口 (价差监控 / OI 对比 / 充提监控共用)
+每个 (交易所, 市场类型) 只有一个 ccxt 实例 (markets 只加载一次)；
+行情 (fetch_tickers) 与币种 (fetch_currencies) 快照带 TTL 缓存，TTL 内直接复用，
+同一快照同时被多方请求时合并成一次请求 (后到的等待同一个 in-flight 任务)。
+返回的快照为多方共享，调用方只读不改。统计见 GET /api/system/exchanges。
+
+markets / currencies 元数据按交易所缓存到磁盘 (CONFIG["market_cache"])：
+缓存未过期时启动直接加载 (同一交易所的现货/合约实例共用一份)，过期或缺失才走网络 load_markets；
+后台定期重新拉取并写回缓存，markets 变化后 symbol_map / 行情推送按新 markets 重建订阅。
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+import ccxt.async_support as ccxt
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeHub:
+    def __init__(self, proxy=None):
+        self.proxy = proxy
+        self.clients = {}     # (交易所, 市场类型) -> ccxt 实例
+        self._cache = {}      # (交易所, 市场类型, 种类) -> (获取时间, 快照)
+        self._inflight = {}   # 同上 key -> 正在进行的请求任务
+        self.counters = {}    # 种类 -> {fetches, hits, coalesced, errors}
+        self._market_tasks = {}   # 交易所 -> markets 加载任务 (现货/合约实例共用)
+        self.market_loads = {}    # 交易所 -> {source: cache/network, seconds, markets}
+
+    def client(self, name, market_type='spot'):
+        """(交易所, 市场类型) 对应的 ccxt 实例 (首次使用时创建)"""
+        key = (name, market_type)
+        ex = self.clients.get(key)
+        if ex is None:
+            ex = getattr(ccxt, name)({
+                'timeout': CONFIG['exchange_hub']['client_timeout'] * 1000,
+                'enableRateLimit': True,
+                'proxies': {'http': self.proxy, 'https': self.proxy},
+            })
+            if market_type == 'swap':
+                ex.options['defaultType'] = 'swap'
+            self.clients[key] = ex
+        return ex
+
+    # ---------------- markets 元数据 (磁盘缓存) ----------------
+    def _cache_path(self, name):
+        return os.path.join(CONFIG['market_cache']['dir'], f"{name}.json")
+
+    def _read_cache(self, name):
+        """未过期的缓存 -> {"saved", "markets", "currencies"}；否则 None"""
+        path = self._cache_path(name)
+        try:
+            if time.time() - os.path.getmtime(path) > CONFIG['market_cache']['ttl']:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, name, markets, currencies):
+        path = self._cache_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"saved": time.time(), "markets": markets, "currencies": currencies}, f, default=str)
+        os.replace(tmp, path)
+
+    async def ensure_markets(self, name, market_type='spot'):
+        """保证实例已有 markets (缓存优先)；同一交易所的多个实例只加载一次"""
+        ex = self.client(name, market_type)
+        if ex.markets:
+            return ex
+        task = self._market_tasks.get(name)
+        if task is None:
+            task = self._market_tasks[name] = asyncio.ensure_future(self._load_markets(name, ex))
+        try:
+            markets, currencies = await asyncio.shield(task)
+        except Exception:
+            if self._market_tasks.get(name) is task:
+                del self._market_tasks[name]  # 失败不留任务，下次重试
+            raise
+        if not ex.markets:
+            ex.set_markets(markets, currencies)
+        return ex
+
+    async def _load_markets(self, name, ex):
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        cached = await loop.run_in_executor(None, self._read_cache, name)
+        if cached:
+            ex.set_markets(cached['markets'], cached.get('currencies') or None)
+            source = "cache"
+        else:
+            await ex.load_markets()
+            await loop.run_in_executor(None, self._write_cache, name, ex.markets, ex.currencies)
+            source = "network"
+        self.market_loads[name] = {"source": source, "seconds": round(time.perf_counter() - t0, 3),
+                                   "markets": len(ex.markets), "loaded_at": time.time()}
+        return ex.markets, ex.currencies
+
+    async def prepare_markets(self):
+        """启动预热: 全部实例并发就绪，汇报冷/热启动耗时"""
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(self.ensure_markets(n, t) for n, t in list(self.clients)),
+                                       return_exceptions=True)
+        failed = [f"{n}_{t}" for (n, t), r in zip(list(self.clients), results) if isinstance(r, Exception)]
+        sources = [v["source"] for v in self.market_loads.values()]
+        logger.info(f"外所 markets 就绪: {len(self.clients)} 个实例, 缓存 {sources.count('cache')} / "
+                    f"下载 {sources.count('network')} 个交易所, 用时 {time.perf_counter() - t0:.2f}s"
+                    + (f", 失败 {failed}" if failed else ""))
+        return time.perf_counter() - t0
+
+    async def refresh_markets(self):
+        """从交易所重新拉取 markets 写回缓存，并同步到同交易所的其他实例"""
+        loop = asyncio.get_running_loop()
+        by_name = {}
+        for (n, t), ex in self.clients.items():
+            by_name.setdefault(n, []).append(ex)
+        for name, instances in by_name.items():
+            ex = instances[0]
+            try:
+                before = set(ex.markets or ())
+                await ex.load_markets(reload=True)
+                await loop.run_in_executor(None, self._write_cache, name, ex.markets, ex.currencies)
+                for other in instances[1:]:
+                    other.set_markets(ex.markets, ex.currencies)
+                added, removed = set(ex.markets) - before, before - set(ex.markets)
+                if before and (added or removed):
+                    logger.info(f"{name} markets 变化: 新增 {len(added)}, 下架 {len(removed)}")
+            except Exception as e:
+                logger.error(f"{name} markets 刷新失败: {e}")
+
+    async def run_market_refresh(self):
+        await self.prepare_markets()
+        while True:
+            await asyncio.sleep(CONFIG['market_cache']['refresh_interval'])
+            await self.refresh_markets()
+
+    # ---------------- 快照 ----------------
+    async def tickers(self, name, market_type='spot', max_age=None):
+        """max_age: 调用方能接受的快照最大时长 (秒)，默认取配置的 ttl"""
+        return await self._get(name, market_type, 'tickers', lambda ex: ex.fetch_tickers(), max_age)
+
+    async def currencies(self, name, market_type='spot', max_age=None):
+        """不支持 fetchCurrencies 的交易所返回 {}"""
+        async def fetch(ex):
+            return await ex.fetch_currencies() if ex.has.get('fetchCurrencies') else {}
+        return await self._get(name, market_type, 'currencies', fetch, max_age)
+
+    async def _get(self, name, market_type, kind, fetch, max_age):
+        cfg = CONFIG['exchange_hub'][kind]
+        key = (name, market_type, kind)
+        c = self.counters.setdefault(kind, {"fetches": 0, "hits": 0, "coalesced": 0, "errors": 0})
+        cached = self._cache.get(key)
+        if cached is not None and time.time() - cached[0] <= (cfg['ttl'] if max_age is None else max_age):
+            c["hits"] += 1
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, fetch, cfg['timeout'], c))
+        else:
+            c["coalesced"] += 1
+        # shield: 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, fetch, timeout, c):
+        c["fetches"] += 1
+        try:
+            ex = await self.ensure_markets(key[0], key[1])
+            data = await asyncio.wait_for(fetch(ex), timeout=timeout)
+            self._cache[key] = (time.time(), data)
+            return data
+        except Exception:
+            c["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self):
+        now = time.time()
+        return {
+            "clients": [f"{n}_{t}" for n, t in self.clients],
+            "counters": self.counters,
+            "markets": self.market_loads,
+            "snapshots": {f"{n}_{t}.{k}": {"age": round(now - ts, 1), "size": len(data)}
+                          for (n, t, k), (ts, data) in self._cache.items()},
+        }
+
+    async def close(self):
+        for ex in self.clients.values():
+            try:
+                await ex.close()
+            except Exception:
+                pass
+        self.clients.clear()
+        summary = ", ".join(f"{k} 请求 {c['fetches']} / 缓存命中 {c['hits']} / 合并 {c['coalesced']}"
+                            for k, c in self.counters.items())
+        logger.info(f"外所行情入口已关闭: {summary or '无请求'}")
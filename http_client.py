@@ -0,0 +1,92 @@
+# http_client.py
+"""
+进程级共享 HTTP 客户端
+按 host 分组，每组一个常驻的 aiohttp.ClientSession: keep-alive 连接池、DNS 缓存、每 host 连接上限、统一超时。
+由 MonitorSystem 创建后注入各模块，退出时统一关闭；
+通过 TraceConfig 统计每组的请求数、新建连接 (TCP/TLS 握手) 数与连接复用率。
+用法与 session 一致: async with http.get(url, proxy=...) as resp: ...
+"""
+import logging
+from urllib.parse import urlsplit
+
+import aiohttp
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP = "default"
+
+
+class HttpClient:
+    def __init__(self):
+        cfg = CONFIG["http"]
+        self.defaults = cfg["defaults"]
+        self.groups = cfg["groups"]
+        self.host_group = {host: group for group, g in self.groups.items() for host in g["hosts"]}
+        self.sessions = {}   # group -> ClientSession (首次请求时创建，需在事件循环内)
+        self.counters = {}   # group -> {requests, new_connections, reused, errors}
+
+    def group_of(self, url):
+        return self.host_group.get(urlsplit(url).hostname, DEFAULT_GROUP)
+
+    def session(self, url):
+        """url 所属分组的长连接 session"""
+        group = self.group_of(url)
+        session = self.sessions.get(group)
+        if session is None or session.closed:
+            session = self.sessions[group] = self._create(group)
+        return session
+
+    def _create(self, group):
+        cfg = {**self.defaults, **self.groups.get(group, {})}
+        stat = self.counters.setdefault(group, {"requests": 0, "new_connections": 0, "reused": 0, "errors": 0})
+
+        async def on_request_start(session, ctx, params):
+            stat["requests"] += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            stat["new_connections"] += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stat["reused"] += 1
+
+        async def on_request_exception(session, ctx, params):
+            stat["errors"] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_request_exception.append(on_request_exception)
+
+        connector = aiohttp.TCPConnector(
+            limit=cfg["limit"],
+            limit_per_host=cfg["limit_per_host"],
+            ttl_dns_cache=cfg["dns_ttl"],
+            keepalive_timeout=cfg["keepalive_timeout"],
+        )
+        timeout = aiohttp.ClientTimeout(total=cfg["timeout"], connect=cfg["connect_timeout"])
+        logger.info(f"HTTP 连接池创建: {group} (每 host 最多 {cfg['limit_per_host']} 连接)")
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace])
+
+    def get(self, url, **kwargs):
+        return self.session(url).get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session(url).post(url, **kwargs)
+
+    def stats(self):
+        result = {}
+        for group, c in self.counters.items():
+            connections = c["new_connections"] + c["reused"]
+            result[group] = dict(c, reuse_ratio=round(c["reused"] / connections, 3) if connections else 0.0)
+        return result
+
+    async def close(self):
+        for session in self.sessions.values():
+            if not session.closed:
+                await session.close()
+        self.sessions.clear()
+        summary = ", ".join(f"{g} 请求 {s['requests']} / 握手 {s['new_connections']} / 复用率 {s['reuse_ratio']:.0%}"
+                            for g, s in self.stats().items())
+        logger.info(f"HTTP 连接池已关闭: {summary or '无请求'}")
@@ -2,6 +2,7 @@
 import asyncio
 import logging
 import sys
+from metrics import install_event_loop
 from monitor_pool import MonitorSystem
 
 # 配置日志
@@ -15,6 +16,8 @@ logger = logging.getLogger(__name__)
 if __name__ == "__main__":
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    else:
+        logger.info(f"事件循环: {install_event_loop()}")
 
     try:
         system = MonitorSystem()
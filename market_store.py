@@ -0,0 +1,558 @@
+# market_store.py
+import math
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+from config import CONFIG
+
+
+class _CvdRing:
+    """CVD 前缀和环形缓冲 (symbol × 秒): 每格存该秒结束时的累计 CVD"""
+    def __init__(self, rows, size):
+        self.size = size
+        self.cum = np.zeros((rows, size))
+        self.sec = np.zeros(rows, dtype=np.int64)   # 每行最近一次写入的秒
+        self.total = np.zeros(rows)                 # 每行累计 CVD (含当前秒)
+
+    def grow(self, rows):
+        self.cum = grow_rows(self.cum, rows)
+        self.sec = grow_rows(self.sec, rows)
+        self.total = grow_rows(self.total, rows)
+
+    def nbytes(self):
+        return self.cum.nbytes + self.sec.nbytes + self.total.nbytes
+
+    def add(self, row, sec, signed):
+        last = int(self.sec[row])
+        if sec > last:
+            # 中间无成交的秒沿用上一个累计值
+            start = max(last + 1, sec - self.size + 1)
+            if start < sec:
+                self.cum[row, np.arange(start, sec) % self.size] = self.total[row]
+            self.sec[row] = last = sec
+        total = self.total[row] + signed
+        self.total[row] = total
+        self.cum[row, last % self.size] = total
+
+    def add_many(self, rows, sec, signed):
+        """同一秒内多行批量写入 (rows 不可重复，signed 为各行该秒的净额)"""
+        last = self.sec[rows]
+        new = sec > last
+        if new.any():
+            r = rows[new]
+            start = np.maximum(last[new] + 1, sec - self.size + 1)
+            gaps = sec - start
+            n_fill = int(gaps.sum())
+            if n_fill:
+                # 展开每行需要前向填充的秒: start, start+1, ..., sec-1
+                fill_rows = np.repeat(r, gaps)
+                offsets = np.arange(n_fill) - np.repeat(np.cumsum(gaps) - gaps, gaps)
+                self.cum[fill_rows, (np.repeat(start, gaps) + offsets) % self.size] = self.total[fill_rows]
+            self.sec[r] = sec
+        self.total[rows] += signed
+        self.cum[rows, self.sec[rows] % self.size] = self.total[rows]
+
+    def sum(self, row, seconds, now):
+        prev = math.ceil(now - seconds) - 1
+        last = int(self.sec[row])
+        total = float(self.total[row])
+        if prev >= last:
+            return 0.0
+        prev = max(prev, last - self.size + 1)  # 超出环容量，按最旧一格截断
+        return total - float(self.cum[row, prev % self.size])
+
+    def sum_all(self, rows, seconds, now):
+        """rows: 行数 n (前 n 行) 或行号数组；seconds 为一维数组 (k,) 时一次算 k 个窗口，返回 (k, m)"""
+        idx, sel = _row_index(rows)
+        if np.ndim(seconds):
+            prev = (np.ceil(now - np.asarray(seconds, dtype=float)) - 1).astype(np.int64)[:, None]
+        else:
+            prev = math.ceil(now - seconds) - 1
+        last = self.sec[sel]
+        total = self.total[sel]
+        clamped = np.maximum(prev, last - self.size + 1)
+        before = self.cum[idx, clamped % self.size]
+        return np.where(prev >= last, 0.0, total - before)
+
+
+class _HistoryRing:
+    """采样历史环形缓冲 (symbol × 采样槽)，时间戳与数值两张并列矩阵"""
+    def __init__(self, rows, length):
+        self.length = length
+        self.ts = np.zeros((rows, length))
+        self.val = np.zeros((rows, length))
+        self.count = np.zeros(rows, dtype=np.int64)  # 累计写入次数
+
+    def grow(self, rows):
+        self.ts = grow_rows(self.ts, rows)
+        self.val = grow_rows(self.val, rows)
+        self.count = grow_rows(self.count, rows)
+
+    def nbytes(self):
+        return self.ts.nbytes + self.val.nbytes + self.count.nbytes
+
+    def append(self, row, ts, value):
+        i = int(self.count[row]) % self.length
+        self.ts[row, i] = ts
+        self.val[row, i] = value
+        self.count[row] += 1
+
+    def append_many(self, rows, ts, values):
+        """多行同时追加一个采样 (rows 不可重复)"""
+        i = self.count[rows] % self.length
+        self.ts[rows, i] = ts
+        self.val[rows, i] = values
+        self.count[rows] += 1
+
+    def load_rows(self, rows, ts, val, count, cutoff):
+        """
+        从快照载入若干行，丢弃 ts < cutoff 的过期采样
+        保留的采样按时间顺序重排到 0 起始 (快照的环长度可与当前配置不同)
+        """
+        L, Ls = self.length, ts.shape[1]
+        size = np.minimum(count, Ls)
+        start = np.where(count >= Ls, count % Ls, 0)
+        order = (start[:, None] + np.arange(Ls)) % Ls
+        o_ts = np.take_along_axis(ts, order, 1)
+        o_val = np.take_along_axis(val, order, 1)
+        # 采样按时间有序，未过期的部分是 [0, size) 的一个后缀
+        keep = (np.arange(Ls) < size[:, None]) & (o_ts >= cutoff)
+        k = np.minimum(keep.sum(axis=1), L)
+        idx = np.minimum((size - k)[:, None] + np.arange(L), Ls - 1)
+        valid = np.arange(L) < k[:, None]
+        self.ts[rows] = np.where(valid, np.take_along_axis(o_ts, idx, 1), 0.0)
+        self.val[rows] = np.where(valid, np.take_along_axis(o_val, idx, 1), 0.0)
+        self.count[rows] = k
+
+    def size(self, row):
+        return min(int(self.count[row]), self.length)
+
+    def _start(self, row):
+        count = int(self.count[row])
+        return count % self.length if count >= self.length else 0
+
+    def get(self, row, i):
+        size = self.size(row)
+        if i < 0: i += size
+        if not 0 <= i < size:
+            raise IndexError("history index out of range")
+        p = (self._start(row) + i) % self.length
+        return float(self.ts[row, p]), float(self.val[row, p])
+
+    def first_since(self, row, cutoffs):
+        """
+        二分查找每个 cutoff 之后 (ts >= cutoff) 的最早采样值，没有则为 None
+        环内按写入顺序分为 [start:] 与 [:start] 两段，各自按时间有序
+        """
+        count = int(self.count[row])
+        L = self.length
+        ts = memoryview(self.ts[row])
+        val = memoryview(self.val[row])
+        result = []
+        for cutoff in cutoffs:
+            if count <= L:
+                i = bisect_left(ts, cutoff, 0, count)
+                result.append(val[i] if i < count else None)
+                continue
+            start = count % L
+            i = bisect_left(ts, cutoff, start, L)
+            if i == L:
+                i = bisect_left(ts, cutoff, 0, start)
+                if i == start:
+                    result.append(None)
+                    continue
+            result.append(val[i])
+        return result
+
+    def latest_all(self, rows):
+        """每行最新值 (values, has_data)，rows 同 _CvdRing.sum_all"""
+        idx, sel = _row_index(rows)
+        count = self.count[sel]
+        vals = self.val[idx, (count - 1) % self.length]
+        has = count > 0
+        return np.where(has, vals, 0.0), has
+
+    def first_since_all(self, rows, cutoffs):
+        """
+        全池向量化二分: 每行最早一个 ts >= cutoff 的采样值 (values, found)
+        rows 同 _CvdRing.sum_all (m 行)；cutoffs 为标量时返回 shape (m,)，为一维数组 (k,) 时返回 (k, m)
+        """
+        idx, sel = _row_index(rows)
+        L = self.length
+        count = self.count[sel]
+        size = np.minimum(count, L)
+        start = np.where(count >= L, count % L, 0)
+        base = idx * L
+        flat_ts = self.ts.reshape(-1)
+        cutoffs = np.asarray(cutoffs, dtype=float)[..., None]
+        lo = np.zeros(cutoffs.shape[:-1] + (len(idx),), dtype=np.int64)  # 每个 cutoff 之前的采样数
+        prev = start - 1
+        # 无分支二分: 步长从高位到低位，第 lo+step 个采样仍 < cutoff 就前进一步
+        # 越过 size 的候选钳到最新一个采样: 最新采样也 < cutoff 时 lo 会超过 size，最后取 min 即可，
+        # 省掉逐步的边界判断 (小批量时每步的 numpy 调用数就是主要开销)
+        for bit in reversed(range(int(size.max(initial=0)).bit_length())):  # 步数按实际填充量，环未满时更少
+            step = lo + (1 << bit)
+            right = flat_ts.take((prev + np.minimum(step, size)) % L + base) < cutoffs
+            lo = np.where(right, step, lo)
+        lo = np.minimum(lo, size)
+        found = lo < size
+        return self.val.reshape(-1).take(base + (start + lo) % L), found
+
+
+def _row_index(rows):
+    """行数 n -> (arange(n), 切片)；行号数组 -> (本身, 本身)"""
+    if isinstance(rows, (int, np.integer)):
+        return np.arange(rows), slice(0, rows)
+    return rows, rows
+
+
+def save_snapshot(path, snap):
+    """快照落盘 (阻塞 IO，应在线程池中调用)；先写临时文件再原子替换"""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **snap)
+    os.replace(tmp, path)
+
+
+def stream_history_len():
+    """资金费率/价格历史槽数: 1 秒一采样，至少覆盖最长回看窗口 (cvd_long_window, 策略 1800s) 外加 10% 余量"""
+    return max(CONFIG["store"]["stream_history_len"], int(CONFIG["cvd_long_window"] * 1.1))
+
+
+def grow_rows(arr, rows):
+    out = np.zeros((rows,) + arr.shape[1:], dtype=arr.dtype)
+    out[:len(arr)] = arr
+    return out
+
+
+class MarketStore(Mapping):
+    """
+    全市场列式行情存储
+    symbol 索引 + 预分配的 (symbol × 时间槽) 矩阵，整池查询为单次向量运算；
+    按 symbol 取值返回 MarketData 视图，兼容原 dict[symbol] -> MarketData 用法
+    """
+    def __init__(self, capacity=None, clock=time.time):
+        cfg = CONFIG["store"]
+        self.clock = clock  # 可注入的时钟 (回放时使用虚拟时钟)
+        self.capacity = capacity or cfg["initial_capacity"]
+        self.index = {}     # symbol -> row
+        self.symbols = []   # row -> symbol
+        self.views = []     # row -> MarketData
+
+        rows = self.capacity
+        self.price = np.zeros(rows)
+        self.funding_rate = np.zeros(rows)
+        self.cvd = _CvdRing(rows, CONFIG["cvd_long_window"] + 2)
+        self.oi = _HistoryRing(rows, cfg["history_len"])
+        self.funding = _HistoryRing(rows, stream_history_len())
+        self.price_hist = _HistoryRing(rows, stream_history_len())
+
+        # 事件驱动策略: 有新数据的行置脏，on_dirty 回调唤醒评估协程
+        self.dirty = np.zeros(rows, dtype=bool)
+        self.on_dirty = None
+
+    # --- Mapping 接口 (兼容旧 data_store dict) ---
+    def __getitem__(self, symbol):
+        return self.views[self.index[symbol]]
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def add_symbol(self, symbol):
+        if symbol in self.index:
+            return self[symbol]
+        return MarketData(symbol, store=self)
+
+    def _alloc_row(self, symbol, view):
+        row = len(self.symbols)
+        if row >= self.capacity:
+            self._grow(self.capacity * 2)
+        self.index[symbol] = row
+        self.symbols.append(symbol)
+        self.views.append(view)
+        return row
+
+    def add_trades(self, rows, sec, signed, prices):
+        """批量写入同一秒的成交: rows 不重复，signed 为该秒各行净成交额"""
+        self.price[rows] = prices
+        self.cvd.add_many(rows, sec, signed)
+        self.mark_dirty(rows)
+
+    def mark_dirty(self, rows):
+        """行情写入后调用 (rows 为行号或行号数组)"""
+        self.dirty[rows] = True
+        if self.on_dirty is not None:
+            self.on_dirty()
+
+    def _grow(self, rows):
+        self.price = grow_rows(self.price, rows)
+        self.funding_rate = grow_rows(self.funding_rate, rows)
+        self.dirty = grow_rows(self.dirty, rows)
+        for ring in (self.cvd, self.oi, self.funding, self.price_hist):
+            ring.grow(rows)
+        self.capacity = rows
+
+    # --- 快照 (热重启) ---
+    def snapshot(self):
+        """在事件循环内拷贝一份全部滚动数据 (纯内存拷贝，落盘交给 save_snapshot)"""
+        n = len(self.symbols)
+        snap = {
+            'saved_at': np.float64(self.clock()),
+            'symbols': np.array(self.symbols, dtype=str),
+            'price': self.price[:n].copy(),
+            'funding_rate': self.funding_rate[:n].copy(),
+            'cvd_cum': self.cvd.cum[:n].copy(),
+            'cvd_sec': self.cvd.sec[:n].copy(),
+            'cvd_total': self.cvd.total[:n].copy(),
+        }
+        for name, ring in self._history_rings():
+            snap[name + '_ts'] = ring.ts[:n].copy()
+            snap[name + '_val'] = ring.val[:n].copy()
+            snap[name + '_count'] = ring.count[:n].copy()
+        return snap
+
+    def restore(self, path, max_age):
+        """
+        从快照恢复已在池中的币种，返回恢复的币种数
+        早于 max_age 秒的历史采样直接丢弃，整份快照过期则不恢复
+        """
+        if not os.path.exists(path): return 0
+        now = self.clock()
+        with np.load(path, allow_pickle=False) as f:
+            if now - float(f['saved_at']) > max_age:
+                return 0
+            src, dst = [], []
+            for i, symbol in enumerate(f['symbols'].tolist()):
+                row = self.index.get(symbol)
+                if row is not None:
+                    src.append(i)
+                    dst.append(row)
+            if not dst: return 0
+            src = np.array(src, dtype=np.int64)
+            dst = np.array(dst, dtype=np.int64)
+
+            self.price[dst] = f['price'][src]
+            self.funding_rate[dst] = f['funding_rate'][src]
+            for name, ring in self._history_rings():
+                ring.load_rows(dst, f[name + '_ts'][src], f[name + '_val'][src], f[name + '_count'][src], now - max_age)
+
+            # CVD 环长度与配置一致且最后写入仍在窗口内才恢复; 停机期间视为无成交
+            cum = f['cvd_cum']
+            if cum.shape[1] == self.cvd.size:
+                sec = f['cvd_sec'][src]
+                fresh = sec > now - self.cvd.size
+                self.cvd.cum[dst[fresh]] = cum[src[fresh]]
+                self.cvd.sec[dst[fresh]] = sec[fresh]
+                self.cvd.total[dst[fresh]] = f['cvd_total'][src[fresh]]
+        return len(dst)
+
+    def _history_rings(self):
+        return (('oi', self.oi), ('funding', self.funding), ('price_hist', self.price_hist))
+
+    def memory_report(self):
+        """列式矩阵内存占用 (按预分配容量计)，含每币种平均与各部分明细"""
+        n = len(self.symbols)
+        parts = {
+            'price': self.price.nbytes + self.funding_rate.nbytes + self.dirty.nbytes,
+            'cvd': self.cvd.nbytes(),
+            'oi_history': self.oi.nbytes(),
+            'funding_history': self.funding.nbytes(),
+            'price_history': self.price_hist.nbytes(),
+            'views': sum(sys.getsizeof(v) for v in self.views) + sys.getsizeof(self.views),
+        }
+        total = sum(parts.values())
+        return {
+            'symbols': n,
+            'capacity': self.capacity,
+            'total_bytes': total,
+            'bytes_per_symbol': total // max(n, 1),
+            'bytes_per_row': (total - parts['views']) // self.capacity,
+            'breakdown': parts,
+        }
+
+    # --- 整池向量查询 (按 row 顺序，与 self.symbols 对齐) ---
+    def prices(self):
+        return self.price[:len(self.symbols)]
+
+    def funding_rates(self):
+        return self.funding_rate[:len(self.symbols)]
+
+    def cvd_sums(self, seconds):
+        return self.cvd.sum_all(len(self.symbols), seconds, self.clock())
+
+    def oi_latest(self):
+        return self.oi.latest_all(len(self.symbols))
+
+    def oi_deltas(self, seconds=300):
+        """(delta, now, past)，语义同 MarketData.get_oi_delta"""
+        curr, past = self._ring_lookback(self.oi, self.clock() - seconds)
+        return curr - past, curr, past
+
+    def funding_deltas(self, seconds=300):
+        curr, past = self._ring_lookback(self.funding, self.clock() - seconds)
+        return curr - past
+
+    def price_deltas(self, seconds=300):
+        """(now, past)，语义同 MarketData.get_price_delta"""
+        n = len(self.symbols)
+        curr = self.price[:n]
+        past, found = self.price_hist.first_since_all(n, self.clock() - seconds)
+        return curr, np.where(found, past, curr)
+
+    def _ring_lookback(self, ring, cutoffs, rows=None):
+        """(当前值, 各 cutoff 处的值)，无历史时 past 取当前值"""
+        if rows is None: rows = len(self.symbols)
+        curr, has = ring.latest_all(rows)
+        past, found = ring.first_since_all(rows, cutoffs)
+        return curr, np.where(found & has, past, curr)
+
+    def lookback(self, windows, fields=('price', 'oi', 'funding', 'cvd'), rows=None):
+        """
+        一次取全池多个回看窗口的值 (每个窗口一行 ndarray)
+        {'price', 'oi', 'funding': 当前值,
+         'price_past', 'oi_past', 'funding_past', 'cvd': {window: ndarray}}
+        fields 可只取其中几项；rows 给行号数组时只取这些行
+        """
+        if rows is None: rows = len(self.symbols)
+        now = self.clock()
+        cutoffs = now - np.asarray(windows, dtype=float)
+        result = {}
+        for name, ring in (('oi', self.oi), ('funding', self.funding)):
+            if name in fields:
+                curr, past = self._ring_lookback(ring, cutoffs, rows)
+                result[name] = curr
+                result[name + '_past'] = dict(zip(windows, past))
+        if 'price' in fields:
+            price = result['price'] = self.price[_row_index(rows)[1]]
+            past, found = self.price_hist.first_since_all(rows, cutoffs)
+            result['price_past'] = dict(zip(windows, np.where(found, past, price)))
+        if 'cvd' in fields:
+            result['cvd'] = dict(zip(windows, self.cvd.sum_all(rows, windows, now)))
+        return result
+
+
+class HistoryView:
+    """单币种历史的序列视图，行为同原 deque[(ts, val)]"""
+    __slots__ = ("ring", "row")
+
+    def __init__(self, ring, row):
+        self.ring = ring
+        self.row = row
+
+    def append(self, item):
+        ts, val = item
+        self.ring.append(self.row, ts, val)
+
+    def __len__(self):
+        return self.ring.size(self.row)
+
+    def __getitem__(self, i):
+        return self.ring.get(self.row, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.ring.get(self.row, i)
+
+
+class MarketData:
+    """单一币种的数据视图 (数据存放在 MarketStore 的列式矩阵中)"""
+    __slots__ = ("symbol", "store", "row")
+
+    def __init__(self, symbol, store=None, clock=time.time):
+        if store is None:
+            store = MarketStore(capacity=1, clock=clock)  # 独立使用时自带一行存储
+        self.symbol = symbol
+        self.store = store
+        self.row = store._alloc_row(symbol, self)
+
+    @property
+    def oi_history(self):
+        return HistoryView(self.store.oi, self.row)
+
+    @property
+    def funding_history(self):
+        return HistoryView(self.store.funding, self.row)
+
+    @property
+    def price_history(self):
+        return HistoryView(self.store.price_hist, self.row)
+
+    @property
+    def price(self):
+        return float(self.store.price[self.row])
+
+    @price.setter
+    def price(self, value):
+        self.store.price[self.row] = value
+
+    @property
+    def funding_rate(self):
+        return float(self.store.funding_rate[self.row])
+
+    @funding_rate.setter
+    def funding_rate(self, value):
+        self.store.funding_rate[self.row] = value
+
+    def add_trade(self, price, qty, is_buyer_maker):
+        store = self.store
+        store.price[self.row] = price # 实时更新最新价
+        vol_usd = price * qty
+        signed = -vol_usd if is_buyer_maker else vol_usd
+        store.cvd.add(self.row, int(store.clock()), signed)
+        store.mark_dirty(self.row)
+
+    def get_cvd_sum(self, seconds):
+        return self.store.cvd.sum(self.row, seconds, self.store.clock())
+
+    def get_oi_delta(self, seconds=300):
+        ring = self.store.oi
+        if not ring.count[self.row]: return 0, 0, 0
+        curr = ring.get(self.row, -1)[1]
+        past = ring.first_since(self.row, [self.store.clock() - seconds])[0]
+        if past is None: past = curr
+        return curr - past, curr, past
+
+    def get_funding_delta(self, seconds=300):
+        ring = self.store.funding
+        if not ring.count[self.row]: return 0.0
+        curr = ring.get(self.row, -1)[1]
+        past = ring.first_since(self.row, [self.store.clock() - seconds])[0]
+        if past is None: past = curr
+        return curr - past
+
+    def get_price_delta(self, seconds=300):
+        """获取价格变化 (当前价, N 秒前价格)"""
+        curr = self.price
+        past = self.store.price_hist.first_since(self.row, [self.store.clock() - seconds])[0]
+        if past is None: past = curr
+        return curr, past
+
+    def get_lookback(self, windows):
+        """
+        一次二分查找取出多个回看窗口的值，结构同 MarketStore.lookback (标量)
+        无历史时 past 取当前值 (即变化为 0)
+        """
+        store, row = self.store, self.row
+        now = self.store.clock()
+        cutoffs = [now - w for w in windows]
+        price = self.price
+        result = {'price': price}
+        for name, ring in (('oi', store.oi), ('funding', store.funding)):
+            curr = ring.get(row, -1)[1] if ring.count[row] else 0.0
+            pasts = ring.first_since(row, cutoffs)
+            result[name] = curr
+            result[name + '_past'] = {w: curr if p is None else p for w, p in zip(windows, pasts)}
+        pasts = store.price_hist.first_since(row, cutoffs)
+        result['price_past'] = {w: price if p is None else p for w, p in zip(windows, pasts)}
+        result['cvd'] = {w: store.cvd.sum(row, w, now) for w in windows}
+        return result
@@ -0,0 +1,186 @@
+# metrics.py
+"""
+进程内延迟观测 (低开销)
+- Histogram: 对数分桶 (每 10 倍 8 桶, 1us ~ 100s)，observe 只做一次 bisect + 列表自增
+- 事件循环滞后采样: 每 lag_interval 秒 sleep 一次，实际唤醒时间与预期之差即循环被阻塞的时长
+- 计数器: WS 消息数等，按报告周期折算速率
+汇总见 GET /api/system/metrics，并按 report_interval 打日志；切换 uvloop 后可用同一套指标对比。
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+_BUCKETS_PER_DECADE = 8
+_BOUNDS = [10 ** (k / _BUCKETS_PER_DECADE) * 1e-6 for k in range(8 * _BUCKETS_PER_DECADE + 1)]
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)  # 最后一格: 超过 100s
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """近似分位数 (所在桶的上界)"""
+        if not self.count: return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(_BOUNDS[i], self.max) if i < len(_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        """毫秒口径"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1e3, 3),
+            "p50_ms": round(self.percentile(0.50) * 1e3, 3),
+            "p90_ms": round(self.percentile(0.90) * 1e3, 3),
+            "p99_ms": round(self.percentile(0.99) * 1e3, 3),
+            "max_ms": round(self.max * 1e3, 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.rates = {}          # 计数器在上个报告周期内的速率 (次/秒)
+        self._rate_mark = (time.time(), {})
+        self.started = time.time()
+
+    def histogram(self, name):
+        h = self.histograms.get(name)
+        if h is None:
+            h = self.histograms[name] = Histogram()
+        return h
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        """with metrics.timer("loop.xxx"): ... (可跨 await)"""
+        return _Timer(self.histogram(name))
+
+    def timed(self, name):
+        """装饰器: 记录每次调用耗时 (同步/协程函数均可)"""
+        def wrap(fn):
+            hist = self.histogram(name)
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def inner(*args, **kwargs):
+                    t0 = time.perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        hist.observe(time.perf_counter() - t0)
+            else:
+                @functools.wraps(fn)
+                def inner(*args, **kwargs):
+                    t0 = time.perf_counter()
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        hist.observe(time.perf_counter() - t0)
+            return inner
+        return wrap
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _update_rates(self):
+        now = time.time()
+        last_ts, last = self._rate_mark
+        elapsed = now - last_ts
+        if elapsed > 0:
+            self.rates = {k: (v - last.get(k, 0)) / elapsed for k, v in self.counters.items()}
+        self._rate_mark = (now, dict(self.counters))
+
+    def stats(self):
+        try:
+            loop = type(asyncio.get_running_loop())
+            loop_name = f"{loop.__module__}.{loop.__name__}"
+        except RuntimeError:
+            loop_name = None
+        return {
+            "event_loop": loop_name,
+            "uptime": time.time() - self.started,
+            "histograms": {k: h.summary() for k, h in sorted(self.histograms.items())},
+            "counters": dict(self.counters),
+            "rates": {k: round(v, 1) for k, v in self.rates.items()},
+        }
+
+    async def run_sampler(self):
+        """事件循环滞后采样 + 定期汇总日志"""
+        cfg = CONFIG["metrics"]
+        interval = cfg["lag_interval"]
+        lag = self.histogram("loop.lag")
+        last_report = time.monotonic()
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag.observe(max(0.0, now - t0 - interval))
+            if now - last_report >= cfg["report_interval"]:
+                last_report = now
+                self._update_rates()
+                self._log_summary()
+
+    def _log_summary(self):
+        parts = []
+        for name, h in sorted(self.histograms.items()):
+            if h.count:
+                parts.append(f"{name} p99 {h.percentile(0.99)*1e3:.1f}ms/max {h.max*1e3:.0f}ms")
+        rates = ", ".join(f"{k} {v:.0f}/s" for k, v in self.rates.items())
+        logger.info(f"延迟观测: {' | '.join(parts)}" + (f" | {rates}" if rates else ""))
+
+
+metrics = Metrics()
+
+
+def install_event_loop():
+    """CONFIG["uvloop"] 开启且已安装 uvloop 时切换事件循环实现，返回实际使用的循环名"""
+    if not CONFIG.get("uvloop"):
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("已配置 uvloop 但未安装 (pip install uvloop)，继续使用 asyncio 默认循环")
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
@@ -3,17 +3,22 @@ import asyncio
 import time
 import json
 import os
-import aiohttp
 import logging
 from datetime import datetime, timedelta
 from config import CONFIG
-from data_collector import MarketData, DataCollector
+from data_collector import DataCollector
+from http_client import HttpClient
+from metrics import metrics
+from market_store import MarketStore, save_snapshot
+from rate_governor import governor
+from tick_journal import TickRecorder
 from strategy import StrategyEngine
 from notifier import TelegramNotifier
 from listing_monitor import ListingMonitor
 from announcement_monitor import AnnouncementMonitor
 from onchain_monitor import OnChainMonitor
 from telegram_commander import TelegramCommander
+from exchange_hub import ExchangeHub
 from spread_monitor import SpreadMonitor
 from oi_comparer import OIComparer
 from wallet_monitor import WalletMonitor # [新增]
@@ -22,10 +27,11 @@ logger = logging.getLogger(__name__)
 
 class SymbolPoolManager:
     """[PRD] 监控池核心管理类 (集成 CoinGecko 缓存过滤)"""
-    def __init__(self, data_store_ref, collector_ref, notifier_ref):
+    def __init__(self, data_store_ref, collector_ref, notifier_ref, http_client):
         self.data_store = data_store_ref
         self.collector = collector_ref
         self.notifier = notifier_ref
+        self.http = http_client
         self.file_path = CONFIG["pool"]["filename"]
         self.proxy = CONFIG["proxy"]
         self.blacklist = set(CONFIG["pool"].get("blacklist", []))
@@ -53,6 +59,20 @@ class SymbolPoolManager:
             logger.info(f"加载本地监控池，共 {len(symbols)} 个合约")
 
         self._update_data_store(symbols)
+        self._restore_snapshot()
+
+    def _restore_snapshot(self):
+        """热重启: 从快照恢复滚动数据，避免重启后窗口数据归零"""
+        cfg = CONFIG["snapshot"]
+        if not cfg["enabled"]: return
+        t0 = time.time()
+        try:
+            restored = self.data_store.restore(cfg["filename"], cfg["max_age_seconds"])
+        except Exception as e:
+            logger.error(f"快照恢复失败: {e}")
+            return
+        if restored:
+            logger.info(f"♻️ 已从快照恢复 {restored} 个币种的滚动数据 ({(time.time() - t0)*1000:.0f} ms)")
 
     async def loop_incremental_check(self):
         while True:
@@ -78,23 +98,21 @@ class SymbolPoolManager:
         url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
         target_symbols = []
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, proxy=self.proxy) as resp:
-                    if resp.status == 200:
-                        data = await resp.json()
-                        for s in data["symbols"]:
-                            if (s["contractType"] == "PERPETUAL" and s["status"] == "TRADING" and s["quoteAsset"] == "USDT"):
-                                if s["symbol"] in self.blacklist: continue
-                                target_symbols.append(s["symbol"])
-                        return target_symbols
-                    return []
+            async with governor.get(self.http, url, "symbol_pool", proxy=self.proxy) as resp:
+                if resp.status == 200:
+                    data = await resp.json()
+                    for s in data["symbols"]:
+                        if (s["contractType"] == "PERPETUAL" and s["status"] == "TRADING" and s["quoteAsset"] == "USDT"):
+                            if s["symbol"] in self.blacklist: continue
+                            target_symbols.append(s["symbol"])
+                    return target_symbols
+                return []
         except Exception:
             return []
 
     def _update_data_store(self, symbol_list):
         for s in symbol_list:
-            if s not in self.data_store:
-                self.data_store[s] = MarketData(s)
+            self.data_store.add_symbol(s)
 
     def _load_local_file(self):
         if not os.path.exists(self.file_path): return {}
@@ -108,58 +126,141 @@ class SymbolPoolManager:
 
 class MonitorSystem:
     def __init__(self):
-        self.data_store = {}
-        self.notifier = TelegramNotifier()
-        self.collector = DataCollector(self.data_store)
+        self.data_store = MarketStore()
+        self.http = HttpClient()  # 全进程共享的 HTTP 长连接池，start() 退出时关闭
+        self.notifier = TelegramNotifier(self.http)
+        self.journal = TickRecorder() if CONFIG["journal"]["enabled"] else None
+        self.collector = DataCollector(self.data_store, self.journal, self.http)
         self.strategy = StrategyEngine()
-        self.pool_manager = SymbolPoolManager(self.data_store, self.collector, self.notifier)
+        self.pool_manager = SymbolPoolManager(self.data_store, self.collector, self.notifier, self.http)
         
-        self.listing_monitor = ListingMonitor(self.notifier)
-        self.announcement_monitor = AnnouncementMonitor(self.notifier)
+        self.listing_monitor = ListingMonitor(self.notifier, self.http)
+        self.announcement_monitor = AnnouncementMonitor(self.notifier, self.http)
         self.onchain_monitor = OnChainMonitor(self.notifier)
-        self.commander = TelegramCommander(self.onchain_monitor)
-        self.spread_monitor = SpreadMonitor(self.notifier, self.data_store)
-        self.oi_comparer = OIComparer(self.notifier, self.data_store)
+        self.commander = TelegramCommander(self.onchain_monitor, self.http)
+        self.exchange_hub = ExchangeHub(CONFIG['proxy'] or None)  # 外所 ccxt 实例与行情快照共用
+        self.spread_monitor = SpreadMonitor(self.notifier, self.data_store, self.exchange_hub)
+        self.oi_comparer = OIComparer(self.notifier, self.data_store, self.exchange_hub)
         
         # [新增] 充提监控
-        self.wallet_monitor = WalletMonitor(self.notifier, self.data_store)
+        self.wallet_monitor = WalletMonitor(self.notifier, self.data_store, self.exchange_hub)
         
         self.start_time = time.time()
 
     async def start(self):
+        try:
+            await self._run()
+        finally:
+            await self.exchange_hub.close()
+            await self.http.close()
+
+    async def _run(self):
         await self.pool_manager.initialize()
+        mem = self.data_store.memory_report()
+        logger.info(f"行情存储: {mem['symbols']} 币种, 共 {mem['total_bytes']/1024/1024:.1f} MB (每币种 {mem['bytes_per_symbol']/1024:.1f} KB)")
+        extra_tasks = []
+        if self.journal:
+            logger.info(f"逐笔日志已开启: {self.journal.dir}")
+            extra_tasks.append(self.journal.run_flusher())
         await asyncio.gather(
             self.collector.run_ws(),
             self.collector.run_rest_poller(),
+            self.collector.run_mark_stream(),
+            metrics.run_sampler(),
             self.pool_manager.loop_incremental_check(),
             self._strategy_loop(),
             self._loop_summary_report(),
+            self._loop_snapshot(),
             self.listing_monitor.start(),
             self.announcement_monitor.start(),
             self.onchain_monitor.start(),
             self.commander.start(),
+            self.exchange_hub.run_market_refresh(),
             self.spread_monitor.start(),
             self.oi_comparer.start(),
             
             # [新增] 启动
-            self.wallet_monitor.start()
+            self.wallet_monitor.start(),
+            *extra_tasks
         )
 
     async def _strategy_loop(self):
         logger.info(f"策略引擎启动，预热 {CONFIG['warmup_seconds']} 秒...")
+        if CONFIG['strategy_event']['enabled']:
+            await asyncio.sleep(max(0, CONFIG['warmup_seconds'] - (time.time() - self.start_time)))
+            await self._strategy_loop_event()
+            return
         while True:
             if time.time() - self.start_time < CONFIG['warmup_seconds']:
                 await asyncio.sleep(5)
                 continue
-            current_symbols = list(self.data_store.keys())
-            for symbol in current_symbols:
-                data = self.data_store[symbol]
-                alert_type, msg = self.strategy.check(symbol, data)
-                if msg:
+            if CONFIG['strategy_batch']:
+                # 批量模式: 全池向量化判断，只对命中币种逐个处理
+                with metrics.timer("loop.strategy"):
+                    alerts = self.strategy.check_all(self.data_store)
+                for symbol, alert_type, msg in alerts:
+                    logger.info(f"触发警报: {symbol} {alert_type}")
+                    await self.notifier.send_message(msg)
+            else:
+                with metrics.timer("loop.strategy"):
+                    alerts = []
+                    for symbol in list(self.data_store.keys()):
+                        alert_type, msg = self.strategy.check(symbol, self.data_store[symbol])
+                        if msg:
+                            alerts.append((symbol, alert_type, msg))
+                for symbol, alert_type, msg in alerts:
                     logger.info(f"触发警报: {symbol} {alert_type}")
                     await self.notifier.send_message(msg)
             await asyncio.sleep(5)
 
+    async def _strategy_loop_event(self):
+        """
+        事件驱动模式: 行情写入时置脏并唤醒，距上一轮评估满 coalesce_seconds 后一次评估全部脏币种；
+        超过 full_sweep_seconds 未评估的币种并入当轮，兜底窗口滑动等时间驱动的变化 (首轮即全池)
+        """
+        cfg = CONFIG['strategy_event']
+        wake = asyncio.Event()
+        self.data_store.on_dirty = wake.set
+        last_pass = time.time()
+        timeout = 0  # 首轮立即做一次全池评估
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            # 每轮固定开销约 0.5ms，逐条唤醒会把开销乘上轮数；按评估间隔攒批
+            await asyncio.sleep(max(0.0, last_pass + cfg['coalesce_seconds'] - time.time()))
+            wake.clear()
+            last_pass = time.time()
+
+            with metrics.timer("loop.strategy"):
+                alerts, timeout = self.strategy.check_dirty(self.data_store, cfg['min_interval'],
+                                                            cfg['full_sweep_seconds'])
+            for symbol, alert_type, msg in alerts:
+                logger.info(f"触发警报: {symbol} {alert_type}")
+                await self.notifier.send_message(msg)
+
+    async def _loop_snapshot(self):
+        """定期把滚动数据快照写盘 (落盘在线程池执行，不阻塞事件循环)"""
+        cfg = CONFIG["snapshot"]
+        if not cfg["enabled"]: return
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await asyncio.sleep(cfg["interval_seconds"])
+                try:
+                    snap = self.data_store.snapshot()
+                    await loop.run_in_executor(None, save_snapshot, cfg["filename"], snap)
+                except Exception as e:
+                    logger.error(f"快照写入失败: {e}")
+        except asyncio.CancelledError:
+            # 退出前同步落一次盘，保证重启时数据最新
+            try:
+                save_snapshot(cfg["filename"], self.data_store.snapshot())
+            except Exception as e:
+                logger.error(f"快照写入失败: {e}")
+            raise
+
     def _fmt_num(self, val, is_delta=False):
         abs_v = abs(val)
         sign = ""
@@ -176,8 +277,9 @@ class MonitorSystem:
             try:
                 abnormals = self.strategy.get_abnormal_list(self.data_store)
                 oi_abnormals = self.oi_comparer.get_summary_data()
+                spreads = self.spread_monitor.top_spreads(5)
                 
-                if abnormals or oi_abnormals:
+                if abnormals or oi_abnormals or spreads:
                     lines = ["📋 <b>异常状态定期汇总</b>", "------------------"]
                     
                     if abnormals:
@@ -216,6 +318,13 @@ class MonitorSystem:
                             lines.append(f"• {ex} > <b>{s}</b>: {ratio:.0f}% (BN {bn_fmt})")
                         lines.append("")
 
+                    if spreads:
+                        lines.append("🌊 <b>跨所价差 (Top)</b>")
+                        for item in spreads:
+                            ex = item['ex'].upper().replace('_', ' ')
+                            lines.append(f"• {item['coin']} vs {ex}: {item['pct']*100:+.2f}%")
+                        lines.append("")
+
                     lines.append(f"------------------\n⏱ {datetime.now().strftime('%H:%M')}")
                     
                     msg = "\n".join(lines)
@@ -227,6 +336,6 @@ class MonitorSystem:
                     else:
                         await self.notifier.send_message(msg)
                         
-                    logger.info(f"发送汇总: 内盘异常 {len(abnormals)}, 外盘OI异常 {len(oi_abnormals)}")
+                    logger.info(f"发送汇总: 内盘异常 {len(abnormals)}, 外盘OI异常 {len(oi_abnormals)}, 价差 {len(spreads)}")
             except Exception as e:
                 logger.error(f"定期汇总失败: {e}")
@@ -1,14 +1,15 @@
 # notifier.py
-import aiohttp
 import logging
 import time
 from collections import deque
 from config import CONFIG
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 class TelegramNotifier:
-    def __init__(self):
+    def __init__(self, http_client):
+        self.http = http_client  # 共享 HTTP 客户端 (http_client.HttpClient)
         self.base_url = f"https://api.telegram.org/bot{CONFIG['telegram']['bot_token']}/sendMessage"
         self.chat_id = CONFIG['telegram']['chat_id']
         # NOTE: 空字符串代理会导致 aiohttp 超时，需转为 None 表示直连
@@ -31,10 +32,12 @@ class TelegramNotifier:
             "text": text,
             "parse_mode": "HTML"
         }
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(self.base_url, json=payload, proxy=self.proxy) as resp:
+        try:
+            with metrics.timer("notifier.send"):
+                async with self.http.post(self.base_url, json=payload, proxy=self.proxy) as resp:
                     if resp.status != 200:
+                        metrics.count("notifier.errors")
                         logger.error(f"TG发送失败: {await resp.text()}")
-            except Exception as e:
-                logger.error(f"TG网络错误: {e}")
+        except Exception as e:
+            metrics.count("notifier.errors")
+            logger.error(f"TG网络错误: {e}")
@@ -1,42 +1,24 @@
 # oi_comparer.py
 import asyncio
 import logging
-import ccxt.async_support as ccxt
+import numpy as np
 import time
 from config import CONFIG
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 class OIComparer:
-    def __init__(self, notifier_ref, data_store_ref):
+    def __init__(self, notifier_ref, data_store_ref, exchange_hub):
         self.notifier = notifier_ref
         self.data_store = data_store_ref
-        self.proxy_url = CONFIG['proxy'] or None
+        self.hub = exchange_hub
         self.ratios = CONFIG['thresholds']['oi_compare']
         self.active_alerts = set()
         self.latest_abnormal_data = [] # Web端数据源
 
-        self.exchanges = {}
-        self._init_exchanges()
-
-    def _init_exchanges(self):
-        common_config = {
-            'timeout': 15000,
-            'enableRateLimit': True,
-            'proxies': {'http': self.proxy_url, 'https': self.proxy_url}
-        }
-        
-        # [新增] okx
-        target_list = ['bybit', 'bitget', 'gate', 'okx']
-        
-        for name in target_list:
-            try:
-                exchange_class = getattr(ccxt, name)
-                ex_inst = exchange_class(common_config)
-                ex_inst.options['defaultType'] = 'swap'
-                self.exchanges[name] = ex_inst
-            except Exception as e:
-                logger.error(f"OI监控: 初始化 {name} 失败: {e}")
+        # [新增] okx  (swap 实例与价差监控共用，行情快照直接复用)
+        self.exchanges = ['bybit', 'bitget', 'gate', 'okx']
 
     async def start(self):
         logger.info("启动跨交易所 OI 占比监控 (含OKX)...")
@@ -49,22 +31,22 @@ class OIComparer:
                 logger.error(f"OI对比循环异常: {e}")
             await asyncio.sleep(60)
 
+    @metrics.timed("loop.oi_compare")
     async def _check_oi_ratios(self):
         bn_oi_map = {}
-        for symbol, data in self.data_store.items():
-            if data.oi_history:
-                current_oi = data.oi_history[-1][1]
-                if current_oi > 0:
-                    base = symbol.replace("USDT", "")
-                    bn_oi_map[base] = current_oi
+        oi_now, _ = self.data_store.oi_latest()
+        symbols = self.data_store.symbols
+        for row in np.flatnonzero(oi_now > 0):
+            base = symbols[row].replace("USDT", "")
+            bn_oi_map[base] = float(oi_now[row])
 
         if not bn_oi_map: return
 
         tasks = []
         names = []
-        for name, ex in self.exchanges.items():
+        for name in self.exchanges:
             names.append(name)
-            tasks.append(self._fetch_tickers_safe(name, ex))
+            tasks.append(self._fetch_tickers_safe(name))
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
@@ -123,9 +105,9 @@ class OIComparer:
         self.latest_abnormal_data = current_abnormal_list
         self.active_alerts = self.active_alerts.intersection(detected_keys)
 
-    async def _fetch_tickers_safe(self, name, exchange):
+    async def _fetch_tickers_safe(self, name):
         try:
-            return await asyncio.wait_for(exchange.fetch_tickers(), timeout=15)
+            return await self.hub.tickers(name, 'swap', max_age=CONFIG['exchange_hub']['oi_tickers_max_age'])
         except Exception:
             return {}
 
@@ -0,0 +1,153 @@
+# oi_scheduler.py
+"""
+OI 轮询调度 (按活跃度分配请求权重)
+每个币种有自己的轮询间隔: 按 CVD 规模、价格波动、离 OI 阈值的距离打分，
+热门币种约 min_interval 秒一次，冷门币种退到 max_interval；
+总请求速率不超过 max_requests_per_minute；请求经 rate_governor 统一限流，
+服务端报告的已用权重 (X-MBX-USED-WEIGHT-1M) 超过 weight_budget 时不再发新请求，给其他模块留余量。
+"""
+import asyncio
+import logging
+import time
+
+import numpy as np
+from config import CONFIG
+from market_store import grow_rows
+from metrics import metrics
+from rate_governor import LOW, governor
+
+logger = logging.getLogger(__name__)
+
+OI_HOST = "fapi.binance.com"
+OI_URL = f"https://{OI_HOST}/fapi/v1/openInterest"
+OI_WEIGHT = 1
+
+
+class OIScheduler:
+    def __init__(self, data_store, proxy=None):
+        self.data_store = data_store
+        self.proxy = proxy
+        self.next_due = np.zeros(0)       # 行号 -> 下次轮询时间 (0 = 立即)
+        self.interval = np.zeros(0)       # 行号 -> 当前轮询间隔 (秒)
+        self.score = np.zeros(0)          # 行号 -> 活跃度 0~1
+        self.scale = 1.0                  # 需求超出预算时的整体拉长倍数
+        self.requests = 0
+        self.in_flight = 0
+
+    def _sync_rows(self):
+        """新币种: 立即轮询一次，之后先按最长间隔，等下次打分"""
+        n = len(self.data_store)
+        known = len(self.next_due)
+        if known < n:
+            self.next_due = grow_rows(self.next_due, n)
+            self.interval = grow_rows(self.interval, n)
+            self.score = grow_rows(self.score, n)
+            self.interval[known:] = CONFIG["oi_scheduler"]["max_interval"]
+        return n
+
+    def update_priorities(self):
+        """按活跃度重算每个币种的轮询间隔 (全池向量运算)"""
+        cfg = CONFIG["oi_scheduler"]
+        th = CONFIG["thresholds"]
+        store = self.data_store
+        n = self._sync_rows()
+        if n == 0: return
+
+        lb = store.lookback((60, 300), fields=('price', 'oi', 'cvd'))
+        oi_now = lb['oi']
+        p_now, p_1m = lb['price'], lb['price_past'][60]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # CVD: 5 分钟净主动成交占 OI 的比例 (1% 记满分)
+            cvd_ratio = np.where(oi_now > 0, np.abs(lb['cvd'][300]) / oi_now / cfg["cvd_oi_ratio"], 0.0)
+            # 价格: 1 分钟涨跌幅 / 大币阈值
+            vol_ratio = np.where(p_1m > 0, np.abs(p_now - p_1m) / p_1m / th["price_large_1m"], 0.0)
+            # OI: 5 分钟变化离报警阈值的距离
+            oi_delta = np.abs(oi_now - lb['oi_past'][300])
+            oi_ratio = np.where(oi_now >= th["oi_small_cap"],
+                                oi_delta / oi_now / th["oi_change_pct"],
+                                oi_delta / th["oi_change_abs"])
+        proximity = np.maximum(np.maximum(cvd_ratio, vol_ratio), oi_ratio)
+        score = np.clip(np.nan_to_num(proximity) / cfg["hot_ratio"], 0.0, 1.0)
+
+        # 间隔在 [min, max] 之间按分数几何插值: 分数 1 -> min_interval
+        lo, hi = cfg["min_interval"], cfg["max_interval"]
+        interval = hi * (lo / hi) ** score
+        demand = (60.0 / interval).sum()  # 每分钟请求数
+        self.scale = max(1.0, demand / cfg["max_requests_per_minute"])
+        self.score[:n] = score
+        self.interval[:n] = interval * self.scale
+
+        # 变热的币种不必等完旧间隔
+        now = time.time()
+        self.next_due[:n] = np.minimum(self.next_due[:n], now + self.interval[:n])
+
+    def _headroom(self):
+        """本分钟在 OI 权重预算内还能发的请求数"""
+        budget = CONFIG["oi_scheduler"]["weight_budget"]
+        return max(0, (budget - governor.used_weight(OI_HOST)) // OI_WEIGHT - self.in_flight)
+
+    @metrics.timed("rest.oi")
+    async def _fetch(self, session, symbol):
+        self.in_flight += 1
+        try:
+            async with governor.get(session, OI_URL, "oi_scheduler", LOW,
+                                    params={"symbol": symbol}, proxy=self.proxy) as r:
+                if r.status == 200:
+                    d = await r.json()
+                    data = self.data_store[symbol]
+                    price = data.price
+                    if price > 0:
+                        data.oi_history.append((time.time(), float(d['openInterest']) * price))
+                        self.data_store.mark_dirty(data.row)
+        except Exception:
+            pass
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+
+    def stats(self):
+        n = len(self.data_store)
+        interval = self.interval[:n]
+        return {
+            "symbols": n,
+            "hot": int((self.score[:n] >= 1.0).sum()),
+            "median_interval": float(np.median(interval)) if n else 0.0,
+            "min_interval": float(interval.min()) if n else 0.0,
+            "scale": self.scale,
+            "used_weight_1m": governor.used_weight(OI_HOST),
+            "requests": self.requests,
+        }
+
+    async def run(self, session):
+        cfg = CONFIG["oi_scheduler"]
+        last_priority = last_report = 0.0
+        tasks = set()
+        cycle = metrics.histogram("loop.oi_scheduler")
+        while True:
+            t0 = time.perf_counter()
+            now = time.time()
+            if now - last_priority >= cfg["priority_interval"]:
+                self.update_priorities()
+                last_priority = now
+            if now - last_report >= 300:
+                if last_report:
+                    s = self.stats()
+                    logger.info(f"OI 调度: 热门 {s['hot']}/{s['symbols']}, 间隔中位 {s['median_interval']:.0f}s, "
+                                f"已用权重 {s['used_weight_1m']}/{cfg['weight_budget']}")
+                last_report = now
+
+            n = self._sync_rows()
+            if n and not governor.paused(OI_HOST):
+                due = np.flatnonzero(self.next_due[:n] <= now)
+                budget = min(self._headroom(), cfg["max_concurrency"] - self.in_flight)
+                if len(due) and budget > 0:
+                    # 最热的先发
+                    due = due[np.argsort(-self.score[due], kind="stable")][:budget]
+                    self.next_due[due] = now + self.interval[due]
+                    symbols = self.data_store.symbols
+                    for row in due.tolist():
+                        t = asyncio.create_task(self._fetch(session, symbols[row]))
+                        tasks.add(t)
+                        t.add_done_callback(tasks.discard)
+            cycle.observe(time.perf_counter() - t0)
+            await asyncio.sleep(cfg["tick"])
@@ -5,6 +5,8 @@ import json
 import os
 from web3 import Web3
 from config import CONFIG
+from metrics import metrics
+from state_store import TTLStore
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +22,7 @@ class OnChainMonitor:
         self.targets = self._load_targets()
         
         self.w3_instances = {}
-        self.last_balances = {}
+        self.last_balances = TTLStore("onchain_balances")  # (链, 钱包, 代币) -> 上次余额
         self.token_info_cache = {} # 缓存精度和符号
 
     def _load_targets(self):
@@ -114,6 +116,7 @@ class OnChainMonitor:
             except Exception as e:
                 logger.error(f"链上监控循环异常: {e}")
 
+    @metrics.timed("loop.onchain")
     async def _check_all(self, silent=False):
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, self._sync_check_logic, silent)
@@ -145,10 +148,9 @@ class OnChainMonitor:
                     raw = ctr.functions.balanceOf(wallet).call()
                     current_balance = raw / (10 ** decs)
 
-                cache_key = f"{chain}_{wallet}_{token_addr}"
-                
-                if cache_key in self.last_balances:
-                    prev = self.last_balances[cache_key]
+                cache_key = self._balance_key(target)
+                prev = self.last_balances.get(cache_key)
+                if prev is not None:
                     if current_balance != prev:
                         delta = current_balance - prev
                         # 过滤极小额
@@ -156,10 +158,22 @@ class OnChainMonitor:
                             if not silent:
                                 self._notify(target['name'], chain, target['token_symbol'], current_balance, delta, wallet)
                 
-                self.last_balances[cache_key] = current_balance
+                self.last_balances.set(cache_key, current_balance)
             except Exception:
                 pass
 
+    @staticmethod
+    def _balance_key(target):
+        """last_balances 的键: (链, 校验和格式钱包地址, 代币)，轮询写入与网页读取共用"""
+        return (target['chain'], Web3.to_checksum_address(target['wallet']), target['token_address'])
+
+    def balance(self, target, default=0):
+        """目标的最近一次余额 (尚未查询到或地址非法时返回 default)"""
+        try:
+            return self.last_balances.get(self._balance_key(target), default)
+        except ValueError:
+            return default
+
     def _notify(self, name, chain, symbol, balance, delta, wallet):
         emoji = "🟢" if delta > 0 else "🔴"
         action = "转入" if delta > 0 else "转出"
@@ -0,0 +1,177 @@
+# rate_governor.py
+"""
+进程级 Binance REST 权重调度
+所有模块共用: 按 host 一个令牌桶 (每分钟权重上限 × budget_ratio)，
+按接口权重扣令牌，并以响应头 X-MBX-USED-WEIGHT-1M 校准；
+优先级高的请求 (如上币监控) 可插队；按调用方统计用量。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 优先级 (数值小的先放行)
+CRITICAL, NORMAL, LOW = 0, 1, 2
+
+WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+# (host, path) -> (带 symbol 权重, 不带 symbol 权重)
+ENDPOINT_WEIGHTS = {
+    ("fapi.binance.com", "/fapi/v1/exchangeInfo"): (1, 1),
+    ("fapi.binance.com", "/fapi/v1/openInterest"): (1, 1),
+    ("fapi.binance.com", "/fapi/v1/premiumIndex"): (1, 10),
+    ("fapi.binance.com", "/fapi/v1/ticker/24hr"): (1, 40),
+    ("fapi.binance.com", "/fapi/v1/ticker/price"): (1, 2),
+    ("api.binance.com", "/api/v3/exchangeInfo"): (20, 20),
+    ("api.binance.com", "/api/v3/ticker/24hr"): (2, 80),
+    ("api.binance.com", "/api/v3/ticker/price"): (2, 4),
+}
+
+
+def endpoint_weight(host, path, params=None):
+    weights = ENDPOINT_WEIGHTS.get((host, path))
+    if weights is None:
+        return 1
+    has_symbol = bool(params) and ("symbol" in params or "symbols" in params)
+    return weights[0] if has_symbol else weights[1]
+
+
+class HostBucket:
+    """单个 host 的令牌桶: 容量 = 每分钟预算，匀速回补；等待者按 (优先级, 先后) 排队"""
+    def __init__(self, host, limit_per_minute, budget_ratio):
+        self.host = host
+        self.limit = limit_per_minute
+        self.capacity = limit_per_minute * budget_ratio
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.used_weight = 0          # 服务端报告的本分钟已用权重
+        self.weight_minute = 0
+        self.paused_until = 0.0       # 429/418 后暂停 (monotonic)
+        self._waiters = []            # heap: (priority, seq, weight, future)
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight, priority=NORMAL):
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), weight, fut))
+        self._dispatch()
+        await fut
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        now = time.monotonic()
+        while self._waiters and now >= self.paused_until:
+            priority, _, weight, fut = self._waiters[0]
+            if fut.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < min(weight, self.capacity):
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= weight
+            fut.set_result(None)
+        if self._waiters and self._timer is None:
+            if now < self.paused_until:
+                delay = self.paused_until - now
+            else:
+                delay = (min(self._waiters[0][2], self.capacity) - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.01), self._dispatch)
+
+    def sync(self, used):
+        """用服务端报告的已用权重校准: 剩余令牌不超过 预算 - 已用"""
+        self.used_weight = used
+        self.weight_minute = int(time.time() // 60)
+        self._refill()
+        self.tokens = min(self.tokens, self.capacity - used)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0)
+
+    def current_used(self):
+        return self.used_weight if int(time.time() // 60) == self.weight_minute else 0
+
+    def stats(self):
+        self._refill()
+        return {
+            "limit_1m": self.limit,
+            "budget_1m": self.capacity,
+            "tokens": round(self.tokens, 1),
+            "used_weight_1m": self.current_used(),
+            "queued": len(self._waiters),
+            "paused": max(0.0, self.paused_until - time.monotonic()),
+        }
+
+
+class RateGovernor:
+    def __init__(self):
+        cfg = CONFIG["rate_governor"]
+        self.buckets = {host: HostBucket(host, limit, cfg["budget_ratio"]) for host, limit in cfg["hosts"].items()}
+        self.callers = {}   # caller -> {requests, weight, wait, errors}
+
+    def bucket(self, host):
+        return self.buckets.get(host)
+
+    def used_weight(self, host):
+        bucket = self.buckets.get(host)
+        return bucket.current_used() if bucket else 0
+
+    def paused(self, host):
+        bucket = self.buckets.get(host)
+        return bool(bucket) and time.monotonic() < bucket.paused_until
+
+    @asynccontextmanager
+    async def get(self, session, url, caller, priority=NORMAL, params=None, **kwargs):
+        """
+        受控的 session.get: 先按接口权重排队拿令牌，再发请求并用响应头校准
+        用法: async with governor.get(session, url, "listing") as resp: ...
+        """
+        parts = urlsplit(url)
+        host = parts.hostname
+        weight = endpoint_weight(host, parts.path, params)
+        bucket = self.buckets.get(host)
+        t0 = time.monotonic()
+        if bucket is not None:
+            await bucket.acquire(weight, priority)
+        stat = self.callers.setdefault(caller, {"requests": 0, "weight": 0, "wait": 0.0, "errors": 0})
+        stat["requests"] += 1
+        stat["weight"] += weight
+        stat["wait"] += time.monotonic() - t0
+
+        async with session.get(url, params=params, **kwargs) as resp:
+            if bucket is not None:
+                used = resp.headers.get(WEIGHT_HEADER)
+                if used is not None:
+                    bucket.sync(int(used))
+                if resp.status in (418, 429):
+                    retry = float(resp.headers.get("Retry-After", 60))
+                    bucket.pause(retry)
+                    logger.error(f"{host} 触发限频 ({resp.status}, 调用方 {caller})，全局暂停 {retry:.0f}s")
+            if resp.status >= 400:
+                stat["errors"] += 1
+            yield resp
+
+    def stats(self):
+        return {
+            "hosts": {host: b.stats() for host, b in self.buckets.items()},
+            "callers": {c: dict(s, wait=round(s["wait"], 2)) for c, s in self.callers.items()},
+        }
+
+
+governor = RateGovernor()
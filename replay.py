@@ -0,0 +1,339 @@
+# replay.py
+"""
+回放 / 回测引擎
+把录制 (tick_journal) 或合成的 aggTrade、OI、资金费率序列按虚拟时钟灌入 MarketStore，
+按实盘节奏调用 StrategyEngine，远快于实时。用于调 CONFIG["thresholds"]。
+
+用法:
+  python replay.py synthetic --symbols 200 --hours 24
+  python replay.py journal --start 2024-05-01T00:00 --end 2024-05-02T00:00
+  python replay.py synthetic --hours 24 --sweep price_small_1m=0.03,0.05 --sweep oi_change_pct=0.05,0.08
+"""
+import argparse
+import itertools
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+from config import CONFIG
+from market_store import MarketStore
+from strategy import StrategyEngine
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+TRADE, OI, FUNDING = 0, 1, 2
+
+EVENT_DTYPE = np.dtype([
+    ("ts", "<f8"),      # 事件时间 (秒)
+    ("kind", "u1"),     # TRADE / OI / FUNDING
+    ("sym", "<u4"),     # 在 symbols 列表中的下标
+    ("value", "<f8"),   # 成交价 / OI 名义价值 (USD) / 资金费率
+    ("qty", "<f8"),     # 成交数量 (仅 TRADE)
+    ("maker", "u1"),    # 1 = 主动卖 (仅 TRADE)
+])
+
+
+class VirtualClock:
+    """虚拟时钟: 回放时由引擎推进，注入 MarketStore / StrategyEngine"""
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+def synthetic_events(symbols=200, duration=3600, start=1_700_000_000, seed=0,
+                     trades_per_sec=1.0, poll_interval=60, chunk_seconds=3600):
+    """
+    生成合成行情 (按 chunk_seconds 分块产出，每块按时间排序)
+    价格为随机游走 + 少量跳变，OI/费率按 poll_interval 轮询节奏采样 (各币种错开)
+    返回 (symbol 列表, 事件块迭代器)
+    """
+    names = [f"SYN{i}USDT" for i in range(symbols)]
+
+    def chunks():
+        rng = np.random.default_rng(seed)
+        price = rng.uniform(0.05, 500.0, symbols)
+        oi = np.where(rng.random(symbols) < 0.3, rng.uniform(3e7, 2e9, symbols), rng.uniform(2e5, 3e7, symbols))
+        funding = rng.choice([0.0001, 0.0001, 0.0001, -0.0002, 0.003], symbols)
+        offset = rng.integers(0, poll_interval, symbols)
+
+        for t0 in range(0, duration, chunk_seconds):
+            span = min(chunk_seconds, duration - t0)
+            # 逐秒价格路径
+            steps = rng.normal(0, 0.0008, (span, symbols))
+            jumps = rng.random((span, symbols)) < 2e-5
+            steps[jumps] += rng.choice([-0.08, 0.08], int(jumps.sum()))
+            path = price * np.exp(np.cumsum(steps, axis=0))
+            price = path[-1]
+
+            # 成交: 每 (秒, 币种) 泊松个数，价格取该秒路径值
+            counts = rng.poisson(trades_per_sec, (span, symbols)).ravel()
+            n = int(counts.sum())
+            cell = np.repeat(np.arange(span * symbols), counts)
+            sec, sym = np.divmod(cell, symbols)
+            trades = np.empty(n, dtype=EVENT_DTYPE)
+            trades["ts"] = start + t0 + sec + rng.random(n)
+            trades["kind"] = TRADE
+            trades["sym"] = sym
+            trades["value"] = path[sec, sym]
+            trades["qty"] = rng.lognormal(3, 1.5, n) / np.sqrt(path[sec, sym])
+            trades["maker"] = rng.random(n) < 0.5
+
+            # OI / 资金费率轮询
+            poll_sec = np.arange(span)
+            due = (start + t0 + poll_sec[:, None] - offset) % poll_interval == 0
+            p_sec, p_sym = np.nonzero(due)
+            k = len(p_sec)
+            oi_moves = rng.normal(0, 0.004, k)
+            oi_moves[rng.random(k) < 0.01] += rng.choice([-0.12, 0.12])
+            polled = np.empty(2 * k, dtype=EVENT_DTYPE)
+            polled["qty"] = 0
+            polled["maker"] = 0
+            ts = start + t0 + p_sec + 0.5
+            for j in range(k):
+                oi[p_sym[j]] *= 1 + oi_moves[j]
+                if rng.random() < 0.002:
+                    funding[p_sym[j]] = rng.choice([0.0001, 0.006, 0.012, 0.019, 0.022, -0.025])
+                polled[2 * j] = (ts[j], OI, p_sym[j], oi[p_sym[j]] * path[p_sec[j], p_sym[j]], 0, 0)
+                polled[2 * j + 1] = (ts[j], FUNDING, p_sym[j], funding[p_sym[j]], 0, 0)
+
+            events = np.concatenate([trades, polled])
+            yield events[np.argsort(events["ts"], kind="stable")]
+
+    return names, chunks()
+
+
+def journal_events(reader, start_ms, end_ms):
+    """
+    从 tick_journal 读取成交 (日志只有成交，需配合 ReplayEngine 的 poll_interval 补价格采样)
+    返回 (symbol 列表, 事件块迭代器)
+    """
+    names = [reader.symbols[i] for i in range(len(reader.symbols))]
+
+    def chunks():
+        for records in reader.iter_range(start_ms, end_ms):
+            events = np.empty(len(records), dtype=EVENT_DTYPE)
+            events["ts"] = records["ts"] / 1000
+            events["kind"] = TRADE
+            events["sym"] = records["sym"]
+            events["value"] = records["price"]
+            events["qty"] = records["qty"]
+            events["maker"] = records["maker"]
+            yield events[np.argsort(events["ts"], kind="stable")]
+
+    return names, chunks()
+
+
+class ReplayEngine:
+    """
+    按虚拟秒推进:
+    1. 该秒成交按 (秒, 币种) 聚合后一次写入 CVD 前缀和环 (与逐笔 add_trade 结果相同)
+    2. OI/费率事件写入历史 (同实盘 markPrice 推送: 费率更新时顺带记录价格快照)
+    3. 预热结束后每 eval_interval 秒跑一轮策略 (同实盘 _strategy_loop)
+    """
+    def __init__(self, symbols, eval_interval=5, warmup=None, batch=None, poll_interval=None):
+        self.symbols = list(symbols)
+        self.eval_interval = eval_interval
+        self.warmup = CONFIG["warmup_seconds"] if warmup is None else warmup
+        self.batch = CONFIG["strategy_batch"] if batch is None else batch
+        self.poll_interval = poll_interval  # 事件中无 OI 时，按此间隔补记价格采样
+
+        self.clock = VirtualClock()
+        self.store = MarketStore(capacity=max(len(self.symbols), 1), clock=self.clock)
+        for s in self.symbols:
+            self.store.add_symbol(s)
+        self.strategy = StrategyEngine(clock=self.clock)
+
+    def run(self, chunks):
+        """chunks: 事件数组或事件块的可迭代对象，块间时间需递增"""
+        if isinstance(chunks, np.ndarray):
+            chunks = [chunks]
+        alerts = []
+        events = 0
+        first_sec = last_sec = None
+        t0 = time.perf_counter()
+
+        for chunk in chunks:
+            if not len(chunk): continue
+            events += len(chunk)
+            secs = np.floor(chunk["ts"]).astype(np.int64)
+            if first_sec is None:
+                first_sec = int(secs[0])
+            trades, polls = self._split(chunk, secs)
+            t_keys, t_rows, t_signed, t_price = trades
+            t_bounds = np.searchsorted(t_keys, np.arange(secs[0], secs[-1] + 2))
+            p_bounds = np.searchsorted(polls["sec"], np.arange(secs[0], secs[-1] + 2))
+
+            for i, sec in enumerate(range(int(secs[0]), int(secs[-1]) + 1)):
+                lo, hi = t_bounds[i], t_bounds[i + 1]
+                if lo < hi:
+                    self.store.add_trades(t_rows[lo:hi], sec, t_signed[lo:hi], t_price[lo:hi])
+                lo, hi = p_bounds[i], p_bounds[i + 1]
+                if lo < hi:
+                    self._apply_polls(polls[lo:hi])
+                elif self.poll_interval and sec % self.poll_interval == 0:
+                    self._sample_prices(sec)
+
+                # 该秒结束时刻
+                self.clock.now = sec + 1.0
+                if sec - first_sec >= self.warmup and (sec - first_sec) % self.eval_interval == 0:
+                    alerts.extend((self.clock.now, s, t, m) for s, t, m in self._evaluate())
+            last_sec = int(secs[-1])
+
+        wall = time.perf_counter() - t0
+        virtual = (last_sec - first_sec + 1) if first_sec is not None else 0
+        return {
+            "alerts": alerts,
+            "counts": dict(Counter(t for _, _, t, _ in alerts)),
+            "events": events,
+            "virtual_seconds": virtual,
+            "wall_seconds": wall,
+            "events_per_sec": events / wall if wall > 0 else 0.0,
+            "speedup": virtual / wall if wall > 0 else 0.0,
+        }
+
+    def _split(self, chunk, secs):
+        """成交按 (秒, 币种) 聚合 (净额、最后成交价)；OI/费率事件原样保留"""
+        is_trade = chunk["kind"] == TRADE
+        t = chunk[is_trade]
+        key = secs[is_trade] * len(self.symbols) + t["sym"]
+        uniq, inverse = np.unique(key, return_inverse=True)
+        vol = t["value"] * t["qty"]
+        signed = np.bincount(inverse, weights=np.where(t["maker"] == 1, -vol, vol), minlength=len(uniq))
+        # 同一格内最后一笔的价格 (事件已按时间排序，取最大下标)
+        last = np.zeros(len(uniq), dtype=np.int64)
+        np.maximum.at(last, inverse, np.arange(len(t)))
+        t_keys, t_rows = np.divmod(uniq, len(self.symbols))
+        trades = (t_keys, t_rows, signed, t["value"][last])
+
+        p = chunk[~is_trade]
+        polls = np.empty(len(p), dtype=[("sec", "<i8"), ("ts", "<f8"), ("kind", "u1"), ("sym", "<u4"), ("value", "<f8")])
+        polls["sec"] = secs[~is_trade]
+        for name in ("ts", "kind", "sym", "value"):
+            polls[name] = p[name]
+        return trades, polls
+
+    def _apply_polls(self, polls):
+        store = self.store
+        for ts, kind, row, value in zip(polls["ts"].tolist(), polls["kind"].tolist(),
+                                        polls["sym"].tolist(), polls["value"].tolist()):
+            if kind == OI:
+                store.oi.append(row, ts, value)
+            elif kind == FUNDING:
+                store.funding_rate[row] = value
+                store.funding.append(row, ts, value)
+                if store.price[row] > 0:
+                    store.price_hist.append(row, ts, store.price[row])
+
+    def _sample_prices(self, sec):
+        store = self.store
+        for row in np.flatnonzero(store.price[:len(store)] > 0):
+            store.price_hist.append(row, sec, store.price[row])
+
+    def _evaluate(self):
+        if self.batch:
+            return self.strategy.check_all(self.store)
+        alerts = []
+        for symbol in self.store:
+            alert_type, msg = self.strategy.check(symbol, self.store[symbol])
+            if msg:
+                alerts.append((symbol, alert_type, msg))
+        return alerts
+
+
+@contextmanager
+def override_thresholds(**overrides):
+    """临时修改 CONFIG["thresholds"] (策略每轮都重新读取配置)"""
+    th = CONFIG["thresholds"]
+    unknown = set(overrides) - set(th)
+    if unknown:
+        raise KeyError(f"未知阈值: {', '.join(sorted(unknown))}")
+    saved = {k: th[k] for k in overrides}
+    th.update(overrides)
+    try:
+        yield
+    finally:
+        th.update(saved)
+
+
+def sweep(symbols, chunks, grid, **engine_kwargs):
+    """
+    阈值网格扫描: grid = {"price_small_1m": [0.03, 0.05], ...}
+    事件块只物化一次，每组参数重新建引擎回放
+    返回 [(参数 dict, 回放报告), ...]
+    """
+    chunks = list(chunks)
+    names = list(grid)
+    results = []
+    for values in itertools.product(*(grid[k] for k in names)):
+        params = dict(zip(names, values))
+        with override_thresholds(**params):
+            report = ReplayEngine(symbols, **engine_kwargs).run(chunks)
+        results.append((params, report))
+    return results
+
+
+def _parse_time(text):
+    return int(datetime.fromisoformat(text).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _parse_sweep(items):
+    grid = {}
+    for item in items or []:
+        name, values = item.split("=", 1)
+        grid[name] = [float(v) for v in values.split(",")]
+    return grid
+
+
+def _summary(report):
+    counts = " ".join(f"{k}={v}" for k, v in sorted(report["counts"].items())) or "无"
+    return (f"警报 {len(report['alerts'])} ({counts}) | 事件 {report['events']:,} | "
+            f"耗时 {report['wall_seconds']:.1f}s | {report['events_per_sec']:,.0f} 事件/秒 | "
+            f"{report['speedup']:,.0f}x 实时")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略回放 / 阈值回测")
+    parser.add_argument("source", choices=["synthetic", "journal"])
+    parser.add_argument("--symbols", type=int, default=200, help="合成币种数")
+    parser.add_argument("--hours", type=float, default=1, help="合成时长 (小时)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", help="日志回放起点 (UTC, ISO 格式)")
+    parser.add_argument("--end", help="日志回放终点 (UTC, ISO 格式)")
+    parser.add_argument("--dir", help="日志目录 (默认 CONFIG['journal']['dir'])")
+    parser.add_argument("--poll-interval", type=int, default=60, help="日志回放时补记价格采样的间隔 (秒)")
+    parser.add_argument("--loop", action="store_true", help="逐币种 check (默认按 CONFIG['strategy_batch'])")
+    parser.add_argument("--sweep", action="append", metavar="NAME=V1,V2", help="阈值扫描，可多次指定")
+    parser.add_argument("--show", type=int, default=10, help="打印前 N 条警报")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    kwargs = {"batch": False} if args.loop else {}
+    if args.source == "synthetic":
+        symbols, chunks = synthetic_events(args.symbols, int(args.hours * 3600), seed=args.seed)
+    else:
+        from tick_journal import TickReader
+        symbols, chunks = journal_events(TickReader(args.dir), _parse_time(args.start), _parse_time(args.end))
+        kwargs["poll_interval"] = args.poll_interval
+
+    grid = _parse_sweep(args.sweep)
+    if grid:
+        for params, report in sweep(symbols, chunks, grid, **kwargs):
+            logger.info(f"{params} -> {_summary(report)}")
+        return
+
+    report = ReplayEngine(symbols, **kwargs).run(chunks)
+    logger.info(_summary(report))
+    for ts, symbol, alert_type, msg in report["alerts"][:args.show]:
+        when = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        title, detail = (msg.split("\n") + [""])[:2]
+        logger.info(f"{when} {alert_type} {title} {detail}")
+
+
+if __name__ == "__main__":
+    main()
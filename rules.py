@@ -0,0 +1,209 @@
+# rules.py
+"""
+声明式规则 (CONFIG["rules"])
+每条规则是一个基于命名指标的布尔表达式 (Python 表达式子集)，启动时用 ast 校验并编译成 numpy 向量运算:
+  and / or / not -> & | ~，a if c else b -> np.where，链式比较拆开，abs / min / max -> np.abs / np.minimum / np.maximum
+同时编译一份纯 Python 标量版本，供逐币种 check 使用 (0 维 numpy 运算每次都有数组开销)。
+指标名:
+  price / oi / funding                  当前价格 / 当前 OI (U) / 当前资金费率
+  cvd_5m, cvd_30s, cvd_1h ...           窗口净主动成交额 (U)
+  oi_delta_5m / oi_pct_5m               OI 窗口变化 (U) / 相对当前 OI 的比例
+  price_pct_1m                          价格窗口涨跌幅
+  funding_delta_5m                      费率窗口变化
+其余名字取 CONFIG["thresholds"] 的同名阈值 (每轮读取，回放调参可直接覆盖)。
+所有规则用到的窗口并入策略引擎的同一次 lookback，每个指标每轮只算一次；加规则不会多一次历史扫描。
+"""
+import ast
+import re
+
+import numpy as np
+from config import CONFIG
+
+_WINDOW_METRIC = re.compile(r"^(cvd|oi_delta|oi_pct|price_pct|funding_delta)_(\d+)(s|m|h)$")
+_UNIT = {"s": 1, "m": 60, "h": 3600}
+_PLAIN_METRICS = {"price": "price", "oi": "oi", "funding": None}  # 指标 -> 需要的 lookback 字段
+_FIELD = {"cvd": "cvd", "oi_delta": "oi", "oi_pct": "oi", "price_pct": "price", "funding_delta": "funding"}
+
+_BOOL_OPS = {ast.And: "&", ast.Or: "|"}
+_BIN_OPS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+_CMP_OPS = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+_FUNCS = {"abs": ("_abs", 1), "min": ("_minimum", 2), "max": ("_maximum", 2)}
+
+_ENV = {
+    "__builtins__": {},
+    "_bool": lambda x: np.asarray(x, dtype=bool),
+    "_where": np.where,
+    "_abs": np.abs,
+    "_minimum": np.minimum,
+    "_maximum": np.maximum,
+    "_div": lambda a, b: a / b,
+}
+
+
+def _scalar_div(a, b):
+    """除零与 numpy 同口径 (inf / nan)，不抛异常"""
+    if b: return a / b
+    return np.float64(a) / b
+
+
+# 标量版本: nan 传播与 np.minimum / np.maximum 一致
+_SCALAR_ENV = {
+    "__builtins__": {},
+    "_bool": bool,
+    "_abs": abs,
+    "_minimum": lambda a, b: a if a <= b or a != a else b,
+    "_maximum": lambda a, b: a if a >= b or a != a else b,
+    "_div": _scalar_div,
+}
+
+
+def parse_metric(name):
+    """指标名 -> (种类, 窗口秒数)；不是指标返回 None"""
+    if name in _PLAIN_METRICS:
+        return name, None
+    m = _WINDOW_METRIC.match(name)
+    if m is None:
+        return None
+    return m.group(1), int(m.group(2)) * _UNIT[m.group(3)]
+
+
+class Rule:
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.when = spec["when"]
+        self.title = spec.get("title", f"<b>{self.name}</b>")
+        self.tag = spec.get("tag", self.name)
+        self.cooldown = spec.get("cooldown", CONFIG["cooldown_seconds"])
+        self.metrics = set()
+        try:
+            tree = ast.parse(self.when, mode="eval")
+            self.source = self._emit(tree.body)
+            self.scalar_source = self._emit(tree.body, scalar=True)
+        except SyntaxError as e:
+            raise ValueError(f"规则 {self.name} 语法错误: {e}") from None
+        self.code = compile(self.source, f"<rule {self.name}>", "eval")
+        self.scalar = eval(compile(f"lambda m, t: {self.scalar_source}", f"<rule {self.name}>", "eval"), _SCALAR_ENV)
+
+    def _emit(self, node, scalar=False):
+        """ast 节点 -> numpy 表达式源码 (scalar=True 时生成纯 Python 标量表达式)"""
+        emit = lambda n: self._emit(n, scalar)
+        if isinstance(node, ast.BoolOp):
+            if scalar:
+                op = " and " if isinstance(node.op, ast.And) else " or "
+                return "(" + op.join(f"_bool({emit(v)})" for v in node.values) + ")"
+            op = _BOOL_OPS[type(node.op)]
+            return "(" + f" {op} ".join(f"_bool({emit(v)})" for v in node.values) + ")"
+        if isinstance(node, ast.UnaryOp):
+            operand = emit(node.operand)
+            if isinstance(node.op, ast.Not): return f"(not {operand})" if scalar else f"(~_bool({operand}))"
+            if isinstance(node.op, ast.USub): return f"(-{operand})"
+            if isinstance(node.op, ast.UAdd): return operand
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            if isinstance(node.op, ast.Div):
+                return f"_div({emit(node.left)}, {emit(node.right)})"
+            return f"({emit(node.left)} {_BIN_OPS[type(node.op)]} {emit(node.right)})"
+        if isinstance(node, ast.Compare) and all(type(op) in _CMP_OPS for op in node.ops):
+            terms = [emit(node.left)] + [emit(c) for c in node.comparators]
+            pairs = [f"({terms[i]} {_CMP_OPS[type(op)]} {terms[i + 1]})" for i, op in enumerate(node.ops)]
+            return pairs[0] if len(pairs) == 1 else "(" + (" and " if scalar else " & ").join(pairs) + ")"
+        if isinstance(node, ast.IfExp):
+            if scalar:
+                return f"({emit(node.body)} if {emit(node.test)} else {emit(node.orelse)})"
+            return f"_where({emit(node.test)}, {emit(node.body)}, {emit(node.orelse)})"
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCS
+                and not node.keywords):
+            fn, arity = _FUNCS[node.func.id]
+            if len(node.args) != arity:
+                raise ValueError(f"规则 {self.name}: {node.func.id}() 需要 {arity} 个参数")
+            return f"{fn}({', '.join(emit(a) for a in node.args)})"
+        if isinstance(node, ast.Name):
+            if parse_metric(node.id) is not None:
+                self.metrics.add(node.id)
+                return f"m[{node.id!r}]"
+            if isinstance(CONFIG["thresholds"].get(node.id), (int, float)):
+                return f"t[{node.id!r}]"
+            raise ValueError(f"规则 {self.name}: 未知指标或阈值 '{node.id}'")
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return repr(node.value)
+        raise ValueError(f"规则 {self.name}: 不支持的语法 '{ast.unparse(node)}'")
+
+
+class RulePlan:
+    """全部规则的执行计划: 合并后的指标 / 回看窗口 / lookback 字段"""
+    def __init__(self, specs):
+        self.rules = [Rule(spec) for spec in specs]
+        names = [r.name for r in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"规则名重复: {names}")
+        self.metrics = sorted(set().union(*(r.metrics for r in self.rules)))
+        parsed = [parse_metric(m) for m in self.metrics]
+        self.windows = tuple(sorted({w for _, w in parsed if w}))
+        self.fields = tuple(sorted({_PLAIN_METRICS[k] if w is None else _FIELD[k] for k, w in parsed} - {None}))
+        self._parsed = dict(zip(self.metrics, parsed))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def metric_values(self, lb, funding):
+        """从 lookback 结果算出规则用到的全部指标 (标量或整池 ndarray 均可)"""
+        values = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, (kind, w) in self._parsed.items():
+                if kind == "funding":
+                    v = funding
+                elif w is None:
+                    v = lb[kind]
+                elif kind == "cvd":
+                    v = lb['cvd'][w]
+                elif kind == "oi_delta":
+                    v = lb['oi'] - lb['oi_past'][w]
+                elif kind == "oi_pct":
+                    oi = lb['oi']
+                    v = np.where(oi > 0, (oi - lb['oi_past'][w]) / oi, 0.0)
+                elif kind == "price_pct":
+                    past = lb['price_past'][w]
+                    v = np.where(past > 0, (lb['price'] - past) / past, 0.0)
+                else:  # funding_delta
+                    v = lb['funding'] - lb['funding_past'][w]
+                values[name] = v
+        return values
+
+    def scalar_values(self, lb, funding):
+        """metric_values 的单币种纯 Python 版本 (lb 为 get_lookback 的标量结果)"""
+        values = {}
+        for name, (kind, w) in self._parsed.items():
+            if kind == "funding":
+                v = funding
+            elif w is None:
+                v = lb[kind]
+            elif kind == "cvd":
+                v = lb['cvd'][w]
+            elif kind == "oi_delta":
+                v = lb['oi'] - lb['oi_past'][w]
+            elif kind == "oi_pct":
+                oi = lb['oi']
+                v = (oi - lb['oi_past'][w]) / oi if oi > 0 else 0.0
+            elif kind == "price_pct":
+                past = lb['price_past'][w]
+                v = (lb['price'] - past) / past if past > 0 else 0.0
+            else:  # funding_delta
+                v = lb['funding'] - lb['funding_past'][w]
+            values[name] = v
+        return values
+
+    def hits(self, lb, funding):
+        """单币种: 命中的规则下标列表 (结果与 evaluate 逐行一致)"""
+        if not self.rules: return []
+        m = self.scalar_values(lb, funding)
+        t = CONFIG["thresholds"]
+        return [k for k, r in enumerate(self.rules) if r.scalar(m, t)]
+
+    def evaluate(self, lb, funding):
+        """返回每条规则的命中掩码 (与 funding 同形状的 bool 数组)"""
+        if not self.rules: return []
+        env = dict(_ENV, m=self.metric_values(lb, funding), t=CONFIG["thresholds"])
+        shape = np.shape(funding)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            masks = [np.asarray(eval(r.code, env), dtype=bool) for r in self.rules]
+        # 只引用常量/阈值的规则得到标量，补成与 funding 同形
+        return [m if m.shape == shape else np.broadcast_to(m, shape) for m in masks]
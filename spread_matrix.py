@@ -0,0 +1,91 @@
+# spread_matrix.py
+"""
+跨所价差矩阵 (币种 id × 交易所)
+每轮把各所报价按 symbol_map 的币种 id 填进同一个价格矩阵，与 Binance 价格一次性算出全部价差百分比，
+阈值判断和冷却 (上次报警时间矩阵) 都是整矩阵运算；完整价差面保留给网页与定期汇总，不只留报警的那几对。
+"""
+import numpy as np
+
+
+class SpreadMatrix:
+    def __init__(self):
+        self.venues = []                       # 列 -> 交易所名
+        self._cols = {}                        # 交易所名 -> 列
+        self.binance = np.zeros(0)             # 币种 id -> Binance 价格 (0 = 无)
+        self.other = np.zeros((0, 0))          # 币种 id × 交易所 -> 报价 (USDT 计价, 0 = 无)
+        self.pct = np.zeros((0, 0))            # 价差百分比 (无报价为 nan)
+        self.last_alert = np.zeros((0, 0))     # 冷却: 上次报警时间
+        self.updated = 0.0
+
+    def column(self, venue):
+        col = self._cols.get(venue)
+        if col is None:
+            col = self._cols[venue] = len(self.venues)
+            self.venues.append(venue)
+        return col
+
+    def _grow(self, n_coins):
+        n_venues = len(self.venues)
+        old = self.last_alert
+        if old.shape != (n_coins, n_venues):
+            grown = np.zeros((max(n_coins, old.shape[0]), n_venues))
+            grown[:old.shape[0], :old.shape[1]] = old
+            self.last_alert = grown
+
+    def update(self, binance, columns, now):
+        """binance: 币种 id -> 价格; columns: [(交易所名, 币种 id 数组, 报价数组)]"""
+        for venue, _, _ in columns:
+            self.column(venue)
+        n = len(binance)
+        self._grow(n)
+        other = np.zeros((n, len(self.venues)))
+        for venue, ids, prices in columns:
+            other[ids, self._cols[venue]] = prices
+        self.binance = binance
+        self.other = other
+        with np.errstate(divide='ignore', invalid='ignore'):
+            valid = (binance > 0)[:, None] & (other > 0)
+            self.pct = np.where(valid, (other - binance[:, None]) / binance[:, None], np.nan)
+        self.updated = now
+
+    def alerts(self, threshold, cooldown, now):
+        """返回 (超阈值的 (币种 id, 列), 其中冷却已过需要通知的掩码)；通知的那些记下本次时间"""
+        pct = self.pct
+        with np.errstate(invalid='ignore'):
+            hit = np.abs(pct) >= threshold
+        coins, cols = np.nonzero(hit)
+        last = self.last_alert[coins, cols]
+        fire = now - last > cooldown
+        self.last_alert[coins[fire], cols[fire]] = now
+        return coins, cols, fire
+
+    def top(self, names, limit=10):
+        """价差绝对值最大的若干对"""
+        flat = np.nan_to_num(np.abs(self.pct), nan=-1.0).ravel()
+        if not flat.size: return []
+        k = min(limit, flat.size)
+        idx = np.argpartition(flat, -k)[-k:]
+        idx = idx[np.argsort(flat[idx])[::-1]]
+        return [self.pair(names, *divmod(int(i), self.pct.shape[1])) for i in idx if flat[i] >= 0]
+
+    def pair(self, names, coin, col):
+        return {
+            'coin': names[coin],
+            'ex': self.venues[col],
+            'bin_p': float(self.binance[coin]),
+            'other_p': float(self.other[coin, col]),
+            'pct': float(self.pct[coin, col]),
+        }
+
+    def surface(self, names):
+        """完整价差面 (至少一个交易所有报价的币种)，供网页展示"""
+        pct = self.pct
+        rows = np.flatnonzero(~np.isnan(pct).all(axis=1)) if pct.size else np.zeros(0, dtype=np.int64)
+        sub = np.round(pct[rows], 6)
+        return {
+            'updated': self.updated,
+            'venues': list(self.venues),
+            'coins': [names[i] for i in rows.tolist()],
+            'binance': self.binance[rows].tolist(),
+            'pct': [[None if v != v else v for v in r] for r in sub.tolist()],
+        }
@@ -1,35 +1,39 @@
 # spread_monitor.py
 import asyncio
 import logging
-import ccxt.async_support as ccxt
+import numpy as np
 import time
 from config import CONFIG
+from spread_matrix import SpreadMatrix
+from symbol_map import SymbolMap
+from ticker_stream import TickerStream, venue_for
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 
 class SpreadMonitor:
-    def __init__(self, notifier_ref, data_store_ref):
+    def __init__(self, notifier_ref, data_store_ref, exchange_hub):
         self.notifier = notifier_ref
         self.data_store = data_store_ref 
+        self.hub = exchange_hub
         self.proxy_url = CONFIG['proxy'] or None
         self.threshold = CONFIG['thresholds']['spread_pct']
         self.check_interval = CONFIG['thresholds']['spread_check_interval']
-        self.cooldowns = {} 
-        self.exchanges = {}
+        self.exchanges = {}            # 交易所名 (如 okx_swap) -> 共享 ccxt 实例
+        self.market_types = {}
+        self.venues = {}               # 交易所名 -> (ccxt 交易所, 市场类型)
+        self.symbol_map = SymbolMap()  # 各交易所 markets 加载后建一次，之后按币种 id 连接
+        self.matrix = SpreadMatrix()   # 币种 × 交易所 价差面 (含冷却)
         self.latest_alerts = [] # Web端数据源
+        self.streams = {}              # 流式模式: 交易所名 -> TickerStream
+        self.rest_tickers = {}         # 流式模式: 断流交易所的 REST 报价
+        self._stream_tasks = []
+        self._stream_event = None
+        self._pending_since = 0.0      # 最早一次未处理的报价变化时间
         
         self._init_exchanges()
 
     def _init_exchanges(self):
-        common_config = {
-            'timeout': 10000,
-            'enableRateLimit': True,
-            'proxies': {
-                'http': self.proxy_url,
-                'https': self.proxy_url,
-            }
-        }
-        
         self.target_exchanges = [
             ('binance', 'spot'),
             ('bybit', 'spot'), ('bybit', 'swap'), 
@@ -42,19 +46,18 @@ class SpreadMonitor:
 
         for ex_name, market_type in self.target_exchanges:
             try:
-                exchange_class = getattr(ccxt, ex_name)
-                ex_inst = exchange_class(common_config)
-                
-                if market_type == 'swap':
-                    ex_inst.options['defaultType'] = 'swap' 
-                
-                self.exchanges[f"{ex_name}_{market_type}"] = ex_inst
+                self.exchanges[f"{ex_name}_{market_type}"] = self.hub.client(ex_name, market_type)
+                self.market_types[f"{ex_name}_{market_type}"] = market_type
+                self.venues[f"{ex_name}_{market_type}"] = (ex_name, market_type)
             except Exception as e:
                 logger.error(f"初始化交易所 {ex_name} 失败: {e}")
 
     async def start(self):
         logger.info(f"启动全网价差监控 (含OKX, Interval: {self.check_interval}s)...")
         await asyncio.sleep(5)
+        if CONFIG['spread_stream']['enabled']:
+            await self._run_streaming()
+            return
         
         while True:
             start_time = time.time()
@@ -67,111 +70,166 @@ class SpreadMonitor:
             sleep_time = max(0, self.check_interval - elapsed)
             await asyncio.sleep(sleep_time)
 
-    async def _close_exchanges(self):
-        for ex in self.exchanges.values():
-            await ex.close()
+    # ---------------- 流式模式 ----------------
+    async def _run_streaming(self):
+        """报价有推送变化即重算 (两次之间至少间隔 eval_interval)；断流的交易所按 check_interval 走 REST"""
+        cfg = CONFIG['spread_stream']
+        logger.info(f"价差监控流式模式 (重算间隔 ≥ {cfg['eval_interval']}s, 断流 {cfg['stale_seconds']}s 回退 REST)")
+        self._stream_event = asyncio.Event()
+        fallback = asyncio.create_task(self._poll_fallback())
+        try:
+            while True:
+                await self._stream_event.wait()
+                self._stream_event.clear()
+                try:
+                    await self._check_streaming()
+                except Exception as e:
+                    logger.error(f"价差流式重算异常: {e}")
+                await asyncio.sleep(cfg['eval_interval'])
+        finally:
+            fallback.cancel()
+            for t in self._stream_tasks:
+                t.cancel()
+
+    def _on_stream_update(self, venue, ts):
+        if not self._stream_event.is_set():
+            self._pending_since = ts
+            self._stream_event.set()
+
+    def _streaming(self, name):
+        stream = self.streams.get(name)
+        return stream is not None and stream.fresh(CONFIG['spread_stream']['stale_seconds'])
+
+    def _ensure_streams(self):
+        """markets 已加载的交易所: 建推送连接 / markets 变化时更新订阅"""
+        for name, ex in self.exchanges.items():
+            emap = self.symbol_map.exchange(name, ex, self.market_types[name])
+            if emap is None: continue
+            stream = self.streams.get(name)
+            if stream is None:
+                venue = venue_for(name, self.market_types[name])
+                if venue is None: continue
+                stream = self.streams[name] = TickerStream(name, venue, self._on_stream_update, self.proxy_url)
+                stream.set_markets(emap, ex.markets)
+                self._stream_tasks.append(asyncio.create_task(stream.run()))
+            else:
+                stream.set_markets(emap, ex.markets)
+
+    async def _poll_fallback(self):
+        """REST 兜底: 首轮全量 (顺带加载 markets)，之后只拉断流的交易所；每轮按当前 markets 校正推送订阅"""
+        while True:
+            start_time = time.time()
+            stale = [n for n in self.exchanges if not self._streaming(n)]
+            if stale:
+                results = await asyncio.gather(*(self._fetch_exchange_tickers(n) for n in stale))
+                for res in results:
+                    if res['data']:
+                        self.rest_tickers[res['source']] = res['data']
+                self._on_stream_update(None, time.time())
+            # 每轮都对一次订阅: 后台刷新 markets 后，全部交易所都在推送时也要更新订阅 (无变化时 set_markets 直接返回)
+            self._ensure_streams()
+            await asyncio.sleep(max(0, self.check_interval - (time.time() - start_time)))
+
+    @metrics.timed("loop.spread_stream")
+    async def _check_streaming(self):
+        prices = self.data_store.prices()
+        if not (prices > 0).any():
+            return
+        results = []
+        for name in self.exchanges:
+            data = self.streams[name].tickers if self._streaming(name) else self.rest_tickers.get(name)
+            if data:
+                results.append({'source': name, 'data': data})
+        now = time.time()
+        metrics.observe("spread.detect_delay", max(0.0, now - self._pending_since))
+        alerts, krw_rate = self._evaluate(results, prices, now)
+        if alerts:
+            await self._send_batch_alert(alerts, krw_rate)
+
+    def stream_stats(self):
+        return {
+            "enabled": CONFIG['spread_stream']['enabled'],
+            "streams": [s.stats() for s in self.streams.values()],
+            "rest_fallback": [n for n in self.exchanges if not self._streaming(n)] if self.streams else list(self.exchanges),
+        }
 
+    @metrics.timed("loop.spread")
     async def _check_spreads(self):
-        base_prices = {}
-        for symbol, data in self.data_store.items():
-            if data.price > 0:
-                base_coin = symbol.replace("USDT", "")
-                base_prices[base_coin] = data.price
-
-        if not base_prices:
+        prices = self.data_store.prices()
+        if not (prices > 0).any():
             return
 
         tasks = []
-        for name, ex in self.exchanges.items():
-            tasks.append(self._fetch_exchange_tickers(name, ex))
+        for name in self.exchanges:
+            tasks.append(self._fetch_exchange_tickers(name))
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        krw_rate = 1400.0 
-        for res in results:
-            if isinstance(res, dict) and res.get('source') == 'upbit_spot':
-                upbit_data = res['data']
-                if 'KRW-USDT' in upbit_data:
-                    krw_price = upbit_data['KRW-USDT']['last']
-                    if krw_price and krw_price > 0:
-                        krw_rate = krw_price
-                break
-
-        alerts = []
-        
+        alerts, krw_rate = self._evaluate(results, prices, time.time())
+        if alerts:
+            await self._send_batch_alert(alerts, krw_rate)
+
+    def _evaluate(self, results, prices, now):
+        """各所报价 -> 价差矩阵; 返回 (冷却已过需通知的价差对, KRW 汇率)"""
+        # markets 随首次 fetch_tickers 加载；映射只在 markets 变化时重建
+        smap = self.symbol_map
+        joined = []
         for res in results:
             if isinstance(res, Exception) or not isinstance(res, dict):
                 continue
-                
-            ex_name = res['source']
-            tickers = res['data']
-            
-            for base_coin, bin_price in base_prices.items():
-                target_price = 0.0
-                
-                if 'upbit' in ex_name:
-                    u_symbol = f"KRW-{base_coin}"
-                    if u_symbol in tickers and tickers[u_symbol]['last']:
-                        target_price = tickers[u_symbol]['last'] / krw_rate
-                else:
-                    # 匹配符号: BTC/USDT, BTC/USDT:USDT (OKX/Bybit Perp), BTCUSDT
-                    candidates = [
-                        f"{base_coin}/USDT", 
-                        f"{base_coin}/USDT:USDT", 
-                        f"{base_coin}USDT"
-                    ]
-                    for sym in candidates:
-                        if sym in tickers and tickers[sym]['last']:
-                            target_price = tickers[sym]['last']
-                            break
-
-                if target_price > 0:
-                    diff_pct = (target_price - bin_price) / bin_price
-                    
-                    if abs(diff_pct) >= self.threshold:
-                        cd_key = f"{base_coin}_{ex_name}"
-                        if self._check_cooldown(cd_key):
-                            alerts.append({
-                                'coin': base_coin,
-                                'ex': ex_name,
-                                'bin_p': bin_price,
-                                'other_p': target_price,
-                                'pct': diff_pct
-                            })
-
-        self.latest_alerts = alerts
-
-        # 筛选需要发送 TG 通知的（带冷却）
-        tg_alerts = []
-        for a in alerts:
-            # 这里需要再次检查冷却，因为 latest_alerts 是全量的供前端展示
-            # 但上面的 _check_cooldown 已经更新了时间戳，所以这里逻辑稍微有点冗余但安全
-            # 实际上我们在上面已经 check 过了，这里直接发即可
-            tg_alerts.append(a)
-
-        if tg_alerts:
-            await self._send_batch_alert(tg_alerts, krw_rate)
-
-    async def _fetch_exchange_tickers(self, name, exchange):
+            name = res['source']
+            emap = smap.exchange(name, self.exchanges[name], self.market_types[name])
+            if emap is not None and res['data']:
+                joined.append((emap, res['data']))
+
+        # Binance 价格按币种 id 排列 (映射建完后 id 空间才完整)
+        row_ids = smap.binance_ids(self.data_store.symbols)
+        live = np.flatnonzero(prices > 0)
+        bin_by_coin = np.zeros(len(smap.names))
+        bin_by_coin[row_ids[live]] = prices[live]
+
+        krw_rate = 1400.0 
+        for emap, tickers in joined:
+            if emap.quote == 'KRW':
+                usdt = emap.by_coin.get(smap.coins.get('USDT'))
+                t = tickers.get(usdt) if usdt else None
+                if t and t['last'] and t['last'] > 0:
+                    krw_rate = t['last']
+                break
+
+        columns = []
+        for emap, tickers in joined:
+            last = np.fromiter(((t.get('last') or 0.0) if (t := tickers.get(sym)) else 0.0 for sym in emap.symbols),
+                               dtype=np.float64, count=len(emap))
+            if emap.quote == 'KRW':
+                last /= krw_rate
+            columns.append((emap.name, emap.coin_ids, last))
+
+        matrix = self.matrix
+        matrix.update(bin_by_coin, columns, now)
+        coins, cols, fire = matrix.alerts(self.threshold, CONFIG['thresholds'].get('spread_cooldown', 1800), now)
+
+        # 网页展示全部超阈值的价差对，TG 只发冷却已过的
+        pairs = [(matrix.pair(smap.names, c, v), f) for c, v, f in zip(coins.tolist(), cols.tolist(), fire.tolist())]
+        pairs.sort(key=lambda x: abs(x[0]['pct']), reverse=True)
+        self.latest_alerts = [p for p, _ in pairs]
+        return [p for p, f in pairs if f], krw_rate
+
+    def top_spreads(self, limit=10):
+        """当前价差面里绝对值最大的若干对 (不论是否超阈值)"""
+        return self.matrix.top(self.symbol_map.names, limit)
+
+    def spread_surface(self):
+        return self.matrix.surface(self.symbol_map.names)
+
+    async def _fetch_exchange_tickers(self, name):
         try:
-            # 15秒超时
             return {
                 'source': name, 
-                'data': await asyncio.wait_for(exchange.fetch_tickers(), timeout=15)
+                'data': await self.hub.tickers(*self.venues[name])
             }
         except Exception:
             return {'source': name, 'data': {}}
 
-    def _check_cooldown(self, key):
-        now = time.time()
-        last = self.cooldowns.get(key, 0)
-        cd_seconds = CONFIG['thresholds'].get('spread_cooldown', 1800)
-        
-        if now - last > cd_seconds:
-            self.cooldowns[key] = now
-            return True
-        return False
-
     async def _send_batch_alert(self, alerts, krw_rate):
         alerts.sort(key=lambda x: abs(x['pct']), reverse=True)
         top_alerts = alerts[:10]
@@ -0,0 +1,108 @@
+# state_store.py
+"""
+带过期与容量上限的状态存储 (冷却时间 / 已读公告 / 链上余额等)
+- 键用元组 (如 (symbol, "OI"))，不再在热循环里拼字符串
+- 每个键有过期时间，最小堆按到期顺序淘汰；读到已过期的键视为不存在
+- 超过 capacity 时按最近访问淘汰 (LRU)
+- 所有实例登记在 registry，GET /api/system/state 查看各自大小与淘汰计数
+"""
+import heapq
+import itertools
+import time
+import weakref
+from collections import OrderedDict
+
+from config import CONFIG
+
+_registry = weakref.WeakSet()
+
+
+class TTLStore:
+    def __init__(self, name, ttl=None, capacity=None, clock=time.time):
+        cfg = CONFIG["state_store"].get(name, {})
+        self.name = name
+        self.ttl = cfg.get("ttl", ttl)                      # 默认存活秒数 (None = 只能按 set 时给的 ttl)
+        self.capacity = cfg.get("capacity", capacity or CONFIG["state_store"]["default_capacity"])
+        self.clock = clock
+        self._data = OrderedDict()   # key -> (value, 到期时间)，顺序即 LRU 顺序
+        self._heap = []              # (到期时间, seq, key)，同一键可能有多条旧记录，弹出时核对
+        self._seq = itertools.count()
+        self.expired = 0
+        self.evicted = 0
+        _registry.add(self)
+
+    def _purge(self, now):
+        heap, data = self._heap, self._data
+        while heap and heap[0][0] < now:
+            expires, _, key = heapq.heappop(heap)
+            entry = data.get(key)
+            if entry is not None and entry[1] == expires:
+                del data[key]
+                self.expired += 1
+        # 反复续期的键会在堆里留下旧记录，积累过多时重建
+        if len(heap) > 2 * len(data) + 1024:
+            self._heap = [(exp, next(self._seq), key) for key, (_, exp) in data.items()]
+            heapq.heapify(self._heap)
+
+    def set(self, key, value, ttl=None):
+        now = self.clock()
+        ttl = self.ttl if ttl is None else ttl
+        expires = now + ttl
+        data = self._data
+        data[key] = (value, expires)
+        data.move_to_end(key)
+        heapq.heappush(self._heap, (expires, next(self._seq), key))
+        self._purge(now)
+        while len(data) > self.capacity:
+            data.popitem(last=False)
+            self.evicted += 1
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None: return default
+        if entry[1] < self.clock():
+            del self._data[key]
+            self.expired += 1
+            return default
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        now = self.clock()
+        return [(k, v) for k, (v, exp) in self._data.items() if exp >= now]
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def check_cooldown(self, key, seconds):
+        """冷却: 距上次触发超过 seconds 秒则记下本次并返回 True (记录 seconds 秒后自动过期)"""
+        now = self.clock()
+        entry = self._data.get(key)
+        if entry is not None and now <= entry[1]:
+            return False
+        self.set(key, now, seconds)
+        return True
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "capacity": self.capacity,
+            "heap": len(self._heap),
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+_MISSING = object()
+
+
+def registry_stats():
+    return sorted((s.stats() for s in _registry), key=lambda s: s["name"])
@@ -1,87 +1,270 @@
 # strategy.py
 import time
+from collections.abc import Mapping
 from datetime import datetime
+
+import numpy as np
+from abnormal_view import AbnormalView
 from config import CONFIG
+from market_store import grow_rows
+from rules import RulePlan
+from state_store import TTLStore
+
+# check / 消息矩阵 / 快照用到的全部回看窗口，每币种一次查询取齐
+LOOKBACK_WINDOWS = (60, 180, 300, 600, 900, 1800)
+EVAL_SLACK = 0.01  # 间隔判定容差: 上一轮刚评估的行按 min_interval 唤醒时浮点误差会差一点点，不留容差会被推迟一整轮
+BATCH_LOOKBACK_MIN_ROWS = 10  # 命中行达到此数才走批量回看；批量调用有约 0.3ms 固定开销，单行 get_lookback 约 30us
+
+
+class FundingStates(Mapping):
+    """
+    资金费率状态机的列式存储 (每币种一行)
+    按 symbol 读取时返回与旧版 fund_states[symbol] 相同结构的 dict 快照
+    """
+    def __init__(self, capacity=512):
+        self.index = {}     # symbol -> row
+        self.symbols = []   # row -> symbol
+        self.level = np.zeros(capacity, dtype=np.int8)
+        self.last_val = np.zeros(capacity)
+        self.exit_mode = np.zeros(capacity, dtype=bool)
+        self.exit_start = np.zeros(capacity)
+        self.exit_count = np.zeros(capacity, dtype=np.int8)
+
+    def row(self, symbol):
+        row = self.index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= len(self.level):
+                rows = len(self.level) * 2
+                for name in ("level", "last_val", "exit_mode", "exit_start", "exit_count"):
+                    setattr(self, name, grow_rows(getattr(self, name), rows))
+            self.index[symbol] = row
+            self.symbols.append(symbol)
+        return row
+
+    def __getitem__(self, symbol):
+        row = self.index[symbol]
+        return {
+            'level': int(self.level[row]),
+            'last_val': float(self.last_val[row]),
+            'exit_mode': bool(self.exit_mode[row]),
+            'exit_start': float(self.exit_start[row]),
+            'exit_count': int(self.exit_count[row]),
+        }
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.symbols)
+
 
 class StrategyEngine:
-    def __init__(self):
-        self.cooldowns = {} 
-        self.fund_states = {} 
+    def __init__(self, clock=time.time):
+        self.clock = clock  # 可注入的时钟 (回放时使用虚拟时钟)
+        self.cooldowns = TTLStore("strategy_cooldowns", clock=clock)  # (symbol, 类型) -> 上次触发时间
+        self.fund_states = FundingStates()
         
-        # [新增] 短期事件缓存 (用于让瞬间异动在网页上停留)
-        # 格式: { "BTCUSDT_PRICE": {data...}, "ETHUSDT_OI": {data...} }
-        self.event_cache = {} 
+        # 异常列表物化视图: 费率异常常驻 + 价格/OI/规则异动短期停留 (网页与定期汇总直接读取)
+        self.view = AbnormalView(CONFIG["abnormal_view"]["event_ttl"])
+        self._view_refresh = 0.0
+
+        # 批量模式: MarketStore 行号 -> FundingStates 行号
+        self._fund_rows = np.zeros(0, dtype=np.int64)
+        # 事件驱动模式: MarketStore 行号 -> 上次评估时间
+        self._last_eval = np.zeros(0)
+        self.evaluated = 0  # 事件驱动模式累计评估的币种次数
+
+        # 声明式规则 (CONFIG["rules"])：窗口并入同一次回看，不额外扫描历史
+        self.rules = RulePlan(CONFIG.get("rules", []))
+        self._windows = tuple(sorted(set(LOOKBACK_WINDOWS) | set(self.rules.windows)))
+        self._batch_windows = tuple(sorted({60, 180, 300} | set(self.rules.windows)))
+        self._batch_fields = tuple(sorted({'price', 'oi'} | set(self.rules.fields)))
 
     def check(self, symbol, data):
         """核心判断逻辑"""
-        oi_delta_5m, oi_now, _ = data.get_oi_delta(300)
+        lb = data.get_lookback(self._windows)
         funding = data.funding_rate
-        abs_fund = abs(funding)
-        now = time.time()
-        
-        # 基础数据快照 (用于缓存)
-        snapshot_data = {
-            "symbol": symbol,
-            "price_now": data.price,
-            "price_past": data.get_price_delta(300)[1],
-            "oi_now": oi_now,
-            "oi_delta": oi_delta_5m,
-            "rate": funding,
-            "fund_delta": data.get_funding_delta(300),
-            "cvd_total": data.get_cvd_sum(1800),
-            "cvd_5m": data.get_cvd_sum(300),
-            "level": 0, # 默认为0
-            "tags": []  # 存储标签: [价格异动], [OI异动]
-        }
+        level = self._funding_level(abs(funding))
+        rules_hit = self.rules.hits(lb, funding)
+        return self._check_symbol(symbol, data, lb, funding, level, self.clock(), rules_hit)
 
-        # --- Funding Logic ---
-        if symbol not in self.fund_states:
-            self.fund_states[symbol] = {'level': 0, 'last_val': 0.0, 'exit_mode': False, 'exit_start': 0, 'exit_count': 0}
-        f_state = self.fund_states[symbol]
-        prev_level = f_state['level']
-        f_msg = None
-        current_level = 0
+    def check_all(self, store, rows=None):
+        """
+        批量模式: 对 MarketStore 全池 (或 rows 指定的行) 一次性做向量化阈值判断,
+        仅对命中的币种执行逐个的冷却/状态机/消息逻辑
+        返回 [(symbol, alert_type, msg), ...]
+        """
+        n = len(store)
+        if n == 0: return []
+        now = self.clock()
+        th = CONFIG["thresholds"]
+        fs = self.fund_states
+        if rows is None:
+            rows = np.arange(n)
+            fund_rows = self._sync_fund_rows(store)
+            funding = store.funding_rates()
+            lb = store.lookback(self._batch_windows, fields=self._batch_fields)
+        else:
+            if not len(rows): return []
+            fund_rows = self._sync_fund_rows(store)[rows]
+            funding = store.funding_rate[rows]
+            lb = store.lookback(self._batch_windows, fields=self._batch_fields, rows=rows)
+
+        # --- Funding: 只有可能产生消息或改变退出状态的行才走逐个状态机 ---
+        level = self._funding_level(np.abs(funding))
+        prev = fs.level[fund_rows]
+        exiting = fs.exit_mode[fund_rows]
+        fund_hit = (exiting
+                    | ((level == 4) & ((prev < 4) | (funding != fs.last_val[fund_rows])))
+                    | ((prev == 4) & (level < 4))
+                    | ((level > 0) & (level > prev)))
+
+        # --- 价格 ---
+        p_now = lb['price']
+        p_1m_ago = lb['price_past'][60]
+        p_3m_ago = lb['price_past'][180]
+        oi_now = lb['oi']
+        oi_delta_5m = oi_now - lb['oi_past'][300]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_1m = np.where(p_1m_ago > 0, (p_now - p_1m_ago) / p_1m_ago, 0.0)
+            pct_3m = np.where(p_3m_ago > 0, (p_now - p_3m_ago) / p_3m_ago, 0.0)
+            oi_pct = np.where(oi_now > 0, np.abs(oi_delta_5m) / oi_now, 0.0)
+
+        is_large_cap = oi_now >= th["oi_small_cap"]
+        p_thresh_1m = np.where(is_large_cap, th["price_large_1m"], th["price_small_1m"])
+        p_thresh_3m = np.where(is_large_cap, th["price_large_3m"], th["price_small_3m"])
+        price_hit = (np.abs(pct_1m) >= p_thresh_1m) | (np.abs(pct_3m) >= p_thresh_3m)
+
+        # --- OI ---
+        oi_hit = np.where(is_large_cap, oi_pct >= th["oi_change_pct"], np.abs(oi_delta_5m) >= th["oi_change_abs"])
+
+        # --- 声明式规则: 每条一个掩码 ---
+        rule_masks = self.rules.evaluate(lb, funding)
+
+        hit = fund_hit | price_hit | oi_hit
+        for mask in rule_masks:
+            hit |= mask
+
+        # 未命中的行: 状态机只需要记录本轮 level / 费率；等级有变化的同步到异常视图
+        quiet = fund_rows[~hit]
+        fs.level[quiet] = level[~hit]
+        fs.last_val[quiet] = funding[~hit]
+        changed = np.flatnonzero(~hit & (level != prev))
+        if len(changed):
+            self._sync_view(store, rows[changed], fund_rows[changed])
+
+        alerts = []
+        hit_idx = np.flatnonzero(hit)
+        if not len(hit_idx): return alerts
+        # 命中行的完整回看: 行多时一次批量取齐，少量时逐行更快 (事件驱动的小批次)
+        if len(hit_idx) >= BATCH_LOOKBACK_MIN_ROWS:
+            hit_lbs = self._row_lookbacks(store.lookback(self._windows, rows=rows[hit_idx]), len(hit_idx))
+        else:
+            hit_lbs = [store.views[rows[j]].get_lookback(self._windows) for j in hit_idx.tolist()]
+        for j, lb_j in zip(hit_idx.tolist(), hit_lbs):
+            symbol = store.symbols[rows[j]]
+            data = store.views[rows[j]]
+            rules_hit = [k for k, mask in enumerate(rule_masks) if mask[j]]
+            alert_type, msg = self._check_symbol(
+                symbol, data, lb_j, float(funding[j]), int(level[j]), now, rules_hit
+            )
+            if msg:
+                alerts.append((symbol, alert_type, msg))
+        return alerts
+
+    def check_dirty(self, store, min_interval, sweep_seconds=None):
+        """
+        事件驱动模式: 只评估有新数据 (store.dirty) 的币种，同一币种至少间隔 min_interval 秒；
+        处于费率回落连报中的币种每轮都评估 (状态机按时间推进)；
+        给了 sweep_seconds 时，超过这么久没评估过的币种也并入本轮 (兜底窗口滑动等时间驱动的变化，
+        按币种错开，不再整池扫描)
+        返回 (alerts, 距下一批可评估的秒数 或 None)
+        """
+        n = len(store)
+        if n == 0: return [], None
+        now = self.clock()
+        if len(self._last_eval) < n:
+            self._last_eval = grow_rows(self._last_eval, n)  # 新币种 last_eval = 0，下一次兜底即评估
+
+        # 候选行只取脏行与费率回落连报中的行，后续都只在这些行上运算 (开销随脏行数走，不随全池)
+        fs = self.fund_states
+        pending = np.flatnonzero(store.dirty[:n])
+        exiting = [store.index[fs.symbols[r]] for r in np.flatnonzero(fs.exit_mode[:len(fs)]).tolist()
+                   if fs.symbols[r] in store.index]
+        if exiting:  # 少见，直接用集合合并
+            pending = np.array(sorted(set(pending.tolist()).union(exiting)), dtype=np.intp)
+        elapsed = now - self._last_eval[pending] + EVAL_SLACK
+        ready = pending[elapsed >= min_interval]
+        # 兜底: 最久未评估的行到期时才做一次全池比较
+        if sweep_seconds is not None and now - self._last_eval[:n].min() + EVAL_SLACK >= sweep_seconds:
+            stale = now - self._last_eval[:n] + EVAL_SLACK >= sweep_seconds
+            stale[ready] = True
+            ready = np.flatnonzero(stale)
+        store.dirty[ready] = False
+        self._last_eval[ready] = now
+        self.evaluated += len(ready)
+
+        # 只取这些行做向量化筛选与回看，只有命中阈值的才逐个处理
+        alerts = self.check_all(store, None if len(ready) == n else ready)  # 全池时走切片，比花式索引快
+
+        waits = []
+        waiting = elapsed[elapsed < min_interval]
+        if len(waiting): waits.append(min_interval - waiting.max())
+        if sweep_seconds is not None:
+            waits.append(sweep_seconds - (now - self._last_eval[:n].min()))
+        return alerts, (float(min(waits)) if waits else None)
+
+    @staticmethod
+    def _row_lookbacks(lb, count):
+        """批量回看结果 -> 每行一个与 get_lookback 同结构的标量 dict"""
+        cols = {k: ({w: a.tolist() for w, a in v.items()} if isinstance(v, dict) else v.tolist())
+                for k, v in lb.items()}
+        return [{k: ({w: a[i] for w, a in v.items()} if isinstance(v, dict) else v[i]) for k, v in cols.items()}
+                for i in range(count)]
+
+    def _sync_fund_rows(self, store):
+        """新增币种时补齐 store 行 -> FundingStates 行 的映射"""
+        known = len(self._fund_rows)
+        if known < len(store):
+            new_rows = [self.fund_states.row(s) for s in store.symbols[known:]]
+            self._fund_rows = np.concatenate([self._fund_rows, np.array(new_rows, dtype=np.int64)])
+        return self._fund_rows[:len(store)]
+
+    def _funding_level(self, abs_fund):
+        """费率等级 0-4 (标量或 ndarray 均可)"""
         thresholds = CONFIG["thresholds"]["funding_levels"]
         crit_thresh = CONFIG["thresholds"]["funding_critical"]
-        
-        if abs_fund >= crit_thresh: current_level = 4
-        elif abs_fund > thresholds[2]: current_level = 3
-        elif abs_fund > thresholds[1]: current_level = 2
-        elif abs_fund > thresholds[0]: current_level = 1
-        
-        if f_state['exit_mode']:
-            if current_level == 4: f_state['exit_mode'] = False
-            else:
-                if f_state['exit_count'] == 1 and (now - f_state['exit_start'] > 60):
-                    f_msg = f"📉 <b>费率回落 (连报 2/3)</b>\n风险解除确认中\n当前: {funding*100:.4f}%"
-                    f_state['exit_count'] = 2
-                elif f_state['exit_count'] == 2 and (now - f_state['exit_start'] > 120):
-                    f_msg = f"📉 <b>费率回落 (连报 3/3)</b>\n已回归常态区间\n当前: {funding*100:.4f}%"
-                    f_state['exit_count'] = 3
-                    f_state['exit_mode'] = False 
+        if isinstance(abs_fund, np.ndarray):
+            level = (abs_fund > thresholds[0]).astype(np.int8)
+            level += abs_fund > thresholds[1]
+            level += abs_fund > thresholds[2]
+            level[abs_fund >= crit_thresh] = 4
+            return level
+        if abs_fund >= crit_thresh: return 4
+        elif abs_fund > thresholds[2]: return 3
+        elif abs_fund > thresholds[1]: return 2
+        elif abs_fund > thresholds[0]: return 1
+        return 0
 
-        if not f_msg:
-            if current_level == 4:
-                if prev_level < 4: f_msg = f"🚨 <b>费率极值 (>=2%)</b>\n进入高危区域！"
-                elif funding != f_state['last_val']: f_msg = f"🚨 <b>费率变动 (>=2%)</b>\n数值改变: {funding*100:.4f}%"
-            elif prev_level == 4 and current_level < 4:
-                f_state['exit_mode'] = True
-                f_state['exit_start'] = now
-                f_state['exit_count'] = 1
-                f_msg = f"📉 <b>费率回落 (连报 1/3)</b>\n脱离高危区 (<2%)\n当前: {funding*100:.4f}%"
-            elif current_level > 0:
-                if current_level > prev_level:
-                    if not f_state['exit_mode']: f_msg = f"⚠️ <b>费率异动 (Lv.{current_level})</b>\n突破 {abs_fund*100:.2f}%"
+    def _check_symbol(self, symbol, data, lb, funding, current_level, now, rules_hit=()):
+        """单币种判断 (check 与 check_all 共用)，lb 为该币种的多窗口回看值，rules_hit 为命中的规则下标"""
+        f_msg = self._step_funding(symbol, funding, current_level, now)
+        self._view_funding(symbol, lb)
+        snapshot_data = None
 
-        f_state['level'] = current_level
-        f_state['last_val'] = funding
-        
-        # --- 价格异动检测 ---
-        p_now, p_1m_ago = data.get_price_delta(60)
-        p_3m_ago = data.get_price_delta(180)[1] 
+        oi_now = lb['oi']
+        oi_delta_5m = oi_now - lb['oi_past'][300]
+        p_now = lb['price']
+        p_1m_ago = lb['price_past'][60]
+        p_3m_ago = lb['price_past'][180]
         pct_1m = (p_now - p_1m_ago) / p_1m_ago if p_1m_ago > 0 else 0
         pct_3m = (p_now - p_3m_ago) / p_3m_ago if p_3m_ago > 0 else 0
         
+        # --- 价格异动检测 ---
         is_large_cap = oi_now >= CONFIG["thresholds"]["oi_small_cap"]
         p_thresh_1m = CONFIG["thresholds"]["price_large_1m"] if is_large_cap else CONFIG["thresholds"]["price_small_1m"]
         p_thresh_3m = CONFIG["thresholds"]["price_large_3m"] if is_large_cap else CONFIG["thresholds"]["price_small_3m"]
@@ -90,21 +273,20 @@ class StrategyEngine:
         price_tag = None
         
         if abs(pct_1m) >= p_thresh_1m:
-            if self._check_cooldown(f"{symbol}_PRICE_1M", 60):
+            if self._check_cooldown((symbol, "PRICE_1M"), 60):
                 emoji = "🚀" if pct_1m > 0 else "🩸"
                 price_msg = f"{emoji} <b>极速异动 (1m)</b>\n幅度: {pct_1m*100:+.2f}%"
                 price_tag = "🚀 1m极速" if pct_1m > 0 else "🩸 1m极速"
         elif abs(pct_3m) >= p_thresh_3m:
-            if self._check_cooldown(f"{symbol}_PRICE_3M", 60):
+            if self._check_cooldown((symbol, "PRICE_3M"), 60):
                 emoji = "📈" if pct_3m > 0 else "📉"
                 price_msg = f"{emoji} <b>趋势异动 (3m)</b>\n幅度: {pct_3m*100:+.2f}%"
                 price_tag = "📈 3m趋势" if pct_3m > 0 else "📉 3m趋势"
 
         # [新增] 如果触发价格异动，存入缓存
         if price_tag:
-            self.event_cache[f"{symbol}_PRICE"] = {
-                "ts": now, "tag": price_tag, "data": snapshot_data
-            }
+            snapshot_data = self._snapshot(symbol, lb, funding)
+            self.view.add_event(symbol, "PRICE", now, price_tag, snapshot_data)
 
         # --- OI 异动检测 ---
         oi_triggered = False
@@ -115,95 +297,139 @@ class StrategyEngine:
             if abs(oi_delta_5m) >= CONFIG["thresholds"]["oi_change_abs"]: oi_triggered = True
 
         oi_msg = None
-        if oi_triggered and self._check_cooldown(f"{symbol}_OI", CONFIG["cooldown_seconds"]):
+        if oi_triggered and self._check_cooldown((symbol, "OI"), CONFIG["cooldown_seconds"]):
             direction = "📈 OI 激增" if oi_delta_5m > 0 else "📉 OI 骤降"
             oi_msg = f"<b>{direction}</b>"
             # [新增] 存入缓存
-            self.event_cache[f"{symbol}_OI"] = {
-                "ts": now, "tag": direction, "data": snapshot_data
-            }
-
-        # 优先级返回消息 (Funding > Price > OI)
-        if f_msg: return "FUNDING", self._fmt_msg(symbol, f_msg, data, oi_now)
-        if price_msg: return "PRICE", self._fmt_msg(symbol, price_msg, data, oi_now)
-        if oi_msg: return "OI", self._fmt_msg(symbol, oi_msg, data, oi_now)
+            self.view.add_event(symbol, "OI", now, direction, snapshot_data or self._snapshot(symbol, lb, funding))
+
+        # 优先级返回消息 (Funding > Price > 规则 > OI)
+        if f_msg: return "FUNDING", self._fmt_msg(symbol, f_msg, data, lb)
+        if price_msg: return "PRICE", self._fmt_msg(symbol, price_msg, data, lb)
+
+        # --- 声明式规则: 按配置顺序取第一条过了冷却的 (只有真正推送的规则才占用冷却) ---
+        for k in rules_hit:
+            rule = self.rules.rules[k]
+            if self._check_cooldown((symbol, rule.name), rule.cooldown):
+                self.view.add_event(symbol, rule.name, now, rule.tag, snapshot_data or self._snapshot(symbol, lb, funding))
+                return rule.name, self._fmt_msg(symbol, rule.title, data, lb)
+
+        if oi_msg: return "OI", self._fmt_msg(symbol, oi_msg, data, lb)
         
         return None, None
 
-    def get_abnormal_list(self, data_store):
+    def _step_funding(self, symbol, funding, current_level, now):
+        """资金费率分级 + 退出(连报 3 次)状态机，返回需要推送的文案或 None"""
+        fs = self.fund_states
+        row = fs.row(symbol)
+        abs_fund = abs(funding)
+        prev_level = fs.level[row]
+        f_msg = None
+        
+        if fs.exit_mode[row]:
+            if current_level == 4: fs.exit_mode[row] = False
+            else:
+                if fs.exit_count[row] == 1 and (now - fs.exit_start[row] > 60):
+                    f_msg = f"📉 <b>费率回落 (连报 2/3)</b>\n风险解除确认中\n当前: {funding*100:.4f}%"
+                    fs.exit_count[row] = 2
+                elif fs.exit_count[row] == 2 and (now - fs.exit_start[row] > 120):
+                    f_msg = f"📉 <b>费率回落 (连报 3/3)</b>\n已回归常态区间\n当前: {funding*100:.4f}%"
+                    fs.exit_count[row] = 3
+                    fs.exit_mode[row] = False 
+
+        if not f_msg:
+            if current_level == 4:
+                if prev_level < 4: f_msg = f"🚨 <b>费率极值 (>=2%)</b>\n进入高危区域！"
+                elif funding != fs.last_val[row]: f_msg = f"🚨 <b>费率变动 (>=2%)</b>\n数值改变: {funding*100:.4f}%"
+            elif prev_level == 4 and current_level < 4:
+                fs.exit_mode[row] = True
+                fs.exit_start[row] = now
+                fs.exit_count[row] = 1
+                f_msg = f"📉 <b>费率回落 (连报 1/3)</b>\n脱离高危区 (<2%)\n当前: {funding*100:.4f}%"
+            elif current_level > 0:
+                if current_level > prev_level:
+                    if not fs.exit_mode[row]: f_msg = f"⚠️ <b>费率异动 (Lv.{current_level})</b>\n突破 {abs_fund*100:.2f}%"
+
+        fs.level[row] = current_level
+        fs.last_val[row] = funding
+        return f_msg
+
+    def _snapshot(self, symbol, lb, funding):
+        """基础数据快照 (用于事件缓存)"""
+        return {
+            "symbol": symbol,
+            "price_now": lb['price'],
+            "price_past": lb['price_past'][300],
+            "oi_now": lb['oi'],
+            "oi_delta": lb['oi'] - lb['oi_past'][300],
+            "rate": funding,
+            "fund_delta": lb['funding'] - lb['funding_past'][300],
+            "cvd_total": lb['cvd'][1800],
+            "cvd_5m": lb['cvd'][300],
+            "level": 0, # 默认为0
+            "tags": []  # 存储标签: [价格异动], [OI异动]
+        }
+
+    def get_abnormal_list(self, data_store=None):
         """
-        获取异常列表：合并 实时费率异常 + 近期(5min内)价格/OI异动
+        获取异常列表：合并 实时费率异常 + 近期(5min内)价格/OI/规则异动
+        直接读物化视图 (由 check / check_all 增量维护)；费率异常币种的数值在读取时按 refresh_seconds 刷新
         """
-        now = time.time()
-        # 使用字典按 symbol 去重，同一币种合并显示
-        merged_data = {}
-
-        # 1. 扫描实时 Funding 状态
-        for symbol, state in self.fund_states.items():
-            level = state.get('level', 0)
-            if level > 0:
-                if symbol in data_store:
-                    data = data_store[symbol]
-                    oi_delta, oi_now, _ = data.get_oi_delta(300)
-                    entry = {
-                        'symbol': symbol,
-                        'level': level,
-                        'rate': state.get('last_val', 0.0),
-                        'fund_delta': data.get_funding_delta(300),
-                        'oi_now': oi_now,
-                        'oi_delta': oi_delta,
-                        'cvd_total': data.get_cvd_sum(1800),
-                        'cvd_5m': data.get_cvd_sum(300),
-                        'price_now': data.get_price_delta(300)[0],
-                        'price_past': data.get_price_delta(300)[1],
-                        'tags': [],
-                        'event_ts': 0 # 费率是持续状态，无特定触发时间
-                    }
-                    merged_data[symbol] = entry
-
-        # 2. 扫描短期缓存 (Price/OI 异动)
-        expired_keys = []
-        for key, event in self.event_cache.items():
-            # 5分钟 (300s) 后过期
-            if now - event['ts'] > 300:
-                expired_keys.append(key)
-                continue
-            
-            symbol = key.split('_')[0]
-            tag = event['tag']
-            
-            # 如果该币已经在列表中 (因为费率异常)，则追加标签
-            if symbol in merged_data:
-                if tag not in merged_data[symbol]['tags']:
-                    merged_data[symbol]['tags'].append(tag)
-                    # 更新时间戳为最新的事件时间
-                    if event['ts'] > merged_data[symbol]['event_ts']:
-                        merged_data[symbol]['event_ts'] = event['ts']
-            else:
-                # 如果不在，则使用快照数据创建新条目
-                entry = event['data'].copy() # 浅拷贝快照
-                entry['tags'] = [tag]
-                entry['event_ts'] = event['ts']
-                merged_data[symbol] = entry
-
-        # 清理过期缓存
-        for k in expired_keys:
-            del self.event_cache[k]
-
-        # 转为列表并排序
-        # 排序优先级: 有事件发生(时间倒序) > 费率等级(高到低)
-        result_list = list(merged_data.values())
-        result_list.sort(key=lambda x: (x['event_ts'], abs(x['rate'])), reverse=True)
-        
-        return result_list
+        now = self.clock()
+        if data_store is not None and now - self._view_refresh >= CONFIG["abnormal_view"]["refresh_seconds"]:
+            self._view_refresh = now
+            self.refresh_view(data_store)
+        return self.view.items(now)
+
+    def refresh_view(self, store):
+        """全部费率异常币种重取一次 OI/CVD/价格 (读取时触发，不在判断热路径上)"""
+        fs = self.fund_states
+        symbols = [s for s in self.view.funding if s in store.index]
+        if not symbols: return
+        self._sync_view(store, np.array([store.index[s] for s in symbols], dtype=np.int64),
+                        np.array([fs.index[s] for s in symbols], dtype=np.int64))
+
+    def _funding_record(self, symbol, row, get):
+        """费率异常条目，get(name) 取该币种的回看值"""
+        fs = self.fund_states
+        return {
+            'symbol': symbol,
+            'level': int(fs.level[row]),
+            'rate': float(fs.last_val[row]),
+            'fund_delta': get('funding') - get('funding_past', 300),
+            'oi_now': get('oi'),
+            'oi_delta': get('oi') - get('oi_past', 300),
+            'cvd_total': get('cvd', 1800),
+            'cvd_5m': get('cvd', 300),
+            'price_now': get('price'),
+            'price_past': get('price_past', 300),
+        }
+
+    def _view_funding(self, symbol, lb):
+        """逐币种路径: 状态机推进后用手头的回看值更新该币种的费率条目"""
+        row = self.fund_states.index[symbol]
+        if self.fund_states.level[row] > 0:
+            get = lambda name, w=None: float(lb[name] if w is None else lb[name][w])
+            self.view.set_funding(symbol, self._funding_record(symbol, row, get))
+        else:
+            self.view.clear_funding(symbol)
+
+    def _sync_view(self, store, store_rows, fund_rows):
+        """批量写入视图: level 回落到 0 的移出，其余按一次批量回看更新费率条目"""
+        fs = self.fund_states
+        view = self.view
+        active = fs.level[fund_rows] > 0
+        for row in fund_rows[~active].tolist():
+            view.clear_funding(fs.symbols[row])
+        if not active.any(): return
+        fund_rows = fund_rows[active]
+        lb = store.lookback((300, 1800), rows=store_rows[active])
+        for i, row in enumerate(fund_rows.tolist()):
+            get = lambda name, w=None: float(lb[name][i] if w is None else lb[name][w][i])
+            view.set_funding(fs.symbols[row], self._funding_record(fs.symbols[row], row, get))
 
     def _check_cooldown(self, key, seconds):
-        now = time.time()
-        last = self.cooldowns.get(key, 0)
-        if now - last > seconds:
-            self.cooldowns[key] = now
-            return True
-        return False
+        return self.cooldowns.check_cooldown(key, seconds)
 
     def _format_volume(self, value):
         abs_val = abs(value)
@@ -212,14 +438,13 @@ class StrategyEngine:
         elif abs_val >= 1_000: return f"{sign}{abs_val/1_000:.0f}K"
         else: return f"{sign}{abs_val:.0f}"
 
-    def _fmt_msg(self, symbol, title_line, data, oi_now):
+    def _fmt_msg(self, symbol, title_line, data, lb):
+        oi_now = lb['oi']
         rows = []
         for window in [300, 600, 900]:
             label = f"{int(window/60):02d}m" 
-            cvd_val = data.get_cvd_sum(window)
-            cvd_str = self._format_volume(cvd_val)
-            oi_d, _, _ = data.get_oi_delta(window)
-            oi_str = self._format_volume(oi_d)
+            cvd_str = self._format_volume(lb['cvd'][window])
+            oi_str = self._format_volume(oi_now - lb['oi_past'][window])
             rows.append(f"{label} {cvd_str:>7} {oi_str:>7}")
         matrix_str = "\n".join(rows)
         return f"""[{symbol}] {title_line}
@@ -232,4 +457,4 @@ class StrategyEngine:
 ⏱窗口   CVD(U)   OI变化
 {matrix_str}
 </pre>
-⏱ {datetime.now().strftime('%H:%M:%S')}"""
+⏱ {datetime.fromtimestamp(self.clock()).strftime('%H:%M:%S')}"""
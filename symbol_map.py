@@ -0,0 +1,78 @@
+# symbol_map.py
+"""
+跨交易所币种映射索引 (价差监控用)
+- 币种名 -> 整数 id，只增不减；Binance 合约行号 -> 币种 id 随 MarketStore 新增行增量补齐
+- 每个交易所从已加载的 markets 一次性建出 (币种 id, 行情 symbol):
+  现货取 USDT 计价 (Upbit 取 KRW 计价)，合约取 USDT 结算的线性永续；markets 对象换了才重建
+每轮价差检查按整数 id 直接连接，不再为每个币种拼候选 symbol 字符串逐个试。
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeMap:
+    """单个交易所 (现货或合约) 的映射，按币种 id 排序"""
+    __slots__ = ("name", "quote", "markets", "coin_ids", "symbols", "by_coin")
+
+    def __init__(self, name, quote, markets, picked):
+        self.name = name
+        self.quote = quote
+        self.markets = markets        # 建索引时的 markets 对象 (用于判断是否已重新加载)
+        self.by_coin = picked         # 币种 id -> 行情 symbol
+        ids = sorted(picked)
+        self.coin_ids = np.array(ids, dtype=np.int64)
+        self.symbols = [picked[c] for c in ids]
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+class SymbolMap:
+    def __init__(self):
+        self.coins = {}        # 币种 -> id
+        self.names = []        # id -> 币种
+        self._row_ids = np.empty(0, dtype=np.int64)
+        self.exchanges = {}    # 交易所名 -> ExchangeMap
+        self.rebuilds = 0
+
+    def coin_id(self, coin):
+        cid = self.coins.get(coin)
+        if cid is None:
+            cid = self.coins[coin] = len(self.names)
+            self.names.append(coin)
+        return cid
+
+    def binance_ids(self, symbols):
+        """MarketStore 行号 -> 币种 id (BTCUSDT -> BTC)"""
+        n = len(self._row_ids)
+        if len(symbols) > n:
+            fresh = [self.coin_id(s[:-4] if s.endswith("USDT") else s) for s in symbols[n:]]
+            self._row_ids = np.concatenate((self._row_ids, np.array(fresh, dtype=np.int64)))
+        return self._row_ids[:len(symbols)]
+
+    def exchange(self, name, exchange, market_type):
+        """取交易所映射；markets 尚未加载返回 None"""
+        markets = exchange.markets
+        cached = self.exchanges.get(name)
+        if cached is not None and cached.markets is markets:
+            return cached
+        if not markets:
+            return None
+        quote = "KRW" if name.startswith("upbit") else "USDT"
+        picked = {}
+        for m in markets.values():
+            if m.get('active') is False or m.get('quote') != quote:
+                continue
+            if market_type == 'swap':
+                if not (m.get('swap') and m.get('linear') and m.get('settle') == quote):
+                    continue
+            elif not m.get('spot'):
+                continue
+            picked.setdefault(self.coin_id(m['base']), m['symbol'])
+        emap = self.exchanges[name] = ExchangeMap(name, quote, markets, picked)
+        self.rebuilds += 1
+        logger.info(f"价差映射: {name} {len(emap)} 个 {quote} 交易对 (markets 共 {len(markets)})")
+        return emap
@@ -1,6 +1,5 @@
 # telegram_commander.py
 import asyncio
-import aiohttp
 import logging
 import json
 from config import CONFIG
@@ -9,7 +8,8 @@ logger = logging.getLogger(__name__)
 
 class TelegramCommander:
     """监听 TG 消息并执行指令"""
-    def __init__(self, onchain_monitor_ref):
+    def __init__(self, onchain_monitor_ref, http_client):
+        self.http = http_client
         self.token = CONFIG['telegram']['bot_token']
         self.allowed_chat_id = CONFIG['telegram']['chat_id'] # 只允许管理员操作
         self.proxy = CONFIG['proxy'] or None
@@ -38,11 +38,10 @@ class TelegramCommander:
     async def _get_updates(self, offset):
         url = f"https://api.telegram.org/bot{self.token}/getUpdates"
         params = {"offset": offset, "timeout": 10}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params, proxy=self.proxy) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return data.get('result', [])
+        async with self.http.get(url, params=params, proxy=self.proxy) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                return data.get('result', [])
         return []
 
     async def _handle_message(self, msg):
@@ -110,5 +109,5 @@ class TelegramCommander:
     async def _reply(self, chat_id, text):
         url = f"https://api.telegram.org/bot{self.token}/sendMessage"
         payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
-        async with aiohttp.ClientSession() as session:
-            await session.post(url, json=payload, proxy=self.proxy)
+        async with self.http.post(url, json=payload, proxy=self.proxy):
+            pass  # 退出上下文即释放连接回池
@@ -0,0 +1,254 @@
+# tick_journal.py
+"""
+aggTrade 逐笔成交日志 (追加写、内存映射、按小时分段)
+
+每条记录定长 (symbol id, 成交 id, 事件时间 ms, 价格, 数量, 主动卖标记)，
+写入端先进小缓冲，满了或定时刷进当前小时段文件的 mmap；
+读取端按时间范围返回 NumPy 结构化数组 (直接映射文件，不拷贝)。
+用于漏报后复盘，不需要数据库。
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype([
+    ("sym", "<u4"),       # symbol id (见 symbols.json)
+    ("trade_id", "<i8"),  # aggTrade id
+    ("ts", "<i8"),        # 事件时间 (ms)
+    ("price", "<f8"),
+    ("qty", "<f8"),
+    ("maker", "u1"),      # 1 = 买方是 maker (主动卖)
+])
+
+BUFFER_CODES = ("I", "q", "q", "d", "d", "B")  # 与 RECORD_DTYPE 字段一一对应
+
+HOUR_MS = 3_600_000
+MAGIC = b"AGGTICK1"
+HEADER = struct.Struct("<8sIQ")   # magic, record size, record count
+HEADER_SIZE = 64
+
+
+def _segment_hour(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime("%Y%m%d%H")
+
+
+class _Segment:
+    """单个小时段文件: 预分配 (稀疏) 后整体 mmap，头部记录已写条数"""
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        exists = os.path.exists(path)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        if exists:
+            with open(path, "rb") as f:
+                magic, rec_size, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or rec_size != RECORD_DTYPE.itemsize:
+                os.close(self.fd)
+                raise ValueError(f"不是有效的 tick 日志段: {path}")
+            self.count = count
+        else:
+            self.count = 0
+        os.ftruncate(self.fd, HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self.mm = mmap.mmap(self.fd, 0)
+        self.records = np.frombuffer(self.mm, dtype=RECORD_DTYPE, count=capacity, offset=HEADER_SIZE)
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self.mm, 0, MAGIC, RECORD_DTYPE.itemsize, self.count)
+
+    def free(self):
+        return self.capacity - self.count
+
+    def write(self, arr):
+        self.records[self.count:self.count + len(arr)] = arr
+        self.count += len(arr)
+        self._write_header()
+
+    def close(self):
+        """截掉未使用的预分配部分"""
+        self.records = None
+        self.mm.flush()
+        self.mm.close()
+        os.ftruncate(self.fd, HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        os.close(self.fd)
+
+
+class TickRecorder:
+    """写入端: append() 只做列表追加，flush() 批量写入当前段"""
+    def __init__(self, directory=None):
+        cfg = CONFIG["journal"]
+        self.dir = directory or cfg["dir"]
+        self.segment_records = cfg["segment_records"]
+        self.buffer_records = cfg["buffer_records"]
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.symbol_ids = _load_symbols(self.dir)
+        self.buffer = self._new_buffer()
+        self.segment = None
+        self.segment_key = None   # (小时, 序号)
+        self.written = 0
+
+    def sym_id(self, symbol):
+        sid = self.symbol_ids.get(symbol)
+        if sid is None:
+            sid = self.symbol_ids[symbol] = len(self.symbol_ids)
+            _save_symbols(self.dir, self.symbol_ids)
+        return sid
+
+    @staticmethod
+    def _new_buffer():
+        """按列缓冲 (typed array 追加比逐条构造结构化记录快得多)"""
+        return [array(code) for code in BUFFER_CODES]
+
+    def append(self, symbol, trade_id, event_ms, price, qty, is_buyer_maker):
+        sym, tid, ts, p, q, m = self.buffer
+        sym.append(self.sym_id(symbol))
+        tid.append(trade_id)
+        ts.append(event_ms)
+        p.append(price)
+        q.append(qty)
+        m.append(is_buyer_maker)
+        if len(ts) >= self.buffer_records:
+            self.flush()
+
+    def flush(self):
+        columns = self.buffer
+        if not columns[0]: return
+        self.buffer = self._new_buffer()
+        arr = np.empty(len(columns[0]), dtype=RECORD_DTYPE)
+        for name, col in zip(RECORD_DTYPE.names, columns):
+            arr[name] = np.frombuffer(col, dtype=col.typecode)
+        hours = arr["ts"] // HOUR_MS
+        if (hours == hours[0]).all():
+            self._write(_segment_hour(arr["ts"][0]), arr)
+        else:
+            # 缓冲内跨整点，按小时拆开写
+            for h in np.unique(hours):
+                self._write(_segment_hour(int(h) * HOUR_MS), arr[hours == h])
+        self.written += len(arr)
+
+    def _write(self, hour, arr):
+        while len(arr):
+            if self.segment is None or self.segment_key[0] != hour or not self.segment.free():
+                self._open_segment(hour)
+            n = min(len(arr), self.segment.free())
+            self.segment.write(arr[:n])
+            arr = arr[n:]
+
+    def _open_segment(self, hour):
+        seq = 0
+        if self.segment is not None:
+            if self.segment_key[0] == hour:
+                seq = self.segment_key[1] + 1   # 同一小时写满，开下一个序号
+            self.segment.close()
+        while True:
+            path = os.path.join(self.dir, _segment_name(hour, seq))
+            if not os.path.exists(path) or _segment_count(path) < self.segment_records:
+                break
+            seq += 1
+        self.segment = _Segment(path, self.segment_records)
+        self.segment_key = (hour, seq)
+
+    def close(self):
+        self.flush()
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+    async def run_flusher(self):
+        """定时刷缓冲，低流量时也能及时落到 mmap"""
+        interval = CONFIG["journal"]["flush_interval"]
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Tick 日志写入失败: {e}")
+        except asyncio.CancelledError:
+            self.close()
+            raise
+
+
+class TickReader:
+    """读取端: 按时间范围逐段返回结构化数组 (np.memmap，不拷贝)"""
+    def __init__(self, directory=None):
+        self.dir = directory or CONFIG["journal"]["dir"]
+        self.symbol_ids = _load_symbols(self.dir)
+        self.symbols = {sid: s for s, sid in self.symbol_ids.items()}
+
+    def segments(self):
+        # 按 (小时, 序号) 排序: 按字符串排 HH_10 会排在 HH_2 前面
+        names = sorted((n for n in os.listdir(self.dir) if n.endswith(".ticks")), key=_segment_key)
+        return [os.path.join(self.dir, n) for n in names]
+
+    def iter_range(self, start_ms, end_ms):
+        """
+        依次产出 [start_ms, end_ms) 内的记录
+        记录按到达顺序写入，事件时间在段内并不严格有序，按掩码筛选 (整段都在范围内时直接返回只读视图)
+        """
+        first_hour, last_hour = _segment_hour(start_ms), _segment_hour(end_ms)
+        for path in self.segments():
+            hour = os.path.basename(path)[:10]
+            if hour < first_hour or hour > last_hour:
+                continue
+            count = _segment_count(path)
+            if not count:
+                continue
+            records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+            ts = records["ts"]
+            mask = (ts >= start_ms) & (ts < end_ms)
+            if mask.all():
+                yield records
+            elif mask.any():
+                yield records[mask]
+
+    def read_range(self, start_ms, end_ms, symbol=None):
+        """合并为一个数组 (会拷贝)，可按 symbol 过滤"""
+        parts = list(self.iter_range(start_ms, end_ms))
+        if not parts:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        arr = np.concatenate(parts)
+        if symbol is not None:
+            if symbol not in self.symbol_ids:
+                return arr[:0]
+            arr = arr[arr["sym"] == self.symbol_ids[symbol]]
+        return arr
+
+
+def _segment_name(hour, seq):
+    return f"{hour}.ticks" if seq == 0 else f"{hour}_{seq}.ticks"
+
+
+def _segment_key(name):
+    """_segment_name 的逆: 文件名 -> (hour, seq)"""
+    hour, _, seq = name[:-len(".ticks")].partition("_")
+    return hour, int(seq or 0)
+
+
+def _segment_count(path):
+    with open(path, "rb") as f:
+        magic, _, count = HEADER.unpack(f.read(HEADER.size))
+    return count if magic == MAGIC else 0
+
+
+def _load_symbols(directory):
+    path = os.path.join(directory, "symbols.json")
+    if not os.path.exists(path): return {}
+    with open(path, "r") as f: return json.load(f)
+
+
+def _save_symbols(directory, symbol_ids):
+    path = os.path.join(directory, "symbols.json")
+    with open(path + ".tmp", "w") as f: json.dump(symbol_ids, f)
+    os.replace(path + ".tmp", path)
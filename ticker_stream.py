@@ -0,0 +1,252 @@
+# ticker_stream.py
+"""
+各所公共 WS 行情推送 (价差监控流式模式, CONFIG["spread_stream"])
+每个交易所一条连接，订阅 symbol_map 里已映射的交易对，推送到的最新价写进内存报价表
+(与 ccxt fetch_tickers 返回同形: symbol -> {"last": 价格})；有变化即回调通知价差重算。
+断流 (超过 stale_seconds 无推送) 的交易所由价差监控回退到 REST 轮询，与 MarkPriceShard 的回退方式一致。
+地址可在 CONFIG["spread_stream"]["urls"] 覆盖 (指向本地假服务器做联调/基准)。
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+
+import aiohttp
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items, n):
+    return [items[i:i + n] for i in range(0, len(items), n)]
+
+
+class _Venue:
+    """单个交易所的协议: 地址 / 订阅消息 / 推送解析 -> [(交易所 market id, 价格)]"""
+    url = None
+    ping = None        # 应用层心跳 (OKX/Bitget/Bybit 不认 WS 协议层 ping)
+    batch = 50         # 单条订阅消息的交易对数
+
+    def __init__(self, swap):
+        self.swap = swap
+
+    def subscribe(self, ids):
+        return []
+
+    def parse(self, msg):
+        return ()
+
+
+class _BinanceSpot(_Venue):
+    url = "wss://stream.binance.com:9443/ws/!miniTicker@arr"   # 全市场推送，无需订阅
+
+    def parse(self, msg):
+        if isinstance(msg, list):
+            return [(t["s"], t["c"]) for t in msg]
+        return ()
+
+
+class _OKX(_Venue):
+    url = "wss://ws.okx.com:8443/ws/v5/public"
+    ping = "ping"
+    batch = 100
+
+    def subscribe(self, ids):
+        return [{"op": "subscribe", "args": [{"channel": "tickers", "instId": i} for i in part]}
+                for part in _chunks(ids, self.batch)]
+
+    def parse(self, msg):
+        if isinstance(msg, dict) and "data" in msg:
+            return [(t["instId"], t.get("last")) for t in msg["data"]]
+        return ()
+
+
+class _Bybit(_Venue):
+    ping = '{"op":"ping"}'
+    batch = 10         # 现货单条订阅上限 10 个
+
+    @property
+    def url(self):
+        return f"wss://stream.bybit.com/v5/public/{'linear' if self.swap else 'spot'}"
+
+    def subscribe(self, ids):
+        return [{"op": "subscribe", "args": [f"tickers.{i}" for i in part]} for part in _chunks(ids, self.batch)]
+
+    def parse(self, msg):
+        if isinstance(msg, dict) and msg.get("topic", "").startswith("tickers."):
+            data = msg["data"]
+            return [(data.get("symbol"), data.get("lastPrice"))]  # 合约 delta 推送可能不带 lastPrice
+        return ()
+
+
+class _Bitget(_Venue):
+    url = "wss://ws.bitget.com/v2/ws/public"
+    ping = "ping"
+
+    def subscribe(self, ids):
+        inst_type = "USDT-FUTURES" if self.swap else "SPOT"
+        return [{"op": "subscribe", "args": [{"instType": inst_type, "channel": "ticker", "instId": i} for i in part]}
+                for part in _chunks(ids, self.batch)]
+
+    def parse(self, msg):
+        if isinstance(msg, dict) and "data" in msg:
+            return [(t["instId"], t.get("lastPr")) for t in msg["data"]]
+        return ()
+
+
+class _Gate(_Venue):
+    batch = 100
+
+    @property
+    def url(self):
+        return "wss://fx-ws.gateio.ws/v4/ws/usdt" if self.swap else "wss://api.gateio.ws/ws/v4/"
+
+    def subscribe(self, ids):
+        channel = "futures.tickers" if self.swap else "spot.tickers"
+        return [{"time": int(time.time()), "channel": channel, "event": "subscribe", "payload": part}
+                for part in _chunks(ids, self.batch)]
+
+    def parse(self, msg):
+        if isinstance(msg, dict) and msg.get("event") == "update":
+            result = msg["result"]
+            items = result if isinstance(result, list) else [result]
+            return [(r.get("contract") or r.get("currency_pair"), r.get("last")) for r in items]
+        return ()
+
+
+class _Upbit(_Venue):
+    url = "wss://api.upbit.com/websocket/v1"
+
+    def subscribe(self, ids):
+        return [[{"ticket": "perp-spread"}, {"type": "ticker", "codes": ids}]]
+
+    def parse(self, msg):
+        if isinstance(msg, dict) and msg.get("type") == "ticker":
+            return [(msg["code"], msg.get("trade_price"))]
+        return ()
+
+
+VENUES = {"binance": _BinanceSpot, "okx": _OKX, "bybit": _Bybit, "bitget": _Bitget, "gate": _Gate, "upbit": _Upbit}
+
+
+def venue_for(name, market_type):
+    """交易所名 (如 okx_swap) -> 协议对象；不支持流式的返回 None (只走 REST)"""
+    cls = VENUES.get(name.split("_")[0])
+    if cls is None or (cls is _BinanceSpot and market_type != "spot"):
+        return None
+    return cls(market_type == "swap")
+
+
+class TickerStream:
+    """单个交易所的行情推送连接: 订阅、收包写报价表、断线退避重连"""
+    def __init__(self, name, venue, on_update, proxy=None):
+        self.name = name
+        self.venue = venue
+        self.on_update = on_update     # 回调: 报价表有变化
+        self.proxy = proxy
+        self.ids = {}                  # 交易所 market id -> 统一 symbol
+        self.tickers = {}              # 统一 symbol -> {"last": 价格, "ts": 收到时间}
+        self.ws = None
+        self.messages = 0
+        self.updates = 0
+        self.reconnects = 0
+        self.connected_at = None
+        self.last_message = 0.0
+
+    @property
+    def url(self):
+        return CONFIG["spread_stream"]["urls"].get(self.name) or self.venue.url
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    def fresh(self, max_age):
+        return self.connected and time.time() - self.last_message <= max_age
+
+    def set_markets(self, emap, markets):
+        """按映射 (symbol_map.ExchangeMap) 设置订阅列表；变化时断开重连以重新订阅"""
+        ids = {markets[s]["id"]: s for s in emap.symbols if s in markets}
+        if ids == self.ids: return
+        self.ids = ids
+        keep = set(ids.values())
+        self.tickers = {s: t for s, t in self.tickers.items() if s in keep}
+        if self.connected:
+            asyncio.ensure_future(self.ws.close())
+
+    def handle(self, data):
+        try:
+            msg = json.loads(data)
+        except ValueError:
+            return  # pong 等非 JSON 回包
+        now = time.time()
+        ids, tickers = self.ids, self.tickers
+        changed = False
+        for mid, price in self.venue.parse(msg):
+            sym = ids.get(mid)
+            if sym is None or not price: continue
+            tickers[sym] = {"last": float(price), "ts": now}
+            changed = True
+        if changed:
+            self.updates += 1
+            self.on_update(self.name, now)
+
+    async def _pinger(self, ws):
+        while True:
+            await asyncio.sleep(20)
+            await ws.send_str(self.venue.ping)
+
+    def stats(self):
+        return {
+            "venue": self.name,
+            "symbols": len(self.ids),
+            "quoted": len(self.tickers),
+            "connected": self.connected,
+            "messages": self.messages,
+            "updates": self.updates,
+            "reconnects": self.reconnects,
+            "last_message_age": time.time() - self.last_message if self.last_message else None,
+        }
+
+    async def run(self):
+        cfg = CONFIG["ws"]
+        backoff = cfg["backoff_initial"]
+        while True:
+            pinger = None
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, proxy=self.proxy, heartbeat=cfg["heartbeat"]) as ws:
+                        self.ws = ws
+                        self.connected_at = time.time()
+                        for payload in self.venue.subscribe(list(self.ids)):
+                            await ws.send_json(payload)
+                            await asyncio.sleep(0.05)
+                        if self.venue.ping:
+                            pinger = asyncio.create_task(self._pinger(ws))
+                        logger.info(f"价差行情推送 {self.name} 已连接 ({len(self.ids)} 交易对)")
+
+                        async for msg in ws:
+                            if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):  # Upbit 推二进制 JSON
+                                self.messages += 1
+                                self.last_message = time.time()
+                                self.handle(msg.data)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                error = "连接关闭"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                if pinger: pinger.cancel()
+
+            if self.connected_at and time.time() - self.connected_at > cfg["stable_seconds"]:
+                backoff = cfg["backoff_initial"]
+            self.ws = None
+            self.connected_at = None
+            self.reconnects += 1
+            delay = backoff * random.uniform(0.8, 1.2)
+            logger.warning(f"价差行情推送 {self.name} 重连 ({delay:.1f}s 后, 期间回退 REST): {error}")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, cfg["backoff_max"])
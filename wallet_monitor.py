@@ -1,7 +1,6 @@
 # wallet_monitor.py
 import asyncio
 import logging
-import ccxt.async_support as ccxt
 import time
 from collections import deque
 from config import CONFIG
@@ -9,10 +8,10 @@ from config import CONFIG
 logger = logging.getLogger(__name__)
 
 class WalletMonitor:
-    def __init__(self, notifier_ref, data_store_ref):
+    def __init__(self, notifier_ref, data_store_ref, exchange_hub):
         self.notifier = notifier_ref
         self.data_store = data_store_ref 
-        self.proxy_url = CONFIG['proxy'] or None
+        self.hub = exchange_hub
         
         self.last_status = {}
         self.is_initialized = False
@@ -20,27 +19,7 @@ class WalletMonitor:
         # [新增] 历史记录 (供 Web UI 使用)
         self.history = deque(maxlen=50)
         
-        self.exchanges = {}
-        self._init_exchanges()
-
-    def _init_exchanges(self):
-        common_config = {
-            'timeout': 30000, 
-            'enableRateLimit': True,
-            'proxies': {
-                'http': self.proxy_url,
-                'https': self.proxy_url,
-            }
-        }
-        
-        target_list = ['binance', 'okx', 'bybit', 'bitget', 'gate']
-        
-        for name in target_list:
-            try:
-                exchange_class = getattr(ccxt, name)
-                self.exchanges[name] = exchange_class(common_config)
-            except Exception as e:
-                logger.error(f"充提监控: 初始化 {name} 失败: {e}")
+        self.exchanges = ['binance', 'okx', 'bybit', 'bitget', 'gate']  # 共享 ccxt 现货实例
 
     async def start(self):
         logger.info("启动交易所充提状态监控 (Wallet Status)...")
@@ -57,10 +36,6 @@ class WalletMonitor:
             
             await asyncio.sleep(300)
 
-    async def _close_exchanges(self):
-        for ex in self.exchanges.values():
-            await ex.close()
-
     async def _check_wallet_status(self):
         # 1. 确定监控目标名单
         target_coins = {'USDT', 'USDC', 'BTC', 'ETH'}
@@ -71,9 +46,9 @@ class WalletMonitor:
         # 2. 并发查询各交易所
         tasks = []
         ex_names = []
-        for name, ex in self.exchanges.items():
+        for name in self.exchanges:
             ex_names.append(name)
-            tasks.append(self._fetch_currencies_safe(name, ex))
+            tasks.append(self._fetch_currencies_safe(name))
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
@@ -113,11 +88,9 @@ class WalletMonitor:
                 
                 self.last_status[cache_key] = current_state
 
-    async def _fetch_currencies_safe(self, name, exchange):
+    async def _fetch_currencies_safe(self, name):
         try:
-            if exchange.has['fetchCurrencies']:
-                return await exchange.fetch_currencies()
-            return {}
+            return await self.hub.currencies(name)
         except Exception:
             return {}
 
@@ -3,9 +3,12 @@ import asyncio
 import logging
 import uvicorn
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.responses import FileResponse
 from monitor_pool import MonitorSystem
+from metrics import install_event_loop, metrics
+from rate_governor import governor
+from state_store import registry_stats
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,16 +25,21 @@ async def lifespan(app: FastAPI):
     yield
     logger.info("正在关闭监控系统...")
     task.cancel()
+    # 等 start() 收尾 (关闭共享 HTTP 连接池、落快照)
+    await asyncio.gather(task, return_exceptions=True)
 
 app = FastAPI(lifespan=lifespan)
 
 # --- 核心数据接口 ---
 
 @app.get("/api/market/abnormal")
-async def get_market_abnormal():
-    """1. 市场内部异动 (Funding/OI/Price)"""
+async def get_market_abnormal(response: Response):
+    """1. 市场内部异动 (Funding/OI/Price/规则)，响应头 X-View-Version 为视图版本号 (不变即内容未变)"""
     if not monitor_system: return []
-    return monitor_system.strategy.get_abnormal_list(monitor_system.data_store)
+    strategy = monitor_system.strategy
+    items = strategy.get_abnormal_list(monitor_system.data_store)
+    response.headers["X-View-Version"] = str(strategy.view.version)
+    return items
 
 @app.get("/api/market/oi_compare")
 async def get_oi_compare():
@@ -49,6 +57,18 @@ async def get_spreads():
         return monitor_system.spread_monitor.latest_alerts
     return []
 
+@app.get("/api/spread/streams")
+async def get_spread_streams():
+    """3b. 价差行情推送连接 (各所连接状态 / 推送数 / 当前走 REST 兜底的交易所)"""
+    if not monitor_system: return {}
+    return monitor_system.spread_monitor.stream_stats()
+
+@app.get("/api/spread/matrix")
+async def get_spread_matrix():
+    """3c. 完整价差面 (币种 × 交易所 价差百分比，无报价为 null)"""
+    if not monitor_system: return {}
+    return monitor_system.spread_monitor.spread_surface()
+
 # --- 独立板块数据接口 ---
 
 @app.get("/api/onchain/targets")
@@ -56,14 +76,8 @@ async def get_onchain_targets():
     """4. 链上地址监控 (实时余额)"""
     if not monitor_system: return []
     if hasattr(monitor_system, 'onchain_monitor'):
-        targets = monitor_system.onchain_monitor.targets
-        balances = monitor_system.onchain_monitor.last_balances
-        result = []
-        for t in targets:
-            key = f"{t['chain']}_{t['wallet']}_{t['token_address']}"
-            bal = balances.get(key, 0)
-            result.append({**t, "balance": bal})
-        return result
+        onchain = monitor_system.onchain_monitor
+        return [{**t, "balance": onchain.balance(t)} for t in onchain.targets]
     return []
 
 @app.get("/api/listings/history")
@@ -90,10 +104,61 @@ async def get_all_history():
     if not monitor_system: return []
     return list(monitor_system.notifier.history)
 
+@app.get("/api/system/memory")
+async def get_memory_report():
+    """8. 行情存储内存占用 (每币种 / 总量)"""
+    if not monitor_system: return {}
+    return monitor_system.data_store.memory_report()
+
+@app.get("/api/system/ws")
+async def get_ws_shards():
+    """9. WS 连接状态 (aggTrade 分片 + markPrice) (币种数 / 连接 / 累计消息 / 重连次数)"""
+    if not monitor_system: return []
+    collector = monitor_system.collector
+    if collector.ws_proc:
+        # 独立进程模式: 连接数 / 环形缓冲积压 / 丢弃计数
+        return [collector.ws_proc.stats(), collector.mark_ws.stats()]
+    return collector.ws.stats() + [collector.mark_ws.stats()]
+
+@app.get("/api/system/oi_scheduler")
+async def get_oi_scheduler():
+    """10. OI 轮询调度 (热门币种数 / 间隔 / 已用权重)"""
+    if not monitor_system: return {}
+    return monitor_system.collector.oi_scheduler.stats()
+
+@app.get("/api/system/rate")
+async def get_rate_governor():
+    """11. Binance REST 权重 (各 host 令牌/已用权重 + 各调用方用量)"""
+    return governor.stats()
+
+@app.get("/api/system/http")
+async def get_http_pools():
+    """12. 共享 HTTP 连接池 (各分组请求数 / 新建连接即握手数 / 连接复用率)"""
+    if not monitor_system: return {}
+    return monitor_system.http.stats()
+
+@app.get("/api/system/metrics")
+async def get_metrics():
+    """13. 延迟观测 (事件循环滞后 / 各监控循环耗时 / 解码与发送延迟直方图 / WS 消息速率)"""
+    return metrics.stats()
+
+@app.get("/api/system/exchanges")
+async def get_exchange_hub():
+    """14. 外所行情入口 (共享 ccxt 实例 / 快照请求数 / 缓存命中 / 并发合并)"""
+    if not monitor_system: return {}
+    return monitor_system.exchange_hub.stats()
+
+@app.get("/api/system/state")
+async def get_state_stores():
+    """15. 状态存储 (冷却 / 已读公告 / 链上余额: 条目数 / 容量 / 过期与淘汰计数)"""
+    return registry_stats()
+
 # --- 页面路由 ---
 @app.get("/")
 async def read_root():
     return FileResponse("templates/index.html")
 
 if __name__ == "__main__":
-    uvicorn.run("web_server:app", host="0.0.0.0", port=8000, reload=False)
+    # 按 CONFIG["uvloop"] 显式选择 (uvicorn 默认 auto 会在装了 uvloop 时自动启用，不便对比)
+    uvicorn.run("web_server:app", host="0.0.0.0", port=8000, reload=False,
+                loop="uvloop" if install_event_loop() == "uvloop" else "asyncio")
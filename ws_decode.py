@@ -0,0 +1,58 @@
+# ws_decode.py
+"""
+aggTrade 帧解码
+优先 msgspec (按结构体直接解码，字符串数值直接转 float)，其次 orjson，最后标准库 json。
+统一返回 (symbol, 成交 id, 事件时间 ms, 价格, 数量, 主动卖标记)，非 aggTrade 帧返回 None。
+其他推送 (如 markPrice 数组) 用 loads 解成普通 dict/list。
+"""
+import json
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if msgspec is not None:
+    loads = msgspec.json.decode
+elif orjson is not None:
+    loads = orjson.loads
+else:
+    loads = json.loads
+
+
+if msgspec is not None:
+    class AggTrade(msgspec.Struct):
+        e: str
+        s: str
+        p: float
+        q: float
+        m: bool
+        a: int
+        T: int
+
+    # strict=False: 允许 "p": "123.4" 这类字符串数值直接解成 float
+    _decoder = msgspec.json.Decoder(AggTrade, strict=False)
+
+    def decode_agg_trade(text):
+        try:
+            t = _decoder.decode(text)
+        except msgspec.ValidationError:
+            return None  # 订阅回执等非成交帧
+        if t.e != "aggTrade": return None
+        return t.s, t.a, t.T, t.p, t.q, t.m
+
+    BACKEND = "msgspec"
+
+else:
+    def decode_agg_trade(text):
+        d = loads(text)
+        if d.get("e") != "aggTrade": return None
+        return d["s"], d["a"], d["T"], float(d["p"]), float(d["q"]), d["m"]
+
+    BACKEND = "orjson" if orjson is not None else "json"
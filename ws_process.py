@@ -0,0 +1,304 @@
+# ws_process.py
+"""
+aggTrade 独立进程接收 (可选, CONFIG["ws_process"])
+子进程跑 WSShardManager 收包 + 解码，把逐笔成交写进共享内存环形缓冲；
+主进程定时批量取出、按币种合并后写入 MarketStore，事件循环里不再做 WS 收包和 JSON 解码。
+
+环形缓冲是单写单读 (子进程只写 write 下标，主进程只写 read 下标)，不加锁:
+写方先写记录再推进 write 下标，读方先拷出记录再推进 read 下标；满了直接丢弃并计数。
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from config import CONFIG
+from metrics import metrics
+from ws_decode import decode_agg_trade
+
+logger = logging.getLogger(__name__)
+
+TRADE_DTYPE = np.dtype([
+    ("row", "<i4"),     # MarketStore 行号
+    ("maker", "u1"),    # 主动卖
+    ("trade_id", "<i8"),
+    ("event_ms", "<i8"),
+    ("price", "<f8"),
+    ("qty", "<f8"),
+])
+
+# 头部计数 (int64)
+W, R, DROPPED, MESSAGES, CONNECTED, SHARDS, HEARTBEAT_MS = range(7)
+HEADER_SLOTS = 8
+
+
+class TradeRing:
+    """共享内存里的逐笔成交环形缓冲 (单生产者 / 单消费者)"""
+    def __init__(self, capacity, name=None):
+        header_bytes = HEADER_SLOTS * 8
+        size = header_bytes + capacity * TRADE_DTYPE.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.capacity = capacity
+        self.head = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        self.buf = np.ndarray((capacity,), dtype=TRADE_DTYPE, buffer=self.shm.buf, offset=header_bytes)
+        if self.owner:
+            self.head[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def depth(self):
+        return int(self.head[W] - self.head[R])
+
+    def push(self, records):
+        """生产者: 写入一批记录，放不下的部分丢弃；返回写入条数"""
+        w, r = int(self.head[W]), int(self.head[R])
+        n = min(len(records), self.capacity - (w - r))
+        if n < len(records):
+            self.head[DROPPED] += len(records) - n
+        if n <= 0: return 0
+        start = w % self.capacity
+        first = min(n, self.capacity - start)
+        self.buf[start:start + first] = records[:first]
+        if n > first:
+            self.buf[:n - first] = records[first:n]
+        self.head[W] = w + n  # 记录写完才发布
+        return n
+
+    def pop(self, limit=None):
+        """消费者: 取出当前可读的全部记录 (拷贝)"""
+        w, r = int(self.head[W]), int(self.head[R])
+        n = w - r if limit is None else min(w - r, limit)
+        if n <= 0:
+            return self.buf[:0].copy()
+        start = r % self.capacity
+        first = min(n, self.capacity - start)
+        if n > first:
+            out = np.concatenate((self.buf[start:], self.buf[:n - first]))
+        else:
+            out = self.buf[start:start + n].copy()
+        self.head[R] = r + n
+        return out
+
+    def close(self):
+        self.head = self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ---------------- 子进程 ----------------
+
+def _child_main(ring_name, capacity, control, proxy, parent_pid):
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - [ws进程] %(message)s', level=logging.INFO)
+    try:
+        asyncio.run(_child_run(ring_name, capacity, control, proxy, parent_pid))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _child_run(ring_name, capacity, control, proxy, parent_pid):
+    from ws_shards import WSShardManager
+
+    ring = TradeRing(capacity, name=ring_name)
+    index = {}            # symbol -> 主进程 MarketStore 行号 (WSShardManager 当作 data_store 用)
+    frames = []
+    flush_scheduled = False
+    loop = asyncio.get_running_loop()
+
+    def flush():
+        nonlocal frames, flush_scheduled
+        batch, frames = frames, []
+        flush_scheduled = False
+        records = []
+        for text in batch:
+            try:
+                t = decode_agg_trade(text)
+            except Exception as e:  # 单帧损坏只丢这一帧
+                logger.debug(f"成交帧解析失败: {e}: {text[:200]!r}")
+                continue
+            if t is None: continue
+            s, trade_id, event_ms, price, qty, maker = t
+            row = index.get(s)
+            if row is not None:
+                records.append((row, maker, trade_id, event_ms, price, qty))
+        ring.head[MESSAGES] += len(batch)
+        if records:
+            ring.push(np.array(records, dtype=TRADE_DTYPE))
+
+    def on_message(text):
+        nonlocal flush_scheduled
+        frames.append(text)
+        if not flush_scheduled:
+            flush_scheduled = True
+            loop.call_soon(flush)
+
+    manager = WSShardManager(index, on_message, proxy)
+    ws_task = asyncio.create_task(manager.run())
+
+    async def heartbeat():
+        while True:
+            ring.head[CONNECTED] = sum(sh.connected for sh in manager.shards)
+            ring.head[SHARDS] = len(manager.shards)
+            ring.head[HEARTBEAT_MS] = int(time.time() * 1000)
+            if os.getppid() != parent_pid:
+                logger.error("主进程已退出，ws 进程随之退出")
+                ws_task.cancel()
+                return
+            await asyncio.sleep(1)
+
+    hb_task = asyncio.create_task(heartbeat())
+    try:
+        while not ws_task.done():
+            try:
+                cmd, arg = await loop.run_in_executor(None, control.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if cmd == "stop":
+                break
+            if cmd == "add":
+                fresh = {s: row for s, row in arg.items() if s not in index}
+                index.update(fresh)
+                if manager.shards and fresh:
+                    await manager.assign(list(fresh))
+    finally:
+        ws_task.cancel()
+        hb_task.cancel()
+        await asyncio.gather(ws_task, hb_task, return_exceptions=True)
+        ring.close()
+
+
+# ---------------- 主进程 ----------------
+
+class WSIngestProcess:
+    """主进程侧: 拉起/守护 ws 子进程，定时把环形缓冲里的成交写入 MarketStore"""
+    def __init__(self, data_store, journal=None, proxy=None):
+        self.data_store = data_store
+        self.journal = journal
+        self.proxy = proxy
+        self.ring = None
+        self.process = None
+        self.control = None
+        self.records = 0       # 主进程已取出的成交条数
+        self.restarts = 0
+        self.max_depth = 0     # 取出前观察到的最大积压
+
+    def _spawn(self):
+        ctx = mp.get_context("spawn")  # 子进程不继承主进程的事件循环/连接
+        self.control = ctx.Queue()
+        self.process = ctx.Process(
+            target=_child_main, name="ws-ingest", daemon=True,
+            args=(self.ring.name, self.ring.capacity, self.control, self.proxy, os.getpid()),
+        )
+        self.process.start()
+        self.control.put(("add", dict(self.data_store.index)))
+        logger.info(f"ws 独立进程已启动 (pid {self.process.pid}, 缓冲 {self.ring.capacity:,} 条)")
+
+    def add_symbols(self, symbols):
+        """新币种交给子进程订阅 (行号由主进程 MarketStore 分配)"""
+        if self.control is None: return
+        index = self.data_store.index
+        self.control.put(("add", {s: index[s] for s in symbols if s in index}))
+
+    @metrics.timed("ws.drain")
+    def drain(self):
+        """取出环形缓冲里的全部成交，按币种合并后写入 (与 DataCollector.ingest_frames 同口径)"""
+        ring = self.ring
+        self.max_depth = max(self.max_depth, ring.depth())
+        recs = ring.pop()
+        if not len(recs): return 0
+        self.records += len(recs)
+        metrics.count("ws.messages", len(recs))
+        metrics.observe("ws.trade_age", max(0.0, time.time() - recs["event_ms"][-1] / 1000))
+        store = self.data_store
+
+        rows = recs["row"].astype(np.int64)
+        prices = recs["price"]
+        vol = prices * recs["qty"]
+        signed = np.where(recs["maker"] != 0, -vol, vol)
+        uniq, inv = np.unique(rows, return_inverse=True)
+        sums = np.bincount(inv, weights=signed, minlength=len(uniq))
+        last = np.zeros(len(uniq), dtype=np.int64)
+        np.maximum.at(last, inv, np.arange(len(rows)))
+        store.add_trades(uniq, int(store.clock()), sums, prices[last])
+
+        if self.journal:
+            symbols = store.symbols
+            for r in recs.tolist():
+                self.journal.append(symbols[r[0]], r[2], r[3], r[4], r[5], bool(r[1]))
+        return len(recs)
+
+    def stats(self):
+        if self.ring is None:
+            return {"mode": "process", "alive": False}
+        head = self.ring.head
+        hb = int(head[HEARTBEAT_MS])
+        return {
+            "mode": "process",
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "restarts": self.restarts,
+            "shards": int(head[SHARDS]),
+            "connected": int(head[CONNECTED]),
+            "messages": int(head[MESSAGES]),
+            "records": self.records,
+            "queue_depth": self.ring.depth(),
+            "max_queue_depth": self.max_depth,
+            "capacity": self.ring.capacity,
+            "dropped": int(head[DROPPED]),
+            "heartbeat_age": time.time() - hb / 1000 if hb else None,
+        }
+
+    def _stop_child(self):
+        if self.process is None: return
+        try:
+            self.control.put(("stop", None))
+        except Exception:
+            pass
+        self.process.join(3)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+
+    async def run(self):
+        cfg = CONFIG["ws_process"]
+        try:
+            while not self.data_store:
+                await asyncio.sleep(2)
+            self.ring = TradeRing(cfg["ring_capacity"])
+            self._spawn()
+            last_report = time.time()
+            while True:
+                await asyncio.sleep(cfg["drain_interval"])
+                try:
+                    self.drain()
+                except Exception as e:
+                    logger.error(f"ws 进程成交入库失败: {e}")
+
+                if not self.process.is_alive():
+                    self.restarts += 1
+                    logger.error(f"ws 独立进程退出 (code {self.process.exitcode})，{cfg['restart_delay']}s 后重启")
+                    await asyncio.sleep(cfg["restart_delay"])
+                    self._spawn()
+
+                if time.time() - last_report >= CONFIG["ws"]["rate_report_interval"]:
+                    s = self.stats()
+                    logger.info(f"ws 进程: {s['connected']}/{s['shards']} 连接, 积压 {s['queue_depth']} "
+                                f"(峰值 {s['max_queue_depth']}), 丢弃 {s['dropped']}")
+                    last_report = time.time()
+                    self.max_depth = 0
+        finally:
+            try:
+                # join 最多阻塞 4 秒，放到线程池里等，不卡住事件循环上的其他任务
+                await asyncio.get_running_loop().run_in_executor(None, self._stop_child)
+            finally:
+                # 等待 data_store 期间被取消时缓冲区尚未创建
+                if self.ring is not None:
+                    self.drain()
+                    self.ring.close()
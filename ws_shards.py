@@ -0,0 +1,202 @@
+# ws_shards.py
+"""
+aggTrade WebSocket 分片连接管理
+全市场 symbol 按 streams_per_shard 分摊到多条连接，每条连接独立重连/退避，
+单条断线只影响本分片的币种；新币种放到负载最低的分片。
+"""
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+WS_BASE = "wss://fstream.binance.com/ws/"
+URL_STREAMS = 10        # 连接 URL 里直接带的流数量，其余走 SUBSCRIBE
+SUBSCRIBE_BATCH = 50    # 单条 SUBSCRIBE 消息的流数量
+SUBSCRIBE_GAP = 0.2     # SUBSCRIBE 消息间隔 (Binance 限制每连接 10 条/秒)
+
+
+def _stream(symbol):
+    return f"{symbol.lower()}@aggTrade"
+
+
+class WSShard:
+    """单条 WS 连接: 负责一组 symbol 的订阅、收包、断线退避重连"""
+    def __init__(self, shard_id, on_message, proxy=None):
+        self.id = shard_id
+        self.on_message = on_message   # 回调: 收到 TEXT 帧的原始字符串
+        self.proxy = proxy
+        self.symbols = []
+        self.ws = None
+        self.messages = 0              # 累计收到的消息数
+        self.reconnects = 0
+        self.connected_at = None
+        self.last_message = 0.0        # 最近一次收到消息的时间
+        self._rate_mark = (time.time(), 0)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    async def add(self, symbols):
+        """加入新币种，已连接则立即 SUBSCRIBE (未连接时在下次建连时订阅)"""
+        self.symbols.extend(symbols)
+        if self.connected:
+            try:
+                await self._subscribe(self.ws, [_stream(s) for s in symbols])
+            except Exception as e:
+                logger.error(f"WS分片#{self.id} 动态订阅失败: {e}")
+
+    async def _subscribe(self, ws, streams):
+        for i in range(0, len(streams), SUBSCRIBE_BATCH):
+            payload = {"method": "SUBSCRIBE", "params": streams[i:i + SUBSCRIBE_BATCH], "id": int(time.time())}
+            await ws.send_json(payload)
+            await asyncio.sleep(SUBSCRIBE_GAP)
+
+    def take_rate(self):
+        """距上次调用的平均消息速率 (条/秒)"""
+        now, count = time.time(), self.messages
+        last_ts, last_count = self._rate_mark
+        self._rate_mark = (now, count)
+        return (count - last_count) / (now - last_ts) if now > last_ts else 0.0
+
+    def stats(self):
+        return {
+            "shard": self.id,
+            "symbols": len(self.symbols),
+            "connected": self.connected,
+            "messages": self.messages,
+            "reconnects": self.reconnects,
+            "uptime": time.time() - self.connected_at if self.connected else 0,
+        }
+
+    def streams(self):
+        return [_stream(s) for s in self.symbols]
+
+    async def run(self):
+        cfg = CONFIG["ws"]
+        backoff = cfg["backoff_initial"]
+        while True:
+            in_url = self.streams()[:URL_STREAMS]
+            url = WS_BASE + "/".join(in_url)
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, proxy=self.proxy, heartbeat=cfg["heartbeat"]) as ws:
+                        self.ws = ws
+                        self.connected_at = time.time()
+                        # 建连等待期间 add() 进来的币种也在这里补订阅；此后新加入的由 add() 直接订阅
+                        in_url = set(in_url)
+                        rest = [s for s in self.streams() if s not in in_url]
+                        logger.info(f"WS分片#{self.id} 已连接 ({len(in_url) + len(rest)} 币种)")
+                        await self._subscribe(ws, rest)
+
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self.messages += 1
+                                self.last_message = time.time()
+                                self.on_message(msg.data)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                error = "连接关闭"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+
+            # 稳定运行过一段时间才重置退避
+            if self.connected_at and time.time() - self.connected_at > cfg["stable_seconds"]:
+                backoff = cfg["backoff_initial"]
+            self.ws = None
+            self.connected_at = None
+            self.reconnects += 1
+            delay = backoff * random.uniform(0.8, 1.2)
+            logger.error(f"WS分片#{self.id} 重连 ({delay:.1f}s 后): {error}")
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, cfg["backoff_max"])
+
+
+class MarkPriceShard(WSShard):
+    """全市场标记价格/资金费率推送 (!markPrice@arr@1s)，单条连接覆盖所有币种"""
+    STREAM = "!markPrice@arr@1s"
+
+    def __init__(self, on_message, proxy=None):
+        super().__init__("mark", on_message, proxy)
+
+    def streams(self):
+        return [self.STREAM]
+
+    def fresh(self, max_age):
+        return self.connected and time.time() - self.last_message <= max_age
+
+
+class WSShardManager:
+    """分片调度: 初始分配、动态加币 (负载最低分片)、定期汇报各分片消息速率"""
+    def __init__(self, data_store, on_message, proxy=None):
+        self.data_store = data_store
+        self.on_message = on_message
+        self.proxy = proxy
+        self.shards = []
+        self.assigned = set()
+        self.tasks = []
+
+    def _least_loaded(self):
+        limit = CONFIG["ws"]["streams_per_shard"]
+        candidates = [sh for sh in self.shards if len(sh) < limit]
+        if not candidates:
+            shard = WSShard(len(self.shards), self.on_message, self.proxy)
+            self.shards.append(shard)
+            self.tasks.append(asyncio.create_task(shard.run()))
+            return shard
+        return min(candidates, key=len)
+
+    async def assign(self, symbols):
+        """把新币种分配到负载最低的分片 (满了则新开分片)"""
+        pending = [s for s in symbols if s not in self.assigned]
+        self.assigned.update(pending)  # 先登记，避免 await 期间被兜底检查重复分配
+        limit = CONFIG["ws"]["streams_per_shard"]
+        while pending:
+            shard = self._least_loaded()
+            room = limit - len(shard)
+            batch, pending = pending[:room], pending[room:]
+            await shard.add(batch)
+
+    def stats(self):
+        return [sh.stats() for sh in self.shards]
+
+    async def run(self):
+        cfg = CONFIG["ws"]
+        while not self.data_store:
+            await asyncio.sleep(2)
+        # 初始分配: 均匀铺到 ceil(n / 每片上限) 个分片，避免前几个分片塞满
+        symbols = [s for s in self.data_store.keys() if s not in self.assigned]
+        n_shards = -(-len(symbols) // cfg["streams_per_shard"])
+        for i in range(n_shards):
+            shard = WSShard(len(self.shards), self.on_message, self.proxy)
+            shard.symbols = symbols[i::n_shards]
+            self.shards.append(shard)
+            self.tasks.append(asyncio.create_task(shard.run()))
+        self.assigned.update(symbols)
+        logger.info(f"WS分片启动: {len(symbols)} 币种 / {n_shards} 条连接")
+
+        try:
+            while True:
+                await asyncio.sleep(cfg["rate_report_interval"])
+                # 兜底: 未经 dynamic_subscribe 加入 data_store 的币种
+                missing = [s for s in self.data_store.keys() if s not in self.assigned]
+                if missing:
+                    await self.assign(missing)
+                rates = " | ".join(
+                    f"#{sh.id} {len(sh)}币 {sh.take_rate():.0f}/s{'' if sh.connected else ' (断开)'}"
+                    for sh in self.shards
+                )
+                logger.info(f"WS分片消息速率: {rates}")
+        finally:
+            for t in self.tasks:
+                t.cancel()